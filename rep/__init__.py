@@ -1,4 +1,22 @@
+from .async_store import AsyncStore
+from .cached_backend import CachedBackend
+from .compact_pin_store import CompactPinBackend, CompactPinStore
+from .field_index import HashIndex, QueryPlan, SortedIndex
+from .journal import ChangeJournal, ResyncRequired
+from .json_cache import JsonCache
+from .key_allocator import KeyAllocator
+from .lazy_rep_store import LazyRepBackend, LazyRepStore
+from .log_backend import LogBackend
 from .pin import Pin
+from .pin_index import PinIndex
 from .pin_store import PinStore
+from .remote_store import Pipeline, RemotePinStore, RemoteRepStore, RemoteStore
 from .rep import Rep
 from .rep_store import RepStore
+from .search import TitleIndex
+from .sharded_store import ShardedBackend, ShardedPinStore, ShardedRepStore
+from .sqlite_store import SqliteBackend, SqlitePinStore, SqliteRepStore
+from .store import Store
+from .store_server import StoreServer
+from .topological_order import CycleError, TopologicalOrder
+from .versions import Versions
@@ -0,0 +1,100 @@
+import itertools
+from multiprocessing.pool import ThreadPool
+
+class AsyncStore(object):
+    """Non-blocking access to a store, for backends where each read waits
+    on I/O, such as RemoteStore and the SQLite stores.
+
+    Calls run on a pool of worker threads and return at once with a result
+    object; result.get() waits for the value and raises any error the call
+    raised.  Reads of many keys are fanned out across the pool, and the
+    iter_ methods keep the next block of reads in flight while the caller
+    works through the current one.
+    """
+    BLOCK = 1000
+
+    def __init__(self, store, workers=8):
+        self.store = store
+        self.workers = workers
+        self.pool = ThreadPool(workers)
+
+    def submit(self, function, *arguments):
+        """Run function(*arguments) on the pool.
+        """
+        return self.pool.apply_async(function, arguments)
+
+    def read(self, key):
+        return self.submit(self.store.__getitem__, key)
+
+    def json_fragment(self, key):
+        return self.submit(self.store.json_fragment, key)
+
+    def read_many(self, keys):
+        """Read the objects under keys, giving None for missing keys.  The
+        keys are split into one share per worker, and each share is read with
+        one read_many.
+        """
+        return self.__fan_out(self.store.read_many, keys)
+
+    def json_fragments(self, keys):
+        """Read the JSON of the objects under keys, giving None for missing
+        keys.
+        """
+        return self.__fan_out(self.store.json_fragments, keys)
+
+    def iter_items(self, after=None):
+        """Yield (key, object) pairs in key order, starting after the key
+        after, while the next block is being read.
+        """
+        keys = self.store.ordered_keys(after)
+        return self.__iter_present(self.read_many, keys)
+
+    def iter_fragments(self, keys):
+        """Yield (key, JSON text) for each of keys that is in the store,
+        while the next block is being read.
+        """
+        return self.__iter_present(self.json_fragments, keys)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __fan_out(self, read_share, keys):
+        keys = [str(key) for key in keys]
+        size = max(1, -(-len(keys) // self.workers))
+        return _Gathered([self.submit(read_share, keys[start:start + size])
+                          for start in range(0, len(keys), size)])
+
+    def __iter_present(self, read_many, keys):
+        keys = (str(key) for key in keys)
+        block = list(itertools.islice(keys, self.BLOCK))
+        pending = read_many(block)
+        while block:
+            following = list(itertools.islice(keys, self.BLOCK))
+            upcoming = read_many(following) if following else None
+            for key, value in zip(block, pending.get()):
+                if value is not None:
+                    yield key, value
+            block, pending = following, upcoming
+
+
+class _Gathered(object):
+    """The result of a fanned out read: the concatenated results of the
+    shares, in order.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def ready(self):
+        return all(result.ready() for result in self.results)
+
+    def wait(self, timeout=None):
+        for result in self.results:
+            result.wait(timeout)
+
+    def get(self, timeout=None):
+        values = []
+        for result in self.results:
+            values.extend(result.get(timeout))
+        return values
@@ -0,0 +1,49 @@
+import os
+
+from .compact_pin_store import CompactPinStore
+from .key_allocator import KeyAllocator
+from .lazy_rep_store import LazyRepStore
+from .log_backend import LogBackend
+from .pin_store import PinStore
+from .rep_store import RepStore
+from .sharded_store import ShardedPinStore, ShardedRepStore
+from .sqlite_store import SqlitePinStore, SqliteRepStore
+
+BACKENDS = ('memory', 'compact', 'sharded', 'log', 'sqlite')
+
+def open_store(store_class, name, backend='memory', data_dir='data', sync='always',
+               cache_items=0, cache_mode='write-through'):
+    """Create a store of store_class (RepStore or PinStore) kept in the named
+    backend:
+
+    memory  keep everything in process memory
+    compact keep Reps as titles and Pins as integer columns in process
+            memory, building objects only when they are read
+    sharded keep everything in process memory split across shards, so that
+            whole store reads run on a pool of threads, one per CPU
+    log     append-only log files under data_dir, synced per sync
+    sqlite  an SQLite database in data_dir
+
+    name separates the data of different stores in the same data_dir.  Unless
+    cache_items is 0, up to that many objects of the sqlite backend are kept
+    in a CachedBackend in front of it, written per cache_mode.
+    """
+    if backend == 'memory':
+        return store_class()
+    if backend == 'compact':
+        return {RepStore: LazyRepStore, PinStore: CompactPinStore}[store_class]()
+    if backend == 'sharded':
+        return {RepStore: ShardedRepStore, PinStore: ShardedPinStore}[store_class]()
+    if backend == 'log':
+        path = os.path.join(data_dir, name)
+        log = LogBackend(path, store_class.item_class, sync=sync)
+        return store_class(backend=log,
+                           allocator=KeyAllocator(os.path.join(path, 'keys')))
+    if backend == 'sqlite':
+        if not os.path.isdir(data_dir):
+            os.makedirs(data_dir)
+        sqlite_class = {RepStore: SqliteRepStore, PinStore: SqlitePinStore}[store_class]
+        return sqlite_class(os.path.join(data_dir, 'rep.db'),
+                            allocator=KeyAllocator(os.path.join(data_dir, '%s.keys' % name)),
+                            cache_items=cache_items, cache_mode=cache_mode)
+    raise ValueError("%s is not a valid backend" % backend)
@@ -0,0 +1,3 @@
+"""Benchmarks for the rep library.  Each module can be run as a script, for
+example python -m rep.bench.log_backend.
+"""
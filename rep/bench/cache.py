@@ -0,0 +1,99 @@
+"""Read and write rates of an SQLite RepStore with and without a cache.
+
+    python -m rep.bench.cache [--count N] [--reads N] [--writes N] [--items N...]
+
+--count Reps are loaded into an SQLite database, then --reads lookups are
+made the way GET /reps/<key> makes them, a membership test and a record
+read, of keys drawn with a skew towards a hot few: key n is drawn in
+proportion to 1 / n.  Blocks of 20 keys are read at once as for the
+children of a Rep.  Each is timed without a cache and in front of a
+CachedBackend of every --items size, followed by --writes writes of the
+same skew through a write-through and a write-back cache.
+"""
+from __future__ import print_function
+
+import argparse
+import bisect
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from rep import CachedBackend, Rep, RepStore, SqliteBackend, SqliteRepStore
+
+def skewed_keys(count, number):
+    chooser = random.Random(0)
+    weights, total = [], 0.0
+    for key in range(1, count + 1):
+        total += 1.0 / key
+        weights.append(total)
+    return [str(bisect.bisect(weights, chooser.random() * weights[-1]) + 1)
+            for _ in range(number)]
+
+def rate(number, run):
+    start = time.time()
+    run()
+    return number / (time.time() - start)
+
+def lookups(store, keys):
+    for key in keys:
+        if key in store:
+            store.record(key)
+
+def blocks(store, keys):
+    for start in range(0, len(keys), 20):
+        store.read_records(keys[start:start + 20])
+
+def writes(store, keys):
+    for key in keys:
+        store[key] = Rep(title='Rep number %s, changed' % key)
+
+def open_store(database, items, mode='write-through'):
+    backend = SqliteBackend(database, 'reps', Rep)
+    if items:
+        backend = CachedBackend(backend, items, mode)
+    return backend, RepStore(backend=backend)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--reads', type=int, default=200000)
+    parser.add_argument('--writes', type=int, default=20000)
+    parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    database = os.path.join(path, 'rep.db')
+    try:
+        store = SqliteRepStore(database)
+        for start in range(0, args.count, 10000):
+            store.update((str(key), Rep(title='Rep number %s of the benchmark' % key))
+                         for key in range(start + 1, min(start + 10000, args.count) + 1))
+        store.close()
+        keys = skewed_keys(args.count, args.reads)
+        print('%-22s %12s %12s %8s' % ('', 'lookups/s', 'blocks/s', 'hits'))
+        for items in [0] + args.items:
+            backend, store = open_store(database, items)
+            lookup_rate = rate(len(keys), lambda: lookups(store, keys))
+            block_rate = rate(len(keys) // 20, lambda: blocks(store, keys))
+            label = 'no cache' if not items else '%d items' % items
+            hits = '-'
+            if items:
+                stats = backend.stats()
+                hits = '%.0f%%' % (100.0 * stats['hits'] / (stats['hits'] + stats['misses']))
+            print('%-22s %12.0f %12.0f %8s' % (label, lookup_rate, block_rate, hits))
+            store.close()
+        keys = skewed_keys(args.count, args.writes)
+        print('%-22s %12s' % ('', 'writes/s'))
+        for label, items, mode in (('no cache', 0, 'write-through'),
+                                   ('write-through', args.items[-1], 'write-through'),
+                                   ('write-back', args.items[-1], 'write-back')):
+            _, store = open_store(database, items, mode)
+            print('%-22s %12.0f' % (label, rate(len(keys), lambda: (writes(store, keys),
+                                                                   store.close()))))
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    main()
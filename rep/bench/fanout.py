@@ -0,0 +1,90 @@
+"""Latency of the children endpoint under concurrent load, with and
+without fan-out.
+
+    python -m rep.bench.fanout [--children N] [--clients N] [--delay MS]
+
+rest_app is run against a StoreServer whose Rep reads each take --delay
+milliseconds, standing in for a disk or network hop.  --clients threads
+request the children of a Rep with --children children for --seconds,
+first reading them one at a time (REP_FANOUT=0) and then with each fan-out
+width given by --fanout.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from rep import PinStore, RepStore, StoreServer
+
+class SlowRepStore(RepStore):
+    """A RepStore whose JSON reads take delay seconds."""
+    delay = 0
+
+    def json_fragment(self, key):
+        time.sleep(self.delay)
+        return super(SlowRepStore, self).json_fragment(key)
+
+def load(app, clients, seconds):
+    latencies = []
+    lock = threading.Lock()
+    def client():
+        test_client = app.test_client()
+        deadline = time.time() + seconds
+        mine = []
+        while time.time() < deadline:
+            start = time.time()
+            test_client.get('/rep/api/v1.0/children/0')
+            mine.append(time.time() - start)
+        with lock:
+            latencies.extend(mine)
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies
+
+def percentile(latencies, share):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--children', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=1.0)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fanout', default='4,16')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    socket_path = os.path.join(path, 'rep.sock')
+    reps = SlowRepStore()
+    server = StoreServer(socket_path, {'reps': reps, 'pins': PinStore()}).start()
+    os.environ.update(REP_BACKEND='remote', REP_SOCKET=socket_path)
+    import rest_app
+    from rep import Pin, Rep
+    rest_app.store.update((str(key), Rep(title='child %d' % key))
+                          for key in range(1, args.children + 1))
+    rest_app.pin_store.update((str(key), Pin(0, key))
+                              for key in range(1, args.children + 1))
+    reps.delay = args.delay / 1000.0
+    try:
+        print('%-8s %10s %10s %10s' % ('fanout', 'requests/s', 'p50 ms', 'p99 ms'))
+        for workers in [0] + [int(width) for width in args.fanout.split(',')]:
+            rest_app.enable_fanout(workers)
+            latencies = load(rest_app.app, args.clients, args.seconds)
+            print('%-8d %10.1f %10.1f %10.1f' % (
+                workers, len(latencies) / args.seconds,
+                percentile(latencies, 0.5), percentile(latencies, 0.99)))
+        rest_app.enable_fanout(0)
+    finally:
+        server.close()
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    main()
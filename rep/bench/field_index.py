@@ -0,0 +1,68 @@
+"""Latency of field queries answered by a scan and by field indexes.
+
+    python -m rep.bench.field_index [--count N] [--repeat N]
+
+--count Reps with titles "Rep NNNNNNN", numbered in a shuffled order, are
+queried for one title, for a range of 100 titles, and for the first 20
+titles in order, first on a store without field indexes and then on one
+with a hash and a sorted index on title.  The time to build the indexes,
+and to load the store with them in place, is reported as well.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from rep import Rep, RepStore
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        result = run()
+        times.append(time.time() - start)
+    return result, min(times)
+
+def load(store, titles):
+    store.update(zip(store.reserve_keys(len(titles)), (Rep(title=title) for title in titles)))
+    store.query({'title': titles[0]})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    numbers = list(range(args.count))
+    random.Random(0).shuffle(numbers)
+    titles = ['Rep %07d' % number for number in numbers]
+    middle = args.count // 2
+    queries = (
+        ('equal', {'where': {'title': 'Rep %07d' % middle}}),
+        ('range of 100', {'ranges': {'title': ('Rep %07d' % middle, 'Rep %07d' % (middle + 99))},
+                          'sort': 'title'}),
+        ('first 20 by title', {'sort': 'title', 'limit': 20}),
+    )
+
+    plain = RepStore()
+    _, seconds = best(lambda: load(plain, titles), 1)
+    print('load without field indexes: %.2f s' % seconds)
+    indexed = RepStore()
+    indexed.add_field_index('title', 'hash')
+    indexed.add_field_index('title')
+    _, seconds = best(lambda: load(indexed, titles), 1)
+    print('load with both indexes:     %.2f s' % seconds)
+    _, seconds = best(lambda: RepStore(backend=dict(plain.items())).add_field_index('title'), 1)
+    print('build a sorted index:       %.2f s' % seconds)
+
+    print('%-18s %-22s %12s %-22s %12s' % ('query', 'plan', 'ms', 'plan', 'ms'))
+    for label, query in queries:
+        (scan_plan, scan_keys), scan = best(lambda: plain.query(**query), args.repeat)
+        (index_plan, index_keys), index = best(lambda: indexed.query(**query), args.repeat)
+        assert scan_keys == index_keys
+        print('%-18s %-22s %12.3f %-22s %12.3f' % (label, scan_plan, scan * 1000,
+                                                  index_plan, index * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Time to encode every Rep of a store as JSON, with and without a JsonCache.
+
+    python -m rep.bench.json_cache [--count N] [--rounds N]
+
+Each round encodes the whole store the way the REST list endpoint does.
+The first cached round fills the cache, so it is reported separately.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import time
+
+from rep import Rep, RepStore
+
+def encode(store):
+    json_key = json.encoder.encode_basestring_ascii
+    return '{%s}' % ', '.join('%s: %s' % (json_key(key), store.json_fragment(key))
+                              for key in store.ordered_keys())
+
+def timed(store, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        encode(store)
+    return (time.time() - start) / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    store = RepStore()
+    store.update((key, Rep(title='Rep number %s' % key))
+                 for key in store.reserve_keys(args.count))
+    print('uncached      %8.1f ms' % (timed(store, args.rounds) * 1000))
+    store.enable_json_cache()
+    print('cache filling %8.1f ms' % (timed(store, 1) * 1000))
+    print('cached        %8.1f ms' % (timed(store, args.rounds) * 1000))
+    print(json.dumps(store.json_cache.stats()))
+
+if __name__ == '__main__':
+    main()
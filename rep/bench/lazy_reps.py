@@ -0,0 +1,73 @@
+"""Memory and latency of Reps kept as objects and as raw titles.
+
+    python -m rep.bench.lazy_reps [--count N] [--json-cache-bytes N]
+
+For each of the memory and compact backends a fresh process loads --count
+Reps into rest_app and reports the memory they take, then the time to
+export the store with as_dict, to GET the whole Rep list, and to GET a
+page of 1000.  The JSON cache is off by default, so every response is
+encoded from the stored Reps.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKENDS = ('memory', 'compact')
+
+def resident_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def best(run, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+    return min(times)
+
+def measure(count):
+    import rest_app
+    from rep import Rep
+    before = resident_bytes()
+    for start in range(0, count, 1000):
+        rest_app.store.update((key, Rep(title='Rep number %s' % key))
+                              for key in rest_app.store.reserve_keys(min(1000, count - start)))
+    used = resident_bytes() - before
+    client = rest_app.app.test_client()
+    return {'bytes_per_rep': used / float(count),
+            'as_dict': best(rest_app.store.as_dict),
+            'list': best(lambda: client.get('/rep/api/v1.0/reps')),
+            'page': best(lambda: client.get('/rep/api/v1.0/reps?limit=1000&after=%d'
+                                            % (count // 2)))}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--json-cache-bytes', type=int, default=0)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.count)))
+        return
+    print('%-8s %12s %12s %12s %12s' % ('backend', 'bytes/Rep', 'as_dict ms',
+                                        'list ms', 'page ms'))
+    for backend in BACKENDS:
+        env = dict(os.environ, REP_BACKEND=backend, REP_METRICS='0', REP_JOURNAL_SIZE='0',
+                   REP_JSON_CACHE_BYTES=str(args.json_cache_bytes))
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'rep.bench.lazy_reps', '--worker',
+             '--count', str(args.count)], env=env)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('%-8s %12.0f %12.1f %12.1f %12.1f' % (
+            backend, result['bytes_per_rep'], result['as_dict'] * 1000,
+            result['list'] * 1000, result['page'] * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Write throughput and recovery time of LogBackend.
+
+    python -m rep.bench.log_backend [--count N] [--sync POLICY] [--threads N]
+
+Writes N reps and N pins through a RepStore and PinStore, split across
+--threads writers, closes them, then times reopening both.
+"""
+from __future__ import print_function
+
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from rep import (
+    LogBackend,
+    Pin,
+    PinStore,
+    Rep,
+    RepStore,
+)
+
+def write(threads, count, write_one):
+    def writer(numbers):
+        for number in numbers:
+            write_one(number)
+    writers = [threading.Thread(target=writer, args=(range(start, count, threads),))
+               for start in range(threads)]
+    start = time.time()
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    return count / (time.time() - start)
+
+def run(count, sync, path, threads=1):
+    results = {}
+    stores = {}
+    for name, store_class in (('reps', RepStore), ('pins', PinStore)):
+        backend = LogBackend('%s/%s' % (path, name), store_class.item_class,
+                             sync=sync, compact_min=count * 2)
+        stores[name] = store_class(backend=backend)
+
+    results['rep writes/s'] = write(
+        threads, count, lambda number: stores['reps'].create(Rep(title='rep %d' % number)))
+    results['pin writes/s'] = write(
+        threads, count, lambda number: stores['pins'].create(Pin(number, number + 1)))
+
+    for name, store in stores.items():
+        store.close()
+        start = time.time()
+        reopened = LogBackend('%s/%s' % (path, name), store.item_class)
+        results['%s recovery s' % name] = time.time() - start
+        start = time.time()
+        reopened.compact()
+        results['%s compaction s' % name] = time.time() - start
+        reopened.close()
+        start = time.time()
+        LogBackend('%s/%s' % (path, name), store.item_class).close()
+        results['%s snapshot recovery s' % name] = time.time() - start
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--sync', choices=LogBackend.SYNC_POLICIES, default='interval')
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        results = run(args.count, args.sync, path, args.threads)
+    finally:
+        shutil.rmtree(path)
+    for name in sorted(results):
+        print('%-28s %12.2f' % (name, results[name]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Microbenchmarks of the hot paths of Rep, Pin, RepStore and PinStore.
+
+    python -m rep.bench.micro [--max-size N] [--output FILE]
+    python -m rep.bench.micro --compare OLD NEW [--threshold 0.1]
+
+Object benchmarks run once; store benchmarks run on stores of every size
+in SIZES up to --max-size (10**7 needs several GB of memory).  Each result
+has the best throughput of --repeat runs and the allocations per operation:
+with tracemalloc (Python 3) the number of memory blocks still allocated
+afterwards, otherwise the net growth in objects tracked by the garbage
+collector.  Either way it counts what an operation keeps, not temporaries.
+
+scaling is the slope of log(time per operation) against log(store size):
+0 means the cost does not grow with the store, 1 means it grows linearly.
+
+--output saves the results as JSON.  --compare prints the change in
+throughput between two saved runs and exits with status 1 if any
+benchmark got slower by more than --threshold.
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+
+from rep import Pin, PinStore, Rep, RepStore
+
+SIZES = [10 ** power for power in range(2, 8)]
+OPERATIONS = 10000
+FANOUT = 10
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def allocations(run):
+    """Return the number of objects run() leaves allocated.
+    """
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        run()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return sum(stat.count_diff for stat in after.compare_to(before, 'filename')
+                   if stat.count_diff > 0)
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.get_count()[0]
+        run()
+        return max(0, gc.get_count()[0] - before)
+    finally:
+        gc.enable()
+
+def measure(name, run, operations, repeat, size=None):
+    """Time run(), which performs operations operations, and return a
+    result record.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        run()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'name': name, 'size': size, 'ops_per_sec': operations / max(best, 1e-9),
+            'allocations_per_op': allocations(run) / float(operations)}
+
+def object_benchmarks(repeat):
+    titles = ['Rep number %d' % number for number in range(OPERATIONS)]
+    reps = [Rep(title=title) for title in titles]
+    records = [rep.as_dict() for rep in reps]
+    pins = [Pin(number, number + 1) for number in range(OPERATIONS)]
+    pin_records = [pin.as_dict() for pin in pins]
+
+    def rep_construct():
+        for title in titles:
+            Rep(title=title)
+
+    def rep_invalid_title():
+        for _ in titles:
+            try:
+                Rep(title=' invalid ')
+            except ValueError:
+                pass
+
+    def rep_as_dict():
+        for rep in reps:
+            rep.as_dict()
+
+    def rep_from_dict():
+        for record in records:
+            Rep(from_dict=record)
+
+    def pin_as_dict():
+        for pin in pins:
+            pin.as_dict()
+
+    def pin_from_dict():
+        for record in pin_records:
+            Pin(None, None).from_dict(record)
+
+    return [measure(run.__name__, run, OPERATIONS, repeat)
+            for run in (rep_construct, rep_invalid_title, rep_as_dict, rep_from_dict,
+                        pin_as_dict, pin_from_dict)]
+
+def store_benchmarks(size, repeat):
+    rep_store = RepStore()
+    rep_store.update((key, Rep(title='Rep number %s' % key))
+                     for key in rep_store.reserve_keys(size))
+    pin_store = PinStore()
+    pin_store.update((key, Pin(int(key) // FANOUT, key))
+                     for key in pin_store.reserve_keys(size))
+    keys = [str(key) for key in range(1, size + 1)]
+    probes = [keys[(number * 7919) % size] for number in range(OPERATIONS)]
+    parents = [str(int(key) // FANOUT) for key in probes]
+
+    def store_create():
+        for _ in probes:
+            rep_store.create(Rep(title='created'))
+
+    def store_read():
+        for key in probes:
+            rep_store.read(key)
+
+    def store_get_new_key():
+        for _ in probes:
+            rep_store.get_new_key()
+
+    def pin_store_get_children():
+        for parent in parents:
+            pin_store.get_children(parent)
+
+    def store_as_dict():
+        rep_store.as_dict()
+
+    # store_create grows the store, so it runs last.
+    results = [measure(run.__name__, run, OPERATIONS, repeat, size)
+               for run in (store_read, store_get_new_key, pin_store_get_children)]
+    results.append(measure('store_as_dict', store_as_dict, size, repeat, size))
+    results.append(measure('store_create', store_create, OPERATIONS, repeat, size))
+    return results
+
+def scaling(results):
+    """Return the least squares slope of log(seconds per operation) against
+    log(size) for every store benchmark run at more than one size.
+    """
+    curves = {}
+    for result in results:
+        if result['size'] is not None:
+            curves.setdefault(result['name'], []).append(
+                (math.log(result['size']), -math.log(result['ops_per_sec'])))
+    slopes = {}
+    for name, points in curves.items():
+        if len(points) > 1:
+            mean_x = sum(x for x, _ in points) / len(points)
+            mean_y = sum(y for _, y in points) / len(points)
+            slopes[name] = (sum((x - mean_x) * (y - mean_y) for x, y in points) /
+                            sum((x - mean_x) ** 2 for x, _ in points))
+    return slopes
+
+def run(max_size, repeat):
+    results = object_benchmarks(repeat)
+    print_results(results)
+    for size in [size for size in SIZES if size <= max_size]:
+        sized = store_benchmarks(size, repeat)
+        print_results(sized)
+        results.extend(sized)
+    slopes = scaling(results)
+    for name, slope in sorted(slopes.items()):
+        print('%-26s scaling %+.2f' % (name, slope))
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.time(), 'results': results, 'scaling': slopes}
+
+def print_results(results):
+    for result in results:
+        print('%-26s %10s %14.0f ops/s %8.1f allocs/op' % (
+            result['name'], '' if result['size'] is None else result['size'],
+            result['ops_per_sec'], result['allocations_per_op']))
+    sys.stdout.flush()
+
+def compare(old, new, threshold):
+    """Print the change in throughput of each benchmark in both runs and
+    return the number that got slower by more than threshold.
+    """
+    before = dict(((result['name'], result['size']), result) for result in old['results'])
+    regressions = 0
+    for result in new['results']:
+        previous = before.get((result['name'], result['size']))
+        if previous is None:
+            continue
+        change = result['ops_per_sec'] / previous['ops_per_sec'] - 1
+        regressed = change < -threshold
+        regressions += regressed
+        print('%-26s %10s %+7.1f%%%s' % (
+            result['name'], '' if result['size'] is None else result['size'],
+            change * 100, '  REGRESSION' if regressed else ''))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-size', type=int, default=10 ** 5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path) as saved:
+                runs.append(json.load(saved))
+        sys.exit(1 if compare(runs[0], runs[1], args.threshold) else 0)
+    results = run(args.max_size, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Memory used per pin by PinStore and CompactPinStore.
+
+    python -m rep.bench.pin_memory [--count N]
+
+Each store is filled in a fresh interpreter and the growth in resident
+memory is divided by the number of pins.
+"""
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+
+STORES = ('PinStore', 'CompactPinStore')
+
+def resident_bytes():
+    """Current resident set size, read from /proc on Linux.
+    """
+    import os
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def measure(store_name, count):
+    import rep
+    store = getattr(rep, store_name)()
+    before = resident_bytes()
+    with store.batch():
+        for number in range(count):
+            store[store.get_new_key()] = rep.Pin(number % 1000, number)
+    return (resident_bytes() - before) / float(count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--store', choices=STORES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.store:
+        print(measure(args.store, args.count))
+        return
+    for store_name in STORES:
+        output = subprocess.check_output([sys.executable, '-m', 'rep.bench.pin_memory',
+                                          '--count', str(args.count), '--store', store_name])
+        print('%-16s %8.1f bytes/pin' % (store_name, float(output)))
+
+if __name__ == '__main__':
+    main()
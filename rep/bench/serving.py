@@ -0,0 +1,132 @@
+"""Requests per second served by the development server and rep.http_server.
+
+    python -m rep.bench.serving [--count N] [--clients N] [--seconds S] [--workers 1,4]
+
+A rep.store_server is started with --count Reps, and rest_app.py is run on
+the remote backend in front of it: first as the development server with
+--dev, then with each number of --workers.  --clients processes each GET
+random Reps over one connection for --seconds, reconnecting whenever the
+server closes it, as the development server does after every response.
+Reported is the total number of responses per second across all clients.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+REST_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'rest_app.py')
+
+def work(port, count, seconds, start_at):
+    rand = random.Random(os.getpid())
+    connection = httplib.HTTPConnection('127.0.0.1', port, timeout=30)
+    done = 0
+    time.sleep(max(0, start_at - time.time()))
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        connection.request('GET', '/rep/api/v1.0/reps/%d' % rand.randint(1, count))
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError('GET answered %d' % response.status)
+        done += 1
+    connection.close()
+    return done
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+def wait_ready(port, server):
+    for _ in range(1000):
+        if server.poll() is not None:
+            raise RuntimeError('rest_app.py exited with %d' % server.returncode)
+        try:
+            connection = httplib.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/ready')
+            if connection.getresponse().status == 200:
+                return
+        except (socket.error, httplib.HTTPException):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError('rest_app.py did not become ready')
+
+def measure(options, socket_path, args):
+    port = free_port()
+    env = dict(os.environ, REP_BACKEND='remote', REP_SOCKET=socket_path,
+               REP_SNAPSHOT_DIR='', REP_METRICS='0')
+    devnull = open(os.devnull, 'w')
+    # The development server's reloader runs it in a child process, so the
+    # server gets a session of its own and the whole of it is stopped.
+    server = subprocess.Popen([sys.executable, REST_APP, '--host', '127.0.0.1',
+                               '--port', str(port)] + options,
+                              env=env, stdout=devnull, stderr=devnull, preexec_fn=os.setsid)
+    try:
+        wait_ready(port, server)
+        start_at = time.time() + 0.5 + 0.05 * args.clients
+        clients = [subprocess.Popen(
+            [sys.executable, '-m', 'rep.bench.serving', '--client', str(port),
+             '--count', str(args.count), '--seconds', str(args.seconds),
+             '--start-at', str(start_at)],
+            stdout=subprocess.PIPE) for _ in range(args.clients)]
+        return sum(int(client.communicate()[0]) for client in clients) / args.seconds
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+        devnull.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', default='1,4')
+    parser.add_argument('--client', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        print(work(args.client, args.count, args.seconds, args.start_at))
+        return
+
+    from rep import RemoteRepStore, Rep
+    path = tempfile.mkdtemp()
+    socket_path = os.path.join(path, 'rep.sock')
+    store_server = subprocess.Popen([sys.executable, '-m', 'rep.store_server',
+                                     '--socket', socket_path])
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        loader = RemoteRepStore(socket_path, 'reps')
+        loader.update((str(key), Rep(title='Rep number %d' % key))
+                      for key in range(1, args.count + 1))
+        loader.close()
+        print('%-22s %12s' % ('', 'requests/s'))
+        print('%-22s %12.0f' % ('development server', measure(['--dev'], socket_path, args)))
+        for workers in [int(number) for number in args.workers.split(',')]:
+            rate = measure(['--workers', str(workers)], socket_path, args)
+            print('%-22s %12.0f' % ('%d worker%s' % (workers, 's' if workers > 1 else ''),
+                                    rate))
+    finally:
+        store_server.terminate()
+        store_server.wait()
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    main()
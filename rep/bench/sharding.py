@@ -0,0 +1,76 @@
+"""Time of whole store reads on a RepStore and on sharded stores.
+
+    python -m rep.bench.sharding [--count N] [--shards N] [--workers N...] [--pool NAME]
+
+--count Reps are loaded into a RepStore and into a ShardedRepStore per
+worker count, then each is timed for as_dict, an export of every Rep as a
+line of JSON, and building a search index and a sorted title index from
+scratch.  Speed-ups are against the RepStore; they can only grow with the
+workers while there are as many free CPUs.
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from rep import Rep, RepStore, ShardedRepStore
+
+class Discard(object):
+    def write(self, text):
+        pass
+
+def timed(run):
+    start = time.time()
+    run()
+    return time.time() - start
+
+def rebuild_search(store):
+    store.title_index = None
+    store.indexes = [index for index in store.indexes if type(index).__name__ != 'TitleIndex']
+    store.enable_search()
+
+def rebuild_field_index(store):
+    store.indexes = [index for index in store.indexes if index not in
+                     store.field_indexes.get('title', ())]
+    store.field_indexes = {}
+    store.add_field_index('title')
+
+OPERATIONS = (
+    ('as_dict', lambda store: store.as_dict()),
+    ('export', lambda store: store.export(Discard())),
+    ('search index', rebuild_search),
+    ('sorted index', rebuild_field_index),
+)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--pool', choices=('process', 'thread'), default='process')
+    args = parser.parse_args()
+
+    cpus = (len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+            else multiprocessing.cpu_count())
+    print('%d CPUs, %d Reps, %d shards, %s pool' % (cpus, args.count, args.shards, args.pool))
+    stores = [('RepStore', RepStore())]
+    stores.extend(('%d workers' % workers,
+                   ShardedRepStore(shards=args.shards, pool=args.pool, workers=workers))
+                  for workers in args.workers)
+    for _, store in stores:
+        store.update((key, Rep(title='Rep number %s of the benchmark' % key))
+                     for key in store.reserve_keys(args.count))
+
+    print('%-12s' % '' + ''.join('%22s' % label for label, _ in OPERATIONS))
+    baseline = None
+    for label, store in stores:
+        seconds = [timed(lambda: run(store)) for _, run in OPERATIONS]
+        baseline = baseline or seconds
+        print('%-12s' % label + ''.join('%14.2f s %4.1fx' % (time, base / time)
+                                        for time, base in zip(seconds, baseline)))
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Time to save and restore stores as JSON and as binary snapshots.
+
+    python -m rep.bench.snapshot [--count N]
+
+--count Reps and as many Pins are written as newline delimited JSON of
+their as_dict records and as snapshot files.  Restoring from JSON replays
+every record through from_dict and store.update; restoring from a snapshot
+builds the store straight from its columns, with and without validating
+the objects.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from rep import Pin, PinStore, Rep, RepStore
+from rep.snapshot import dump, open_snapshot
+
+def timed(run):
+    start = time.time()
+    result = run()
+    return result, time.time() - start
+
+def write_json(store, path):
+    with open(path, 'w') as output:
+        for key, value in store.snapshot().items():
+            output.write(json.dumps([key, value.as_dict()]) + '\n')
+
+def read_json(store_class, path):
+    def build(record):
+        if store_class is RepStore:
+            return Rep(from_dict=record)
+        return Pin(None, None).from_dict(record)
+    store = store_class()
+    with open(path) as lines:
+        store.update((key, build(record)) for key, record in map(json.loads, lines))
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    args = parser.parse_args()
+
+    rep_store = RepStore()
+    rep_store.update((key, Rep(title='Rep number %s' % key))
+                     for key in rep_store.reserve_keys(args.count))
+    pin_store = PinStore()
+    pin_store.update((key, Pin(int(key) // 10, int(key)))
+                     for key in pin_store.reserve_keys(args.count))
+    path = tempfile.mkdtemp()
+    try:
+        print('%-6s %-22s %10s %10s' % ('store', 'format', 'seconds', 'MB'))
+        for name, store, store_class in (('reps', rep_store, RepStore),
+                                         ('pins', pin_store, PinStore)):
+            json_path = os.path.join(path, name + '.ndjson')
+            snapshot_path = os.path.join(path, name + '.snap')
+            for label, run, file_path in (
+                    ('json write', lambda: write_json(store, json_path), json_path),
+                    ('snapshot dump', lambda: dump(store, snapshot_path), snapshot_path),
+                    ('json replay', lambda: read_json(store_class, json_path), json_path),
+                    ('snapshot load', lambda: open_snapshot(snapshot_path, store_class),
+                     snapshot_path),
+                    ('snapshot load trusted',
+                     lambda: open_snapshot(snapshot_path, store_class, trusted=True),
+                     snapshot_path)):
+                restored, seconds = timed(run)
+                if restored is not None:
+                    assert len(restored) == len(store)
+                del restored
+                print('%-6s %-22s %10.2f %10.1f' % (name, label, seconds,
+                                                    os.path.getsize(file_path) / 1e6))
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Throughput of a StoreServer shared by several worker processes.
+
+    python -m rep.bench.store_server [--count N] [--workers 1,4,16]
+
+A server is started with --count Reps.  For each number of workers, that
+many processes read random Reps through RemoteRepStore for --seconds, one
+GET at a time, as get_many batches and as pipelined GETs, then write with
+SETs.  Reported is the total number of objects read or written per second
+across all workers.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ('get', 'get_many', 'pipeline', 'set')
+BATCH = 100
+
+def work(socket_path, mode, count, seconds, start_at):
+    from rep import RemoteRepStore, Rep
+    store = RemoteRepStore(socket_path, 'reps')
+    rand = random.Random(os.getpid())
+    done = 0
+    time.sleep(max(0, start_at - time.time()))
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if mode == 'get':
+            store.json_fragment(rand.randint(1, count))
+            done += 1
+        elif mode == 'get_many':
+            store.get_many([rand.randint(1, count) for _ in range(BATCH)])
+            done += BATCH
+        elif mode == 'pipeline':
+            with store.pipeline() as pipeline:
+                for _ in range(BATCH):
+                    pipeline.get(rand.randint(1, count))
+            done += BATCH
+        else:
+            store[rand.randint(1, count)] = Rep(title='written')
+            done += 1
+    store.close()
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--workers', default='1,4,16')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--socket', help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(work(args.socket, args.worker, args.count, args.seconds, args.start_at))
+        return
+
+    from rep import RemoteRepStore, Rep
+    path = tempfile.mkdtemp()
+    socket_path = os.path.join(path, 'rep.sock')
+    server = subprocess.Popen([sys.executable, '-m', 'rep.store_server',
+                               '--socket', socket_path])
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        loader = RemoteRepStore(socket_path, 'reps')
+        loader.update((str(key), Rep(title='Rep number %d' % key))
+                      for key in range(1, args.count + 1))
+        loader.close()
+        print('objects/s')
+        print('%-8s' % 'workers' + ''.join('%12s' % mode for mode in MODES))
+        for workers in [int(number) for number in args.workers.split(',')]:
+            rates = []
+            for mode in MODES:
+                start_at = time.time() + 0.5 + 0.05 * workers
+                processes = [subprocess.Popen(
+                    [sys.executable, '-m', 'rep.bench.store_server', '--worker', mode,
+                     '--socket', socket_path, '--count', str(args.count),
+                     '--seconds', str(args.seconds), '--start-at', str(start_at)],
+                    stdout=subprocess.PIPE) for _ in range(workers)]
+                done = sum(int(process.communicate()[0]) for process in processes)
+                rates.append(done / args.seconds)
+            print('%-8d' % workers + ''.join('%12.0f' % rate for rate in rates))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    main()
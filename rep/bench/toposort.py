@@ -0,0 +1,95 @@
+"""Cost of keeping pins free of cycles on deep and wide graphs.
+
+    python -m rep.bench.toposort [--count N] [--naive-count N]
+
+--count pins are loaded into a PinStore with and without a topological
+order, for each graph:
+
+    deep top down   a chain 0 -> 1 -> ... added from the root
+    deep bottom up  the same chain added from the leaf
+    deep shuffled   the same chain added in a random order
+    wide fan out    one Rep with --count children
+    wide fan in     --count Reps with the same child
+    random dag      pins between random Reps, lower key to higher
+
+followed by the time to refuse a pin that would close a cycle through the
+whole graph, and to list the order.  The naive check, a walk of the
+descendants of each new child looking for its parent, is timed on
+--naive-count pins for comparison.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from rep import CycleError, Pin, PinStore
+
+def graphs(count):
+    chooser = random.Random(0)
+    chain = [(number, number + 1) for number in range(count)]
+    shuffled = list(chain)
+    chooser.shuffle(shuffled)
+    dag = []
+    while len(dag) < count:
+        parent, child = chooser.randint(0, count // 4), chooser.randint(0, count // 4)
+        if parent != child:
+            dag.append((min(parent, child), max(parent, child)))
+    return (
+        ('deep top down', chain, (count, 0)),
+        ('deep bottom up', chain[::-1], (count, 0)),
+        ('deep shuffled', shuffled, (count, 0)),
+        ('wide fan out', [(0, number) for number in range(1, count + 1)], (count, 0)),
+        ('wide fan in', [(number, 0) for number in range(1, count + 1)], (0, count)),
+        ('random dag', dag, None),
+    )
+
+def load(pin_store, pins):
+    start = time.time()
+    keys = pin_store.reserve_keys(len(pins))
+    for block in range(0, len(pins), 1000):
+        pin_store.update((key, Pin(parent, child)) for key, (parent, child) in
+                         zip(keys[block:block + 1000], pins[block:block + 1000]))
+    return time.time() - start
+
+def naive_load(pins):
+    """Load pins checking each with a walk from its child."""
+    pin_store = PinStore()
+    start = time.time()
+    for parent, child in pins:
+        if any(rep == parent for _, _, rep in pin_store.descendants(child)):
+            raise CycleError("%s is already an ancestor of %s" % (child, parent))
+        pin_store.create(Pin(parent, child))
+    return time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--naive-count', type=int, default=10000)
+    args = parser.parse_args()
+
+    print('%-16s %10s %10s %10s %10s %10s' % ('graph', 'plain s', 'ordered s', 'refuse ms',
+                                               'order s', 'naive s'))
+    naive_graphs = dict((label, pins) for label, pins, _ in graphs(args.naive_count))
+    for label, pins, closing in graphs(args.count):
+        plain = load(PinStore(), pins)
+        pin_store = PinStore()
+        pin_store.enable_topological_order()
+        ordered = load(pin_store, pins)
+        refuse = float('nan')
+        if closing is not None:
+            start = time.time()
+            try:
+                pin_store.create(Pin(*closing))
+            except CycleError:
+                refuse = (time.time() - start) * 1000
+        start = time.time()
+        pin_store.toposort()
+        order = time.time() - start
+        del pin_store
+        naive = naive_load(naive_graphs[label])
+        print('%-16s %10.2f %10.2f %10.2f %10.2f %10.2f' % (label, plain, ordered, refuse,
+                                                           order, naive))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+import collections
+import contextlib
+import threading
+import time
+
+MODES = ('write-through', 'write-back')
+
+# Whole store operations of the backend, passed through once the writes
+# waiting in a write-back cache are flushed.
+_FLUSHED = ('copy', 'json_lines', 'ordered_keys', 'records', 'scan', 'select', 'snapshot')
+
+class CachedBackend(collections.MutableMapping):
+    """Store backend that keeps the most used objects of a slower backend in
+    process memory, so that reading them again costs a dict lookup.
+
+    Reads go through the cache: a miss reads the object from backend and
+    keeps it.  Once more than max_items objects are kept they are evicted in
+    approximately least recently used order, by the CLOCK algorithm as in
+    JsonCache.  Whole store reads such as iteration, records() and
+    ordered_keys() go to the backend, and only the methods backend has are
+    offered, so a Store treats the cache as it would the backend.
+
+    mode decides when writes reach backend:
+
+    write-through  before the write returns.  A write that fails changes
+                   neither, and a transaction that fails drops the cache.
+    write-back     when max_dirty writes are waiting, on flush() or close(),
+                   or before a whole store read.  Repeated writes to a key
+                   cost one backend write, but writes are not grouped into
+                   the store's transactions, and a crash loses those
+                   waiting.
+
+    Writes made through the cache keep it up to date.  Those made to
+    backend by anything else are found if backend has a data_version()
+    method, whose value changes when something other than backend, such as
+    another process, writes: it is checked at most every check_interval
+    seconds, and a change drops every cached object.  invalidate() drops
+    some or all of them by hand.
+    """
+    DEFAULT_MAX_ITEMS = 100000
+
+    def __init__(self, backend, max_items=DEFAULT_MAX_ITEMS, mode='write-through',
+                 max_dirty=1000, check_interval=1.0):
+        if mode not in MODES:
+            raise ValueError("%s is not a valid cache mode" % mode)
+        self.backend = backend
+        self.max_items = max_items
+        self.mode = mode
+        self.max_dirty = max(1, min(max_dirty, max_items))
+        self.check_interval = check_interval
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.writebacks = 0
+        # Every key in the ring is in __items; the value of a discarded key
+        # is None until the sweep reaches it.  Dirty objects are also kept
+        # in __items, and are never evicted.
+        self.__items = {}
+        self.__ring = collections.deque()
+        self.__referenced = set()
+        self.__discarded = 0
+        self.__dirty = {}
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.RLock()
+        self.__version = None
+        self.__checked = 0
+
+    def __getattr__(self, name):
+        if name in _FLUSHED:
+            method = getattr(self.backend, name)
+            def flushed(*args, **kwargs):
+                self.flush()
+                return method(*args, **kwargs)
+            return flushed
+        if name == 'transaction' and self.mode == 'write-through':
+            transaction = getattr(self.backend, name)
+            return lambda: self.__transaction(transaction())
+        raise AttributeError(name)
+
+    def __getitem__(self, key):
+        self.__check()
+        with self.__lock:
+            value = self.__items.get(key)
+            if value is not None:
+                self.__referenced.add(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self.generation
+        value = self.backend[key]
+        with self.__lock:
+            if generation == self.generation:
+                self.__keep(key, value)
+        return value
+
+    def get_many(self, keys):
+        """Return the objects under keys, in the same order, with None for
+        missing keys.  The misses are read from backend together, with its
+        get_many(keys) if it has one.
+        """
+        self.__check()
+        values = []
+        missing = []
+        with self.__lock:
+            for key in keys:
+                value = self.__items.get(key)
+                if value is None:
+                    missing.append(len(values))
+                else:
+                    self.__referenced.add(key)
+                    self.hits += 1
+                values.append(value)
+            self.misses += len(missing)
+            generation = self.generation
+        if not missing:
+            return values
+        missing_keys = [keys[index] for index in missing]
+        if hasattr(self.backend, 'get_many'):
+            found = self.backend.get_many(missing_keys)
+        else:
+            found = [self.backend.get(key) for key in missing_keys]
+        with self.__lock:
+            for index, value in zip(missing, found):
+                values[index] = value
+                if value is not None and generation == self.generation:
+                    self.__keep(keys[index], value)
+        return values
+
+    def record(self, key):
+        """Return the as_dict record of the object under key.
+        """
+        return self[key].as_dict()
+
+    def get_records(self, keys):
+        """Return the records of the objects under keys, in the same order,
+        with None for missing keys.
+        """
+        return [None if value is None else value.as_dict() for value in self.get_many(keys)]
+
+    def __setitem__(self, key, value):
+        with self.__write_lock:
+            if self.mode == 'write-through':
+                self.backend[key] = value
+            with self.__lock:
+                self.generation += 1
+                # Marked dirty first, so that keeping it cannot evict it.
+                if self.mode == 'write-back':
+                    self.__dirty[key] = value
+                self.__keep(key, value)
+                waiting = len(self.__dirty)
+            if waiting >= self.max_dirty:
+                self.flush()
+
+    def __delitem__(self, key):
+        with self.__write_lock:
+            with self.__lock:
+                dirty = self.__dirty.pop(key, None) is not None
+            try:
+                del self.backend[key]
+            except KeyError:
+                if not dirty:
+                    raise
+            finally:
+                with self.__lock:
+                    self.generation += 1
+                    self.__discard(key)
+
+    def __contains__(self, key):
+        with self.__lock:
+            if self.__items.get(key) is not None:
+                return True
+        return key in self.backend
+
+    def __iter__(self):
+        self.flush()
+        return iter(self.backend)
+
+    def __len__(self):
+        self.flush()
+        return len(self.backend)
+
+    def iteritems(self):
+        self.flush()
+        if hasattr(self.backend, 'iteritems'):
+            return self.backend.iteritems()
+        return ((key, self.backend[key]) for key in self.backend)
+
+    def flush(self):
+        """Write the objects waiting in a write-back cache to backend, in
+        one transaction if backend has transactions.
+        """
+        with self.__write_lock:
+            with self.__lock:
+                dirty = dict(self.__dirty)
+            if not dirty:
+                return
+            transaction = getattr(self.backend, 'transaction', None)
+            with transaction() if transaction else _no_transaction():
+                for key, value in dirty.iteritems():
+                    self.backend[key] = value
+            with self.__lock:
+                for key, value in dirty.iteritems():
+                    if self.__dirty.get(key) is value:
+                        del self.__dirty[key]
+                self.writebacks += len(dirty)
+
+    def invalidate(self, keys=None):
+        """Drop the cached objects under keys, or every cached object, so
+        they are read from backend again.  Objects waiting to be written are
+        kept.
+        """
+        with self.__lock:
+            self.generation += 1
+            if keys is None:
+                keys = [key for key, value in self.__items.iteritems() if value is not None]
+            for key in keys:
+                if key not in self.__dirty and self.__discard(key):
+                    self.invalidations += 1
+
+    def stats(self):
+        """Return the hit, miss, eviction and invalidation counts and the
+        size of the cache.
+        """
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'invalidations': self.invalidations,
+                    'writebacks': self.writebacks, 'dirty': len(self.__dirty),
+                    'entries': len(self.__items) - self.__discarded,
+                    'max_items': self.max_items, 'mode': self.mode}
+
+    def close(self):
+        """Flush the waiting writes and close backend, if it can be.
+        """
+        self.flush()
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+
+    @contextlib.contextmanager
+    def __transaction(self, transaction):
+        try:
+            with transaction as db:
+                yield db
+        except Exception:
+            self.invalidate()
+            raise
+
+    def __check(self):
+        """Drop the cache if backend has been written to by anything else
+        since the last check.
+        """
+        data_version = getattr(self.backend, 'data_version', None)
+        if data_version is None:
+            return
+        now = time.time()
+        if now - self.__checked < self.check_interval:
+            return
+        self.__checked = now
+        version = data_version()
+        with self.__lock:
+            changed = self.__version is not None and version != self.__version
+            self.__version = version
+        if changed:
+            self.invalidate()
+
+    def __keep(self, key, value):
+        if key in self.__items:
+            if self.__items[key] is None:
+                self.__discarded -= 1
+        else:
+            self.__ring.append(key)
+        self.__items[key] = value
+        self.__evict()
+
+    def __discard(self, key):
+        if self.__items.get(key) is None:
+            return False
+        self.__items[key] = None
+        self.__referenced.discard(key)
+        self.__discarded += 1
+        if self.__discarded * 2 > len(self.__items):
+            self.__sweep_discarded()
+        return True
+
+    def __evict(self):
+        items, ring, referenced, dirty = self.__items, self.__ring, self.__referenced, self.__dirty
+        while len(items) - self.__discarded > self.max_items:
+            key = ring.popleft()
+            value = items[key]
+            if value is None:
+                del items[key]
+                self.__discarded -= 1
+            elif key in referenced or key in dirty:
+                referenced.discard(key)
+                ring.append(key)
+            else:
+                del items[key]
+                self.evictions += 1
+
+    def __sweep_discarded(self):
+        items = self.__items
+        self.__ring = collections.deque(key for key in self.__ring if items[key] is not None)
+        for key in [key for key, value in items.items() if value is None]:
+            del items[key]
+        self.__discarded = 0
+
+
+@contextlib.contextmanager
+def _no_transaction():
+    yield
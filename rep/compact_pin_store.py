@@ -0,0 +1,222 @@
+import array
+import bisect
+import collections
+
+from .pin import Pin
+from .pin_store import PinStore
+
+class CompactPinBackend(collections.MutableMapping):
+    """Store backend that keeps pins as integer columns instead of objects.
+
+    Each pin takes one slot in three typed arrays holding its key, parent and
+    child.  Slots of deleted pins go on a free list and are reused.  A Pin
+    object is only built when one is read, so changes made to it in place
+    must be written back, which PinStore does through its pin watchers.
+
+    Keys, parents and children must all be integers (or integer strings);
+    parents and children are always read back as ints.
+
+    Keys are kept in order the way KeyOrder keeps them: keys that arrive in
+    order are appended, others are sorted in the next time the order is
+    read, and deleted keys are only swept out once they make up half of it.
+    """
+    TYPECODE = 'l'
+    FREE = -1
+
+    def __init__(self):
+        self.__slots = {}
+        self.__keys = array.array(self.TYPECODE)
+        self.__parents = array.array(self.TYPECODE)
+        self.__children = array.array(self.TYPECODE)
+        self.__free = array.array(self.TYPECODE)
+        self.__order = array.array(self.TYPECODE)
+        self.__unsorted = False
+        self.__removed = set()
+
+    def __getitem__(self, key):
+        slot = self.__slot(key)
+        return Pin(self.__parents[slot], self.__children[slot])
+
+    def __setitem__(self, key, value):
+        number = _integer(key)
+        parent, child = _integer(value.parent), _integer(value.child)
+        slot = self.__slots.get(number)
+        if slot is None:
+            if self.__free:
+                slot = self.__free.pop()
+                self.__keys[slot] = number
+                self.__parents[slot] = parent
+                self.__children[slot] = child
+            else:
+                slot = len(self.__keys)
+                self.__keys.append(number)
+                self.__parents.append(parent)
+                self.__children.append(child)
+            self.__slots[number] = slot
+            if number in self.__removed:
+                # Still in the order, where it belongs.
+                self.__removed.discard(number)
+            else:
+                if self.__order and number <= self.__order[-1]:
+                    self.__unsorted = True
+                self.__order.append(number)
+        else:
+            self.__parents[slot] = parent
+            self.__children[slot] = child
+
+    def __delitem__(self, key):
+        slot = self.__slot(key)
+        number = self.__keys[slot]
+        del self.__slots[number]
+        self.__keys[slot] = self.FREE
+        self.__free.append(slot)
+        self.__removed.add(number)
+
+    def __iter__(self):
+        for number in self.__slots:
+            yield str(number)
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __contains__(self, key):
+        try:
+            self.__slot(key)
+        except KeyError:
+            return False
+        return True
+
+    def copy(self):
+        """Return a new CompactPinBackend holding the same pins.
+        """
+        other = CompactPinBackend()
+        other.__slots = dict(self.__slots)
+        other.__keys = self.__keys[:]
+        other.__parents = self.__parents[:]
+        other.__children = self.__children[:]
+        other.__free = self.__free[:]
+        other.__order = self.__order[:]
+        other.__unsorted = self.__unsorted
+        other.__removed = set(self.__removed)
+        return other
+
+    def ordered_keys(self, after=None):
+        """Yield keys in ascending order, starting after the key after.
+        Keys are numbers, so none follow an after that is not all digits,
+        as in KeyOrder.
+        """
+        if after is not None and not str(after).isdigit():
+            return
+        if self.__unsorted or len(self.__removed) * 2 > len(self.__order):
+            self.__order = array.array(self.TYPECODE, sorted(self.__slots))
+            self.__unsorted = False
+            self.__removed = set()
+        order = self.__order
+        index = 0 if after is None else bisect.bisect_right(order, int(after))
+        while index < len(order):
+            number = order[index]
+            if number in self.__slots:
+                yield str(number)
+            index += 1
+
+    def child_of(self, key):
+        return self.__children[self.__slot(key)]
+
+    def parent_of(self, key):
+        return self.__parents[self.__slot(key)]
+
+    def __slot(self, key):
+        try:
+            return self.__slots[int(key)]
+        except ValueError:
+            raise KeyError(key)
+
+
+class CompactPinIndex(object):
+    """PinIndex for a CompactPinBackend.  Each Rep maps to the keys of the
+    pins that point at or away from it, held as a plain int when there is
+    only one and as a typed array otherwise.  The other end of each pin is
+    read from the backend's columns.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.__by_parent = {}
+        self.__by_child = {}
+
+    def add(self, key, pin):
+        self.__insert(self.__by_parent, pin.parent, key)
+        self.__insert(self.__by_child, pin.child, key)
+
+    def remove(self, key, pin):
+        self.__discard(self.__by_parent, pin.parent, key)
+        self.__discard(self.__by_child, pin.child, key)
+
+    def children(self, parent):
+        return self.__ends(self.backend.child_of, self.__keys(self.__by_parent, parent))
+
+    def parents(self, child):
+        return self.__ends(self.backend.parent_of, self.__keys(self.__by_child, child))
+
+    @staticmethod
+    def __ends(end_of, keys):
+        # A pin can be deleted by another thread between reading its key
+        # here and reading its other end from the backend.
+        ends = []
+        for key in list(keys):
+            try:
+                ends.append(end_of(key))
+            except KeyError:
+                pass
+        return ends
+
+    @staticmethod
+    def __keys(index, rep_key):
+        try:
+            keys = index.get(int(rep_key), ())
+        except ValueError:
+            return ()
+        return (keys,) if isinstance(keys, int) else keys
+
+    @staticmethod
+    def __insert(index, rep_key, key):
+        rep_key, key = _integer(rep_key), _integer(key)
+        keys = index.get(rep_key)
+        if keys is None:
+            index[rep_key] = key
+        elif isinstance(keys, int):
+            index[rep_key] = array.array(CompactPinBackend.TYPECODE, [keys, key])
+        else:
+            keys.append(key)
+
+    @staticmethod
+    def __discard(index, rep_key, key):
+        rep_key, key = int(rep_key), int(key)
+        keys = index.get(rep_key)
+        if keys == key:
+            del index[rep_key]
+        elif not isinstance(keys, (int, type(None))) and key in keys:
+            keys.remove(key)
+            if len(keys) == 1:
+                index[rep_key] = keys[0]
+
+
+class CompactPinStore(PinStore):
+    """A PinStore kept in a CompactPinBackend, for very large numbers of
+    pins between integer Rep keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__backend = CompactPinBackend()
+        kwargs['backend'] = self.__backend
+        super(CompactPinStore, self).__init__(*args, **kwargs)
+
+    def create_pin_index(self):
+        return self.add_index(CompactPinIndex(self.__backend))
+
+
+def _integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("%s is not an integer key" % value)
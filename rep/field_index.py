@@ -0,0 +1,278 @@
+import bisect
+import collections
+import functools
+import heapq
+import threading
+
+from .key_order import sort_key
+
+class HashIndex(object):
+    """Index from the values of one field to the keys of the objects that
+    have them, for equality lookups.  It is a store index, so it is kept up
+    to date on every change.
+    """
+    kind = 'hash'
+
+    def __init__(self, field):
+        self.field = field
+        self.__keys = {}
+        self.__lock = threading.Lock()
+
+    def add(self, key, item):
+        value = getattr(item, self.field)
+        with self.__lock:
+            keys = self.__keys.get(value)
+            if keys is None:
+                self.__keys[value] = set([key])
+            else:
+                keys.add(key)
+
+    def remove(self, key, item):
+        value = getattr(item, self.field)
+        with self.__lock:
+            keys = self.__keys.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.__keys[value]
+
+    def fill(self, scan):
+        """Add the objects of a backend with a scan method, grouping each
+        part's keys by value where scan runs it.
+        """
+        for part in scan(functools.partial(_grouped_keys, self.field)):
+            with self.__lock:
+                for value in part.viewkeys() & self.__keys.viewkeys():
+                    self.__keys[value].update(part.pop(value))
+                self.__keys.update(part)
+
+    def count(self, value):
+        return len(self.__keys.get(value, ()))
+
+    def equal(self, value):
+        """Return the keys of the objects whose field is value, in key
+        order.
+        """
+        with self.__lock:
+            keys = list(self.__keys.get(value, ()))
+        return sorted(keys, key=sort_key)
+
+
+class SortedIndex(object):
+    """Index keeping the objects of a store ordered by one field, ties in
+    key order, for equality and range lookups and for reading objects in
+    field order.  It is a store index, so it is kept up to date on every
+    change.
+
+    Entries are (value, sort_key(key)) pairs in a sorted list.  Changes are
+    only merged in when the index is next read: a few are inserted one by
+    one, a burst is sorted in with one pass, so a bulk load does not pay
+    for a list insertion per object.
+    """
+    kind = 'sorted'
+    MERGE_ONE_BY_ONE = 32
+    READ_BLOCK = 1000
+
+    def __init__(self, field):
+        self.field = field
+        self.__entries = []
+        self.__added = []
+        self.__removed = []
+        self.__lock = threading.Lock()
+
+    def add(self, key, item):
+        entry = (getattr(item, self.field), sort_key(key))
+        with self.__lock:
+            self.__added.append(entry)
+
+    def remove(self, key, item):
+        entry = (getattr(item, self.field), sort_key(key))
+        with self.__lock:
+            self.__removed.append(entry)
+
+    def fill(self, scan):
+        """Add the objects of a backend with a scan method, sorting each
+        part's entries where scan runs it.  The sorted parts are then merged
+        with one sort, which finds them already in runs.
+        """
+        parts = scan(functools.partial(_sorted_entries, self.field))
+        with self.__lock:
+            entries = list(self.__merged())
+            for part in parts:
+                entries.extend(part)
+            entries.sort()
+            self.__entries = entries
+
+    def count(self, value):
+        return self.count_range(value, value)
+
+    def count_range(self, low=None, high=None):
+        with self.__lock:
+            start, end = self.__bounds(self.__merged(), low, high)
+        return end - start
+
+    def equal(self, value):
+        return list(self.range(value, value))
+
+    def range(self, low=None, high=None, descending=False):
+        """Yield the keys of the objects whose field is from low to high,
+        both included and either left open with None, in field order.
+
+        Entries are copied out READ_BLOCK at a time, each block picking up
+        after the last entry of the one before, so reading the first few
+        of a long range is cheap and changes made meanwhile are seen.
+        """
+        last = None
+        while True:
+            with self.__lock:
+                entries = self.__merged()
+                start, end = self.__bounds(entries, low, high)
+                if descending:
+                    if last is not None:
+                        end = bisect.bisect_left(entries, last, start, end)
+                    block = entries[max(start, end - self.READ_BLOCK):end]
+                    block.reverse()
+                else:
+                    if last is not None:
+                        start = bisect.bisect_right(entries, last, start, end)
+                    block = entries[start:min(end, start + self.READ_BLOCK)]
+            for _, position in block:
+                yield position[1]
+            if len(block) < self.READ_BLOCK:
+                return
+            last = block[-1]
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__merged())
+
+    @staticmethod
+    def __bounds(entries, low, high):
+        start = 0 if low is None else bisect.bisect_left(entries, (low,))
+        end = len(entries) if high is None else bisect.bisect_right(entries, (high, _HIGHEST))
+        return start, end
+
+    def __merged(self):
+        entries = self.__entries
+        added, removed = self.__added, self.__removed
+        if not added and not removed:
+            return entries
+        # Each add of an entry cancels out one remove of it before a merge.
+        # They are counted, as an entry can be removed, added and removed
+        # again when an object is replaced and then deleted.
+        added_counts = collections.Counter(added)
+        removed_counts = collections.Counter(removed)
+        cancelled = added_counts & removed_counts
+        added = list((added_counts - cancelled).elements())
+        removed = list((removed_counts - cancelled).elements())
+        if len(added) + len(removed) <= self.MERGE_ONE_BY_ONE:
+            for entry in removed:
+                index = bisect.bisect_left(entries, entry)
+                if index < len(entries) and entries[index] == entry:
+                    del entries[index]
+            for entry in added:
+                bisect.insort(entries, entry)
+        else:
+            dropped = set(removed)
+            added.sort()
+            entries = list(heapq.merge([entry for entry in entries if entry not in dropped],
+                                       added))
+        self.__entries = entries
+        self.__added = []
+        self.__removed = []
+        return entries
+
+
+class _Highest(object):
+    """Compares above everything else, to bound a range of equal values."""
+
+    def __gt__(self, other):
+        return True
+
+    def __lt__(self, other):
+        return False
+
+    def __eq__(self, other):
+        return isinstance(other, _Highest)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __ge__(self, other):
+        return True
+
+    def __le__(self, other):
+        return self == other
+
+    def __hash__(self):
+        return 0
+
+_HIGHEST = _Highest()
+
+def _grouped_keys(field, items):
+    grouped = {}
+    for key, item in items.iteritems():
+        value = getattr(item, field)
+        if value in grouped:
+            grouped[value].add(key)
+        else:
+            grouped[value] = set([key])
+    return grouped
+
+def _sorted_entries(field, items):
+    return sorted((getattr(item, field), sort_key(key)) for key, item in items.iteritems())
+
+INDEX_KINDS = {'hash': HashIndex, 'sorted': SortedIndex}
+
+
+class QueryPlan(object):
+    """How Store.query answers a query: which index, if any, gives the
+    candidate keys, and the estimated number of objects it will read.
+    describe() gives a one line summary, such as "sorted title range".
+    """
+
+    def __init__(self, index=None, access='scan', cost=0):
+        self.index = index
+        self.access = access
+        self.cost = cost
+
+    def describe(self):
+        if self.index is None:
+            return 'scan'
+        return '%s %s %s' % (self.index.kind, self.index.field, self.access)
+
+
+def plan(indexes, size, where, ranges, sort, limit):
+    """Choose how to answer a query from indexes, a dict of field name to
+    the list of its indexes, in a store of size objects.
+
+    Every plan reads its candidates' records to check the conditions it does
+    not answer itself, so the cheapest plan reads the fewest.  An equality
+    lookup reads the objects with that value.  A range lookup reads those in
+    the range, and walking a sorted index on the sort field stops once limit
+    objects have matched, which for a query matching a share s of the store
+    means reading about limit / s.
+    """
+    best = QueryPlan(cost=size)
+    for field, value in where.items():
+        for index in indexes.get(field, ()):
+            count = index.count(value)
+            if count < best.cost:
+                best = QueryPlan(index, 'equal', count)
+    for field, (low, high) in ranges.items():
+        for index in indexes.get(field, ()):
+            if index.kind == 'sorted':
+                count = index.count_range(low, high)
+                if sort == field and limit is not None:
+                    count = min(count, limit)
+                if count < best.cost or (count == best.cost and sort == field):
+                    best = QueryPlan(index, 'range', count)
+    if sort is not None and limit is not None:
+        for index in indexes.get(sort, ()):
+            if index.kind == 'sorted':
+                matching = best.cost if best.index is not None else size
+                share = matching / float(max(size, 1))
+                cost = min(size, limit / share) if share else size
+                if cost < best.cost or (best.index is None and cost <= best.cost):
+                    best = QueryPlan(index, 'ordered', int(cost))
+    return best
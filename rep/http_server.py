@@ -0,0 +1,303 @@
+"""Serve a WSGI app from a pool of pre-forked worker processes.
+
+The listening socket is opened once and shared by every worker, so the
+kernel spreads new connections across them.  Each worker serves up to
+threads connections at once, a thread each, and keeps a connection open
+between requests (HTTP/1.1 keep-alive) until it has been idle for
+keep_alive seconds.
+
+On SIGTERM or SIGINT a worker drains: it stops accepting, closes its idle
+connections, tells clients of busy ones that the connection will close,
+and waits up to drain_timeout seconds for the requests in progress before
+it exits.  The parent passes the signal on to every worker and waits for
+them; a worker that dies otherwise is replaced.
+"""
+from __future__ import print_function
+
+import errno
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import LimitedStream
+
+DEFAULT_THREADS = 64
+DEFAULT_KEEP_ALIVE = 5.0
+DEFAULT_DRAIN_TIMEOUT = 30.0
+BACKLOG = 1024
+
+class RequestHandler(WSGIRequestHandler):
+    """Serves the requests of one connection, keeping it open between them.
+    Response headers and bodies are buffered until the app's output is
+    flushed, so a short response goes out in one packet.
+    """
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def setup(self):
+        self.timeout = self.server.keep_alive
+        self.busy = False
+        self.connection = self.request
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        WSGIRequestHandler.setup(self)
+        self.server.opened(self)
+
+    def finish(self):
+        self.server.closed(self)
+        WSGIRequestHandler.finish(self)
+
+    def handle_one_request(self):
+        self.raw_requestline = self.rfile.readline()
+        if not self.raw_requestline:
+            self.close_connection = 1
+            return
+        with self.server.lock:
+            self.busy = True
+        self.body = None
+        try:
+            if self.parse_request():
+                self.run_wsgi()
+        finally:
+            self.server.done(self)
+        if not self.__reusable():
+            self.close_connection = 1
+
+    def make_environ(self):
+        environ = WSGIRequestHandler.make_environ(self)
+        length = environ.get('CONTENT_LENGTH') or '0'
+        if not environ.get('wsgi.input_terminated') and length.isdigit():
+            self.body = environ['wsgi.input'] = LimitedStream(self.rfile, int(length))
+        return environ
+
+    def end_headers(self):
+        if not self.close_connection and not self.__reusable():
+            self.send_header('Connection', 'close')
+            self.close_connection = 1
+        WSGIRequestHandler.end_headers(self)
+
+    def __reusable(self):
+        # The next request cannot be found after a body left unread, so a
+        # connection is only kept once its request has been read whole.
+        return not self.server.draining and self.body is not None and self.body.is_exhausted
+
+    def log_request(self, *args, **kwargs):
+        if self.server.access_log:
+            WSGIRequestHandler.log_request(self, *args, **kwargs)
+
+
+class WorkerServer(ThreadedWSGIServer):
+    """Serves app on the listening socket whose file descriptor is fd, with
+    a thread per connection and at most threads connections at once.  Call
+    serve_forever, then drain once it returns.
+    """
+
+    def __init__(self, app, fd, threads=DEFAULT_THREADS, keep_alive=DEFAULT_KEEP_ALIVE,
+                 access_log=False):
+        listener = socket.fromfd(fd, socket.AF_INET, socket.SOCK_STREAM)
+        host, port = listener.getsockname()[:2]
+        listener.close()
+        ThreadedWSGIServer.__init__(self, host, port, app, RequestHandler, fd=fd)
+        if not isinstance(self.socket, socket.socket):
+            # Python 2's fromfd gives the bare _socket object, whose
+            # connections would have no makefile.
+            self.socket = socket.socket(_sock=self.socket)
+        self.keep_alive = keep_alive
+        self.access_log = access_log
+        self.threads = threads
+        self.draining = False
+        self.lock = threading.Lock()
+        self.__idle = threading.Condition(self.lock)
+        self.__slot_free = threading.Condition(self.lock)
+        self.__connections = 0
+        self.__handlers = set()
+        self.__on_stop = []
+
+    def process_request(self, request, client_address):
+        # This runs in the serve_forever loop, so the wait for a free slot
+        # must end when stop() is called, or shutdown() would never return.
+        with self.lock:
+            while self.__connections >= self.threads and not self.draining:
+                self.__slot_free.wait(1.0)
+            if self.draining:
+                accepted = False
+            else:
+                accepted = True
+                self.__connections += 1
+        if not accepted:
+            self.shutdown_request(request)
+            return
+        try:
+            ThreadedWSGIServer.process_request(self, request, client_address)
+        except Exception:
+            self.__release_slot()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            ThreadedWSGIServer.process_request_thread(self, request, client_address)
+        finally:
+            self.__release_slot()
+
+    def __release_slot(self):
+        with self.lock:
+            self.__connections -= 1
+            self.__slot_free.notify()
+
+    def opened(self, handler):
+        with self.lock:
+            self.__handlers.add(handler)
+
+    def closed(self, handler):
+        with self.lock:
+            self.__handlers.discard(handler)
+
+    def done(self, handler):
+        """Record that handler finished a request.
+        """
+        with self.lock:
+            handler.busy = False
+            self.__idle.notify_all()
+
+    def on_stop(self, callback):
+        """Call callback() when stop is called, so that requests that would
+        otherwise run for long, such as event streams, can end.
+        """
+        self.__on_stop.append(callback)
+
+    def stop(self):
+        """Stop accepting connections and close the idle ones, from any
+        thread but the one running serve_forever.
+        """
+        with self.lock:
+            self.draining = True
+            self.__slot_free.notify_all()
+            idle = [handler for handler in self.__handlers if not handler.busy]
+        for callback in self.__on_stop:
+            callback()
+        for handler in idle:
+            try:
+                handler.connection.shutdown(socket.SHUT_RD)
+            except socket.error:
+                pass
+        self.shutdown()
+
+    def drain(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        """Wait up to timeout seconds for the requests in progress to
+        finish, and return whether they all did.
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.__busy_count() and time.time() < deadline:
+                self.__idle.wait(min(1.0, deadline - time.time()))
+            return not self.__busy_count()
+
+    def __busy_count(self):
+        return sum(1 for handler in self.__handlers if handler.busy)
+
+
+def listen(host, port, backlog=BACKLOG):
+    """Return a socket listening on host and port.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    return listener
+
+def run_worker(create, listener, threads=DEFAULT_THREADS, keep_alive=DEFAULT_KEEP_ALIVE,
+               drain_timeout=DEFAULT_DRAIN_TIMEOUT, access_log=False, close=None, stop=None):
+    """Serve the app returned by create() on listener until SIGTERM or
+    SIGINT, then drain and call close(app) if given.  stop(app), if given,
+    is called as draining starts.
+    """
+    app = create()
+    server = WorkerServer(app, listener.fileno(), threads, keep_alive, access_log)
+    if stop is not None:
+        server.on_stop(lambda: stop(app))
+    def stop_server(*_):
+        stopper = threading.Thread(target=server.stop)
+        stopper.daemon = True
+        stopper.start()
+    signal.signal(signal.SIGTERM, stop_server)
+    signal.signal(signal.SIGINT, stop_server)
+    server.serve_forever()
+    if not server.drain(drain_timeout):
+        print('%d: requests still in progress after %s s' % (os.getpid(), drain_timeout),
+              file=sys.stderr)
+    if close is not None:
+        close(app)
+
+def serve(create, host='0.0.0.0', port=5000, workers=1, threads=DEFAULT_THREADS,
+          keep_alive=DEFAULT_KEEP_ALIVE, drain_timeout=DEFAULT_DRAIN_TIMEOUT,
+          access_log=False, close=None, stop=None):
+    """Serve the WSGI app returned by create() on host and port from
+    workers processes until SIGTERM or SIGINT.  Each process calls create
+    once, after it is forked, stop(app), if given, as it starts to drain,
+    and close(app), if given, once drained.  With one worker the app is
+    served from this process.
+    """
+    listener = listen(host, port)
+    options = dict(threads=threads, keep_alive=keep_alive, drain_timeout=drain_timeout,
+                   access_log=access_log, close=close, stop=stop)
+    if workers == 1:
+        try:
+            run_worker(create, listener, **options)
+        finally:
+            listener.close()
+        return
+    children = set()
+    stopping = []
+    def stop_workers(*_):
+        stopping.append(True)
+        for pid in children:
+            _signal(pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    try:
+        while True:
+            while not stopping and len(children) < workers:
+                children.add(_fork_worker(create, listener, options))
+            if not children:
+                return
+            try:
+                pid, _ = os.wait()
+            except OSError as error:
+                if error.errno == errno.EINTR:
+                    continue
+                if error.errno == errno.ECHILD:
+                    return
+                raise
+            children.discard(pid)
+            if not stopping:
+                print('worker %d exited, starting another' % pid, file=sys.stderr)
+                time.sleep(0.1)
+    finally:
+        listener.close()
+
+def _fork_worker(create, listener, options):
+    pid = os.fork()
+    if pid:
+        return pid
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        run_worker(create, listener, **options)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def _signal(pid, number):
+    try:
+        os.kill(pid, number)
+    except OSError:
+        pass
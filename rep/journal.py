@@ -0,0 +1,117 @@
+import collections
+import threading
+import time
+
+class ResyncRequired(Exception):
+    """The changes asked for are no longer in the journal, or were never in
+    it, so the reader must start again from a full copy of the stores.
+    seq is the sequence number to follow changes from after that copy.
+    """
+
+    def __init__(self, message, seq):
+        super(ResyncRequired, self).__init__(message)
+        self.seq = seq
+
+
+class ChangeJournal(object):
+    """A bounded, in-memory record of the changes made to a set of stores,
+    for readers that keep a copy up to date.
+
+    Every change to a watched store gets the next sequence number and is
+    kept as a change record: {"seq", "store", "op", "key", "value"}, where
+    op is "put" with the object's as_dict record as value, or "delete" with
+    a null value.  Replacing an object is a single put.  Only the last size
+    changes are kept.
+
+    A reader asks for the changes since the last sequence number it saw.
+    When those have been dropped, or the number is ahead of the journal
+    because the process restarted, ResyncRequired is raised: the reader
+    should note its seq, copy the stores in full and read changes from
+    there.  Changes are whole objects, so any overlap with the copy is
+    harmless to apply again.
+    """
+    DEFAULT_SIZE = 100000
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.epoch = '%x' % int(time.time() * 1000000)
+        self.seq = 0
+        self.__changes = collections.deque(maxlen=size)
+        self.__lock = threading.Lock()
+        # Writers only take the condition's lock to wake waiting readers.
+        self.__changed = threading.Condition(threading.Lock())
+        self.__waiting = 0
+        self.__interrupted = False
+
+    def watch(self, store, name):
+        """Journal the changes to store under name.
+        """
+        store.add_index(_JournalIndex(self, name), fill=False)
+
+    def record(self, name, op, key, value):
+        with self.__lock:
+            changes = self.__changes
+            last = changes[-1] if changes else None
+            self.seq += 1
+            if op == 'put' and last is not None and last[1:4] == (name, 'delete', key):
+                # The second half of a replace; a reader that already saw
+                # the delete still gets the put, under the new number.
+                changes.pop()
+            changes.append((self.seq, name, op, key, value))
+        if self.__waiting:
+            with self.__changed:
+                self.__changed.notify_all()
+
+    def since(self, seq, limit=None):
+        """Return up to limit change records following sequence number seq,
+        oldest first.
+        """
+        with self.__lock:
+            if seq > self.seq:
+                raise ResyncRequired("%d is ahead of the journal" % seq, self.seq)
+            oldest = self.__changes[0][0] if self.__changes else self.seq + 1
+            if seq < oldest - 1:
+                raise ResyncRequired("changes since %d have been dropped" % seq, self.seq)
+            following = []
+            for change in reversed(self.__changes):
+                if change[0] <= seq:
+                    break
+                following.append(change)
+        following.reverse()
+        return [{'seq': number, 'store': name, 'op': op, 'key': key, 'value': value}
+                for number, name, op, key, value in following[:limit]]
+
+    def wait(self, seq, timeout=None):
+        """Wait up to timeout seconds for a change after sequence number seq.
+        Returns whether there is one.
+        """
+        with self.__changed:
+            self.__waiting += 1
+            try:
+                if self.seq <= seq and not self.__interrupted:
+                    self.__changed.wait(timeout)
+            finally:
+                self.__waiting -= 1
+            return self.seq > seq
+
+    def interrupt(self):
+        """Wake the readers in wait(), and have later calls return at once,
+        as when the server is shutting down.  Changes are still recorded.
+        """
+        with self.__changed:
+            self.__interrupted = True
+            self.__changed.notify_all()
+
+
+class _JournalIndex(object):
+    """The store index through which a ChangeJournal watches a store."""
+    __slots__ = ('journal', 'name')
+
+    def __init__(self, journal, name):
+        self.journal = journal
+        self.name = name
+
+    def add(self, key, item):
+        self.journal.record(self.name, 'put', key, item.as_dict())
+
+    def remove(self, key, item):
+        self.journal.record(self.name, 'delete', key, None)
@@ -0,0 +1,156 @@
+import collections
+import json
+import threading
+
+class JsonCache(object):
+    """A size bounded cache of objects already encoded as JSON.
+
+    It is registered as a store index, so a change to an object drops its
+    cached text.  Once the total length of the cached text passes max_bytes
+    fragments are evicted in approximately least recently used order: the
+    CLOCK algorithm sweeps a ring of keys, sparing once any fragment read
+    since the last sweep passed it.  A hit only sets that flag, which is
+    much cheaper than reordering an exact LRU list on every read.
+
+    The generation number goes up on every change, so text encoded from an
+    object that changed meanwhile is not cached.
+    """
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        # Every key in the ring is in __fragments; the text of a discarded
+        # key is None until the sweep reaches it.
+        self.__fragments = {}
+        self.__ring = collections.deque()
+        self.__referenced = set()
+        self.__discarded = 0
+        self.__lock = threading.Lock()
+
+    def add(self, key, item):
+        self.discard(key)
+
+    def remove(self, key, item):
+        self.discard(key)
+
+    def discard(self, key):
+        with self.__lock:
+            self.generation += 1
+            text = self.__fragments.get(key)
+            if text is not None:
+                self.__fragments[key] = None
+                self.__referenced.discard(key)
+                self.size -= len(text)
+                self.__discarded += 1
+                if self.__discarded * 2 > len(self.__fragments):
+                    self.__sweep_discarded()
+
+    def clear(self):
+        with self.__lock:
+            self.generation += 1
+            self.__fragments.clear()
+            self.__ring.clear()
+            self.__referenced.clear()
+            self.__discarded = 0
+            self.size = 0
+
+    def fragment(self, key, read):
+        """Return the JSON text of the object under key.  On a miss the
+        object's as_dict record is fetched with read(key) and encoded.
+        """
+        with self.__lock:
+            text = self.__fragments.get(key)
+            if text is not None:
+                self.__referenced.add(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+            generation = self.generation
+        text = json.dumps(read(key))
+        with self.__lock:
+            if generation == self.generation:
+                self.__keep(key, text)
+        return text
+
+    def fragments(self, keys, read_many):
+        """Return the JSON texts of the objects under keys, in the same
+        order, with None for missing keys.  The records of the misses are
+        fetched together with read_many(keys), which gives None for missing
+        keys.
+        """
+        texts = []
+        missing = []
+        with self.__lock:
+            for key in keys:
+                text = self.__fragments.get(key)
+                if text is None:
+                    missing.append(len(texts))
+                else:
+                    self.__referenced.add(key)
+                    self.hits += 1
+                texts.append(text)
+            self.misses += len(missing)
+            generation = self.generation
+        if not missing:
+            return texts
+        encoded = []
+        for index, record in zip(missing, read_many([keys[index] for index in missing])):
+            if record is not None:
+                texts[index] = json.dumps(record)
+                encoded.append((keys[index], texts[index]))
+        with self.__lock:
+            if generation == self.generation:
+                for key, text in encoded:
+                    self.__keep(key, text)
+        return texts
+
+    def stats(self):
+        """Return the hit and miss counts and the size of the cache.
+        """
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self.__fragments) - self.__discarded,
+                    'bytes': self.size, 'max_bytes': self.max_bytes}
+
+    def __keep(self, key, text):
+        if len(text) > self.max_bytes:
+            return
+        if key in self.__fragments:
+            if self.__fragments[key] is not None:
+                return
+            self.__discarded -= 1
+        else:
+            self.__ring.append(key)
+        self.__fragments[key] = text
+        self.size += len(text)
+        self.__evict()
+
+    def __evict(self):
+        fragments, ring, referenced = self.__fragments, self.__ring, self.__referenced
+        while self.size > self.max_bytes:
+            key = ring.popleft()
+            text = fragments[key]
+            if text is None:
+                del fragments[key]
+                self.__discarded -= 1
+            elif key in referenced:
+                referenced.discard(key)
+                ring.append(key)
+            else:
+                del fragments[key]
+                self.size -= len(text)
+                self.evictions += 1
+
+    def __sweep_discarded(self):
+        fragments = self.__fragments
+        self.__ring = collections.deque(key for key in self.__ring
+                                        if fragments[key] is not None)
+        for key in [key for key, text in fragments.items() if text is None]:
+            del fragments[key]
+        self.__discarded = 0
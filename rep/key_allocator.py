@@ -0,0 +1,80 @@
+import os
+import threading
+
+class KeyAllocator(object):
+    """Hands out new store keys from a high-water mark.
+
+    Keys are increasing integers returned as strings.  The mark only moves
+    forward, so a deleted key is never handed out again.  All methods are safe
+    to call from several threads at once.
+
+    If a path is given the mark is persisted there so keys are not reused
+    after a restart.  To avoid a disk write for every key, the allocator leases
+    block_size keys at a time and only writes when a lease runs out.  A crash
+    can skip the rest of a lease but can never reuse a key.
+    """
+
+    def __init__(self, path=None, block_size=1000):
+        self.__lock = threading.Lock()
+        self.__path = path
+        self.__block_size = block_size
+        self.__next = 1
+        self.__leased = None
+        if path is not None:
+            self.__next = self.__load()
+            self.__leased = self.__next
+
+    def next_key(self):
+        """Allocate a single new key.
+        """
+        return self.reserve(1)[0]
+
+    def reserve(self, count):
+        """Allocate a block of count consecutive keys and return them as a list.
+        """
+        if count < 0:
+            raise ValueError("%s is not a valid key count" % count)
+        with self.__lock:
+            first = self.__next
+            self.__next += count
+            self.__extend_lease()
+        return [str(key) for key in range(first, first + count)]
+
+    def observe(self, key):
+        """Move the mark past a key that was stored without being allocated.
+        Keys that are not integers are ignored.
+        """
+        try:
+            key = int(key)
+        except (TypeError, ValueError):
+            return
+        with self.__lock:
+            if key >= self.__next:
+                self.__next = key + 1
+                self.__extend_lease()
+
+    @property
+    def high_water_mark(self):
+        """The next key that will be handed out.
+        """
+        return self.__next
+
+    def __extend_lease(self):
+        if self.__path is not None and self.__next > self.__leased:
+            self.__leased = self.__next + self.__block_size
+            self.__save(self.__leased)
+
+    def __load(self):
+        try:
+            with open(self.__path) as state:
+                return int(state.read().strip() or 1)
+        except IOError:
+            return 1
+
+    def __save(self, mark):
+        temp_path = '%s.tmp' % self.__path
+        with open(temp_path, 'w') as state:
+            state.write('%d\n' % mark)
+            state.flush()
+            os.fsync(state.fileno())
+        os.rename(temp_path, self.__path)
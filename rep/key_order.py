@@ -0,0 +1,77 @@
+import bisect
+import threading
+
+class KeyOrder(object):
+    """Keeps the keys of a Store in ascending order for ordered iteration and
+    cursor pagination.
+
+    Keys of digits only sort by value and come before any other keys, which
+    sort as strings.  New keys almost always come from a KeyAllocator and so arrive
+    in order; they are appended in constant time.  Keys that arrive out of
+    order are sorted in the next time the order is read, and removed keys are
+    only swept out once they make up half of the list.  A key added back
+    before it is swept out, as when a Store replaces its object, keeps its
+    place.
+
+    Readers may walk the order while a writer changes it; a walk sees the
+    keys present when it started, less any removed since.
+    """
+
+    def __init__(self):
+        self.__order = []
+        self.__members = set()
+        self.__pending = []
+        self.__removed = set()
+        self.__lock = threading.Lock()
+
+    def add(self, key, value=None):
+        with self.__lock:
+            if key in self.__members:
+                return
+            self.__members.add(key)
+            if key in self.__removed:
+                self.__removed.discard(key)
+                return
+            position = sort_key(key)
+            if self.__pending or (self.__order and position <= self.__order[-1]):
+                self.__pending.append(position)
+            else:
+                self.__order.append(position)
+
+    def remove(self, key, value=None):
+        with self.__lock:
+            if key in self.__members:
+                self.__members.discard(key)
+                self.__removed.add(key)
+
+    def keys(self, after=None):
+        """Yield the keys in order, starting after the key after.
+        """
+        with self.__lock:
+            self.__tidy()
+            order = self.__order
+            end = len(order)
+        start = 0 if after is None else bisect.bisect_right(order, sort_key(after), 0, end)
+        for index in range(start, end):
+            key = order[index][1]
+            if key in self.__members:
+                yield key
+
+    def __tidy(self):
+        if self.__pending or len(self.__removed) * 2 > len(self.__order):
+            order = [position for position in self.__order + self.__pending
+                     if position[1] in self.__members]
+            order.sort()
+            self.__order = [position for index, position in enumerate(order)
+                            if index == 0 or position != order[index - 1]]
+            self.__pending = []
+            self.__removed = set()
+
+
+def sort_key(key):
+    """Return the position of a key in the store order.
+    """
+    key = str(key)
+    if key.isdigit():
+        return (0, int(key)), key
+    return (1, key), key
@@ -0,0 +1,65 @@
+import collections
+
+from .rep import Rep
+from .rep_store import RepStore
+
+class LazyRepBackend(collections.MutableMapping):
+    """Store backend that keeps each Rep as its title string alone.
+
+    Titles are validated when the Rep is built, before it is stored, so a
+    Rep object is only made again, without validation, when one is read.
+    The read only paths of Store that work from records, such as as_dict,
+    json_fragment and record, never make one at all.
+
+    Every read makes a new Rep, so a change made to one in place is not
+    stored; assign it back to the store instead.
+    """
+
+    def __init__(self, titles=None):
+        self.__titles = {} if titles is None else titles
+
+    def __getitem__(self, key):
+        return Rep.from_trusted(self.__titles[key])
+
+    def __setitem__(self, key, value):
+        self.__titles[key] = value.title
+
+    def __delitem__(self, key):
+        del self.__titles[key]
+
+    def __iter__(self):
+        return iter(self.__titles)
+
+    def __len__(self):
+        return len(self.__titles)
+
+    def __contains__(self, key):
+        return key in self.__titles
+
+    def copy(self):
+        return LazyRepBackend(dict(self.__titles))
+
+    def record(self, key):
+        """Return the as_dict record of the Rep under key.
+        """
+        return {'title': self.__titles[key]}
+
+    def get_records(self, keys):
+        """Return the records of the Reps under keys, in the same order,
+        with None for missing keys.
+        """
+        titles = self.__titles
+        return [None if key not in titles else {'title': titles[key]} for key in keys]
+
+    def records(self):
+        """Return a dict of the records of every Rep by key.
+        """
+        return {key: {'title': title} for key, title in self.__titles.iteritems()}
+
+
+class LazyRepStore(RepStore):
+    """A RepStore kept in a LazyRepBackend."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['backend'] = LazyRepBackend()
+        super(LazyRepStore, self).__init__(*args, **kwargs)
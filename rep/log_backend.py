@@ -0,0 +1,288 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+
+class LogBackend(collections.MutableMapping):
+    """An append-only, log-structured storage engine for a Store.
+
+    Every change is appended to a log file in a data directory and applied to
+    an in-memory dict, which serves all reads.  On startup the latest snapshot
+    is loaded and the log replayed on top of it.  A write torn by a crash is
+    dropped from the end of the log.
+
+    sync decides when the log is flushed to disk:
+
+    always    fsync before every write returns.  Writers that arrive while an
+              fsync is in progress share the next one (group commit).
+              Inside group_commit() the fsync waits until the block ends,
+              so a Store can release its lock first and let other
+              writers join it.
+    interval  fsync every group_interval seconds, or sooner once group_size
+              writes are waiting.  A crash loses at most that window.
+    never     leave it to the operating system.
+
+    Once the log holds compact_ratio times more records than there are live
+    objects, and at least compact_min records, it is rotated.  A background
+    thread then writes the live objects to a new snapshot and removes the old
+    log.  Writes carry on while this happens.
+
+    Objects are written using as_dict and rebuilt with item_class(**record).
+    """
+    SNAPSHOT = 'snapshot'
+    LOG = 'log'
+    OLD_LOG = 'log.old'
+    SYNC_POLICIES = ('always', 'interval', 'never')
+
+    def __init__(self, path, item_class, sync='always', group_size=1000,
+                 group_interval=0.05, compact_ratio=4, compact_min=100000):
+        if sync not in self.SYNC_POLICIES:
+            raise ValueError("%s is not a valid sync policy" % sync)
+        self.path = path
+        self.item_class = item_class
+        self.sync = sync
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+
+        self.__items = {}
+        self.__lock = threading.RLock()
+        self.__sync_lock = threading.Lock()
+        self.__written = 0
+        self.__synced = 0
+        self.__log_records = 0
+        self.__compactor = None
+        self.__closed = threading.Event()
+        self.__deferred = threading.local()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.__recover()
+        self.__log = open(self.__file(self.LOG), 'ab')
+        self.__flusher = None
+        if sync == 'interval':
+            self.__flusher = threading.Thread(target=self.__flush_periodically)
+            self.__flusher.daemon = True
+            self.__flusher.start()
+
+    def __getitem__(self, key):
+        return self.__items[key]
+
+    def __setitem__(self, key, value):
+        with self.__lock:
+            written = self.__append([key, value.as_dict()])
+            self.__items[key] = value
+        self.__wrote(written)
+
+    def __delitem__(self, key):
+        with self.__lock:
+            if key not in self.__items:
+                raise KeyError(key)
+            written = self.__append([key])
+            del self.__items[key]
+        self.__wrote(written)
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key):
+        return key in self.__items
+
+    def copy(self):
+        """Return a dict of the live objects.
+        """
+        with self.__lock:
+            return dict(self.__items)
+
+    @contextlib.contextmanager
+    def group_commit(self):
+        """Return a context manager within which writes made by this thread
+        return before they are synced.  Leaving the outermost block syncs
+        them as the sync policy says.
+        """
+        deferred = self.__deferred
+        depth = getattr(deferred, 'depth', 0)
+        if not depth:
+            deferred.written = 0
+        deferred.depth = depth + 1
+        try:
+            yield
+        finally:
+            deferred.depth = depth
+            if not depth and deferred.written:
+                self.__after_write(deferred.written)
+
+    def compact(self, wait=True):
+        """Rotate the log and write a new snapshot of the live objects.
+        """
+        self.__start_compaction(force=True)
+        with self.__lock:
+            compactor = self.__compactor
+        if wait and compactor is not None:
+            compactor.join()
+
+    def sync_now(self):
+        """Flush everything written so far to disk.
+        """
+        with self.__lock:
+            written = self.__written
+        self.__sync_to(written)
+
+    def close(self):
+        """Finish any compaction, sync the log and close it.
+        """
+        self.__closed.set()
+        compactor = self.__compactor
+        if compactor is not None:
+            compactor.join()
+        if self.__flusher is not None:
+            self.__flusher.join()
+        self.sync_now()
+        with self.__sync_lock:
+            with self.__lock:
+                if not self.__log.closed:
+                    self.__log.close()
+
+    def __append(self, entry):
+        self.__log.write(json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.__written += 1
+        self.__log_records += 1
+        return self.__written
+
+    def __wrote(self, written):
+        if getattr(self.__deferred, 'depth', 0):
+            self.__deferred.written = written
+        else:
+            self.__after_write(written)
+
+    def __after_write(self, written):
+        if self.__compaction_due():
+            self.__start_compaction()
+        if self.sync == 'always':
+            self.__sync_to(written)
+        elif self.sync == 'interval':
+            if written - self.__synced >= self.group_size:
+                self.__sync_to(written)
+        else:
+            with self.__lock:
+                self.__log.flush()
+
+    # The locks are always taken in the same order, __sync_lock first, so
+    # nothing may wait for __sync_lock while holding __lock.
+
+    def __sync_to(self, written):
+        with self.__sync_lock:
+            if self.__synced >= written:
+                return
+            with self.__lock:
+                if self.__log.closed:
+                    return
+                self.__log.flush()
+                target = self.__written
+                fileno = self.__log.fileno()
+            os.fsync(fileno)
+            self.__synced = target
+
+    def __flush_periodically(self):
+        while not self.__closed.wait(self.group_interval):
+            self.sync_now()
+
+    def __compaction_due(self):
+        return (self.__compactor is None and self.__log_records >= self.compact_min and
+                self.__log_records >= self.compact_ratio * len(self.__items))
+
+    def __start_compaction(self, force=False):
+        with self.__sync_lock:
+            with self.__lock:
+                if self.__compactor is not None or self.__log.closed:
+                    return
+                if not force and not self.__compaction_due():
+                    return
+                self.__log.flush()
+                os.fsync(self.__log.fileno())
+                self.__log.close()
+                os.rename(self.__file(self.LOG), self.__file(self.OLD_LOG))
+                self.__log = open(self.__file(self.LOG), 'ab')
+                self.__synced = self.__written
+                self.__log_records = 0
+                items = dict(self.__items)
+                self.__compactor = threading.Thread(target=self.__compact, args=(items,))
+                self.__compactor.daemon = True
+                self.__compactor.start()
+
+    def __compact(self, items):
+        self.__write_snapshot(items)
+        os.remove(self.__file(self.OLD_LOG))
+        with self.__lock:
+            self.__compactor = None
+
+    def __recover(self):
+        """Load the snapshot, then replay any log left by an interrupted
+        compaction, then the current log.  Replaying a log that the snapshot
+        already covers is harmless because it ends in the same state.
+        """
+        for name in (self.SNAPSHOT, self.OLD_LOG):
+            self.__replay(self.__file(name))
+        self.__log_records = self.__replay(self.__file(self.LOG), truncate=True)
+        if os.path.exists(self.__file(self.OLD_LOG)):
+            self.__write_snapshot(self.__items)
+            for name in (self.OLD_LOG, self.LOG):
+                if os.path.exists(self.__file(name)):
+                    os.remove(self.__file(name))
+            self.__log_records = 0
+
+    def __write_snapshot(self, items):
+        temp_path = self.__file('%s.tmp' % self.SNAPSHOT)
+        with open(temp_path, 'wb') as snapshot:
+            for key, value in items.iteritems():
+                snapshot.write(json.dumps([key, value.as_dict()],
+                                          separators=(',', ':')).encode('utf-8') + b'\n')
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.rename(temp_path, self.__file(self.SNAPSHOT))
+        self.__sync_directory()
+
+    def __replay(self, path, truncate=False):
+        """Apply the entries in a log or snapshot file and return how many
+        there were.
+        """
+        if not os.path.exists(path):
+            return 0
+        good = 0
+        entries = 0
+        with open(path, 'rb') as log:
+            for line in log:
+                if not line.endswith(b'\n'):
+                    break
+                entry = json.loads(line.decode('utf-8'))
+                key = str(entry[0])
+                if len(entry) > 1:
+                    self.__items[key] = self.item_class(**self.__record(entry[1]))
+                else:
+                    self.__items.pop(key, None)
+                good += len(line)
+                entries += 1
+        if truncate and good < os.path.getsize(path):
+            with open(path, 'r+b') as log:
+                log.truncate(good)
+        return entries
+
+    @staticmethod
+    def __record(record):
+        return {str(field): value for field, value in record.iteritems()}
+
+    def __file(self, name):
+        return os.path.join(self.path, name)
+
+    def __sync_directory(self):
+        if hasattr(os, 'O_DIRECTORY'):
+            directory = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
@@ -0,0 +1,267 @@
+import bisect
+import functools
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# json_fragment is left out: it runs once per object of a list response and
+# mostly hits the JSON cache, whose counts are reported instead.
+STORE_METHODS = ('create', 'read', 'read_many', 'record', 'read_records', 'update',
+                 'delete', 'reserve_keys', 'json_fragments', 'page', 'search', 'query',
+                 'get_children', 'get_parents', 'descendants', 'ancestors')
+# Methods that return an iterator do their work as it is consumed, so the
+# time spent in each step is what is observed, once the walk is finished or
+# abandoned.
+ITERATOR_METHODS = ('descendants', 'ancestors')
+JSON_CACHE_STATS = ('hits', 'misses', 'evictions', 'entries', 'bytes')
+
+class Counter(object):
+    """A count that only goes up."""
+
+    def __init__(self):
+        self.value = 0
+        self.__lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.__lock:
+            self.value += amount
+
+    def samples(self, name):
+        yield name, (), self.value
+
+
+class Gauge(object):
+    """A value read by calling read() whenever the metrics are rendered."""
+
+    def __init__(self, read):
+        self.read = read
+
+    def samples(self, name):
+        yield name, (), self.read()
+
+
+class Histogram(object):
+    """Counts of observed values in fixed buckets, from which quantiles are
+    estimated.  Observing costs a binary search and one locked increment,
+    whatever the number of values seen.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value, bisect_left=bisect.bisect_left):
+        index = bisect_left(self.buckets, value)
+        lock = self.__lock
+        lock.acquire()
+        self.counts[index] += 1
+        self.sum += value
+        lock.release()
+
+    def time(self):
+        """Return a context manager that observes the time its block takes.
+        """
+        return _Timer(self)
+
+    def quantile(self, share):
+        """Estimate the value below which share of the observations fall,
+        interpolating within the bucket it lands in.  Returns None before
+        anything is observed.
+        """
+        with self.__lock:
+            counts = list(self.counts)
+        count = sum(counts)
+        if not count:
+            return None
+        rank = share * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self, name):
+        with self.__lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            yield name + '_bucket', (('le', _number(bound)),), cumulative
+        yield name + '_sum', (), total
+        yield name + '_count', (), cumulative
+
+
+class Registry(object):
+    """The metrics of an application, rendered in the Prometheus text
+    format.
+
+    A metric is a family of series told apart by their labels, so
+    histogram('latency', 'help', route='/reps') returns the histogram for
+    that route, creating it on first use.  Histograms are also rendered as
+    a NAME_quantile gauge with the estimated QUANTILES.
+    """
+
+    def __init__(self):
+        self.__families = {}
+        self.__lock = threading.Lock()
+
+    def counter(self, name, help, **labels):
+        return self.__series(name, 'counter', help, labels, Counter)
+
+    def gauge(self, name, help, read, **labels):
+        return self.__series(name, 'gauge', help, labels, lambda: Gauge(read))
+
+    def histogram(self, name, help, **labels):
+        return self.__series(name, 'histogram', help, labels, Histogram)
+
+    def render(self):
+        with self.__lock:
+            families = sorted(self.__families.items())
+        lines = []
+        for name, (kind, help, series) in families:
+            series = sorted(series.items())
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, metric in series:
+                for sample, extra, value in metric.samples(name):
+                    lines.append(_sample(sample, labels + extra, value))
+            if kind == 'histogram':
+                lines.append('# HELP %s_quantile Estimated quantiles of %s.' % (name, name))
+                lines.append('# TYPE %s_quantile gauge' % name)
+                for labels, metric in series:
+                    for share in QUANTILES:
+                        value = metric.quantile(share)
+                        if value is not None:
+                            lines.append(_sample(name + '_quantile',
+                                                 labels + (('quantile', str(share)),), value))
+        return '\n'.join(lines) + '\n'
+
+    def __series(self, name, kind, help, labels, create):
+        key = tuple(sorted(labels.items()))
+        family = self.__families.get(name)
+        if family is not None and family[0] == kind:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self.__lock:
+            family = self.__families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError("%s is already a %s" % (name, family[0]))
+            return family[2].setdefault(key, create())
+
+
+def instrument_store(store, registry, name, methods=STORE_METHODS):
+    """Count and time calls to the named methods of store, and report its
+    size and JSON cache counts, as rep_store_* metrics labelled with name.
+
+    The methods are wrapped on the store object itself, so a store that is
+    not instrumented pays nothing.
+    """
+    registry.gauge('rep_store_objects', 'Objects in the store.',
+                   lambda: len(store), store=name)
+    for stat in JSON_CACHE_STATS:
+        registry.gauge('rep_store_json_cache_' + stat, 'JSON cache %s of the store.' % stat,
+                       functools.partial(_cache_stat, store, stat), store=name)
+    for method in methods:
+        if hasattr(store, method):
+            histogram = registry.histogram(
+                'rep_store_operation_seconds', 'Time taken by store operations.',
+                store=name, operation=method)
+            errors = registry.counter(
+                'rep_store_operation_errors_total', 'Store operations that raised.',
+                store=name, operation=method)
+            timed = _timed_iteration if method in ITERATOR_METHODS else _timed
+            setattr(store, method, timed(getattr(store, method), histogram, errors))
+    return store
+
+def _timed(function, histogram, errors):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe(time.time() - start)
+    return timed
+
+def _timed_iteration(function, histogram, errors):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        # The call is made at once, so that bad arguments raise before the
+        # caller starts on the steps.
+        start = time.time()
+        try:
+            iterator = iter(function(*args, **kwargs))
+        except Exception:
+            errors.inc()
+            histogram.observe(time.time() - start)
+            raise
+        return _timed_steps(iterator, histogram, errors, time.time() - start)
+    return timed
+
+def _timed_steps(iterator, histogram, errors, elapsed):
+    try:
+        while True:
+            start = time.time()
+            try:
+                step = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.time() - start
+            yield step
+    except Exception:
+        errors.inc()
+        raise
+    finally:
+        histogram.observe(elapsed)
+
+def _cache_stat(store, stat):
+    stats = store.json_cache and store.json_cache.stats()
+    return stats[stat] if stats else 0
+
+
+class _Timer(object):
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.time() - self.start)
+
+
+def _sample(name, labels, value):
+    if labels:
+        name = '%s{%s}' % (name, ','.join('%s="%s"' % (label, _escape(value))
+                                          for label, value in labels))
+    return '%s %s' % (name, _number(value))
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
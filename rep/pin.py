@@ -1,11 +1,60 @@
 class Pin(object):
     """Pin contains a parent-child relationship between two Reps.
+
+    Stores can watch a pin so that indexes stay correct when its parent or
+    child is changed in place.  Watchers are called after the change with the
+    pin, the field name and the old value.  If a watcher raises, the change is
+    undone and the exception is passed on.
     """
+    __slots__ = ('__parent', '__child', '__watchers')
+    fields = ['parent', 'child']
 
     def __init__(self, parent, child):
+        self.__watchers = None
         self.parent = parent
         self.child = child
 
+    @property
+    def parent(self):
+        return self.__parent
+
+    @parent.setter
+    def parent(self, parent):
+        self.__set('parent', parent)
+
+    @property
+    def child(self):
+        return self.__child
+
+    @child.setter
+    def child(self, child):
+        self.__set('child', child)
+
+    @classmethod
+    def from_trusted(cls, parent, child):
+        """Build a Pin from fields known to be valid, such as those read back
+        from a snapshot, without going through the setters.
+        """
+        pin = cls.__new__(cls)
+        pin.__watchers = None
+        pin.__parent = parent
+        pin.__child = child
+        return pin
+
+    def watch(self, watcher):
+        """Call watcher(pin, field, old) whenever a field changes.
+        """
+        if self.__watchers is None:
+            self.__watchers = [watcher]
+        elif watcher not in self.__watchers:
+            self.__watchers.append(watcher)
+
+    def unwatch(self, watcher):
+        """Stop calling a watcher added with watch.
+        """
+        if self.__watchers and watcher in self.__watchers:
+            self.__watchers.remove(watcher)
+
     def as_dict(self):
         """Return the fields required to recreate this pin. Can be fed back to
         from_dict method.
@@ -15,12 +64,26 @@ class Pin(object):
     def from_dict(self, data):
         """Set fields based on dictionary.
         """
-        fields = ['parent', 'child']
-
         for field in data:
-            if field in fields:
+            if field in self.fields:
                 setattr(self, field, data[field])
             else:
                 raise AttributeError("%s is not a valid field" % field)
         return self
 
+    def __set(self, field, value):
+        attribute = '_Pin__%s' % field
+        old = getattr(self, attribute, None)
+        setattr(self, attribute, value)
+        if not self.__watchers:
+            return
+        notified = []
+        try:
+            for watcher in list(self.__watchers):
+                watcher(self, field, old)
+                notified.append(watcher)
+        except Exception:
+            setattr(self, attribute, old)
+            for watcher in reversed(notified):
+                watcher(self, field, value)
+            raise
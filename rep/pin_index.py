@@ -0,0 +1,42 @@
+class PinIndex(object):
+    """Forward (parent to children) and reverse (child to parents) indexes
+    over the pins in a PinStore.
+
+    Rep keys are compared as strings, so 1 and '1' refer to the same Rep.
+    Each entry maps a pin key to the Rep at the other end of the pin, so a
+    lookup costs time proportional to the number of pins on that Rep.
+    """
+
+    def __init__(self):
+        self.__children = {}
+        self.__parents = {}
+
+    def add(self, key, pin):
+        """Index a pin stored under key.
+        """
+        self.__children.setdefault(str(pin.parent), {})[key] = pin.child
+        self.__parents.setdefault(str(pin.child), {})[key] = pin.parent
+
+    def remove(self, key, pin):
+        """Remove a pin previously added under key.
+        """
+        self.__discard(self.__children, str(pin.parent), key)
+        self.__discard(self.__parents, str(pin.child), key)
+
+    def children(self, parent):
+        """Return the child of every pin whose parent is parent.
+        """
+        return list(self.__children.get(str(parent), {}).values())
+
+    def parents(self, child):
+        """Return the parent of every pin whose child is child.
+        """
+        return list(self.__parents.get(str(child), {}).values())
+
+    @staticmethod
+    def __discard(index, rep_key, key):
+        entries = index.get(rep_key)
+        if entries is not None:
+            entries.pop(key, None)
+            if not entries:
+                del index[rep_key]
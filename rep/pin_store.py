@@ -1,47 +1,128 @@
-import collections
+from .pin import Pin
+from .pin_index import PinIndex
+from .store import Store
+from .topological_order import TopologicalOrder
+from .traversal import TraversalCache, tree, walk
 
-class PinStore(collections.MutableMapping):
+class PinStore(Store):
     """A dictionary like interface for storing Pin objects"""
+    item_class = Pin
+    topological_order = None
 
     def __init__(self, *args, **kwargs):
-        self.__store = dict()
-        self.update(dict(*args, **kwargs))
+        super(PinStore, self).__init__(*args, **kwargs)
+        self.__index = self.create_pin_index()
+        self.__walks = self.add_index(TraversalCache(), fill=False)
 
     def __getitem__(self, key):
-        return self.__store[str(key)]
+        pin = super(PinStore, self).__getitem__(key)
+        pin.watch(_PinWatch(self, str(key)))
+        return pin
 
-    def __setitem__(self, key, value):
-        self.__store[str(key)] = value
+    def create_pin_index(self):
+        """Return the index used to answer get_children and get_parents.
+        """
+        return self.add_index(PinIndex())
 
-    def __delitem__(self, key):
-        del self.__store[str(key)]
+    def enable_topological_order(self):
+        """Start maintaining a TopologicalOrder of the Reps, after which a
+        pin that would make a Rep its own ancestor is refused with a
+        CycleError.  Raises CycleError if the stored pins already have a
+        cycle.
+        """
+        if self.topological_order is None:
+            self.topological_order = self.add_index(TopologicalOrder())
+        return self.topological_order
 
-    def __iter__(self):
-        return iter(self.__store)
+    def toposort(self):
+        """Return the keys of the Reps with pins, every parent before its
+        children.  Without a maintained TopologicalOrder one is built for
+        the call, raising CycleError if the pins have a cycle.
+        """
+        order = self.topological_order
+        if order is None:
+            order = TopologicalOrder()
+            for key, pin in self.snapshot().iteritems():
+                order.add(key, pin)
+        return order.keys()
 
-    def __len__(self):
-        return len(self.__store)
+    def get_children(self, parent_key):
+        return self.__index.children(parent_key)
 
-    def get_new_key(self):
-        return str(int(max(self.__store.keys(), key=int)) + 1) if len(self.__store) else '1'
+    def get_parents(self, child_key):
+        return self.__index.parents(child_key)
 
-    def create(self, value):
-        new_key = self.get_new_key()
-        self.__setitem__(new_key, value)
-        return new_key
+    def descendants(self, key, depth=None, order='bfs'):
+        """Yield (depth, parent, child) for every Rep below key, each once.
+        See traversal.walk.
+        """
+        return self.__walk('descendants', self.get_children, key, depth, order)
 
-    def read(self, key):
-        return self.__getitem__(str(key))
+    def ancestors(self, key, depth=None, order='bfs'):
+        """Yield (depth, child, parent) for every Rep above key, each once.
+        See traversal.walk.
+        """
+        return self.__walk('ancestors', self.get_parents, key, depth, order)
 
-    def update(self, *args, **kwargs):
-        for key, value in dict(*args, **kwargs).iteritems():
-            self.__store[key] = value
+    def subtree(self, key, depth=None, direction='descendants'):
+        """Return the Reps below (or above) key as a tree of nested dicts.
+        """
+        if direction not in ('descendants', 'ancestors'):
+            raise ValueError("%s is not a valid direction" % direction)
+        return tree(key, getattr(self, direction)(key, depth))
 
-    def delete(self, key):
-        self.__delitem__(str(key))
+    def pin_changed(self, key, pin, field, old):
+        """Reindex a stored pin after one of its fields changed in place.
+        A pin that has since been deleted stops being watched instead.
+        """
+        previous = Pin(pin.parent, pin.child)
+        setattr(previous, field, old)
+        if not self.item_changed(key, pin, previous):
+            pin.unwatch(_PinWatch(self, key))
 
-    def as_dict(self):
-        return {key: value.as_dict() for key, value in self.__store.iteritems()}
+    def __walk(self, direction, neighbours, key, depth, order):
+        query = (direction, str(key), depth, order)
+        steps = self.__walks.get(query)
+        if steps is not None:
+            return iter(steps)
+        return self.__cache_walk(query, walk(key, neighbours, depth, order))
 
-    def get_children(self, parent_key):
-        return [self[key].child for key in self if str(self[key].parent) == str(parent_key)]
+    def __cache_walk(self, query, steps):
+        generation = self.__walks.generation
+        taken = []
+        for step in steps:
+            taken.append(step)
+            yield step
+        self.__walks.put(query, taken, generation)
+
+    def _index(self, key, value):
+        super(PinStore, self)._index(key, value)
+        value.watch(_PinWatch(self, key))
+
+    def _unindex(self, key, value):
+        value.unwatch(_PinWatch(self, key))
+        super(PinStore, self)._unindex(key, value)
+
+
+class _PinWatch(object):
+    """Pin watcher that reports in place changes back to the owning store
+    under the key the pin is stored as.
+    """
+    __slots__ = ('store', 'key')
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def __call__(self, pin, field, old):
+        self.store.pin_changed(self.key, pin, field, old)
+
+    def __eq__(self, other):
+        return (isinstance(other, _PinWatch) and
+                other.store is self.store and other.key == self.key)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.store), self.key))
@@ -0,0 +1,439 @@
+import collections
+import contextlib
+import json
+import os
+import socket
+import threading
+
+from .pin import Pin
+from .rep import Rep
+from .store_server import (
+    CALL,
+    DELETE,
+    ERRORS,
+    FAILED,
+    GET,
+    GET_MANY,
+    OK,
+    REQUEST,
+    RESPONSE,
+    SET,
+    STORES,
+    data,
+    item,
+    read_exactly,
+    text,
+)
+
+class StoreServerError(Exception):
+    """The store server failed to answer a request."""
+
+
+class RemoteStore(collections.MutableMapping):
+    """A client for a store served by a StoreServer, with the same interface
+    as a Store.
+
+    Every thread, and every process forked after the store is created, gets
+    its own connection to the server on first use.  get_many fetches many
+    objects with one request, and pipeline() sends a series of requests
+    without waiting for each answer.  Objects read from the server are
+    copies; assign them back to store changes.
+    """
+    item_class = None
+    ORDER_BLOCK = 1000
+    UPDATE_BLOCK = 1000
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self.number = STORES.index(name)
+        self.versions = _RemoteVersions(self)
+        self.json_cache = _RemoteJsonCache(self)
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+
+    def __getitem__(self, key):
+        return self.__item(self.json_fragment(key))
+
+    def __setitem__(self, key, value):
+        self.request(SET, '%s\n%s' % (key, json.dumps(value.as_dict())))
+
+    def __delitem__(self, key):
+        self.request(DELETE, str(key))
+
+    def __iter__(self):
+        return iter(self.call('keys'))
+
+    def __len__(self):
+        return self.call('len')
+
+    def __contains__(self, key):
+        return self.call('contains', str(key))
+
+    def json_fragment(self, key):
+        """Return the object under key encoded as JSON.
+        """
+        return self.request(GET, str(key))
+
+    def get_many(self, keys):
+        """Return the objects under keys, in the same order, with one request
+        to the server.  Missing keys give None.
+        """
+        keys = [str(key) for key in keys]
+        if not keys:
+            return []
+        records = self.request(GET_MANY, '\n'.join(keys)).split('\n')
+        return [self.__item(record) if record else None for record in records]
+
+    def read_many(self, keys):
+        return self.get_many(keys)
+
+    def record(self, key):
+        return json.loads(self.json_fragment(key))
+
+    def read_records(self, keys):
+        return [None if text is None else json.loads(text)
+                for text in self.json_fragments(keys)]
+
+    def json_fragments(self, keys):
+        """Return the objects under keys encoded as JSON, in the same order,
+        with one request to the server.  Missing keys give None.
+        """
+        keys = [str(key) for key in keys]
+        if not keys:
+            return []
+        return [record or None
+                for record in self.request(GET_MANY, '\n'.join(keys)).split('\n')]
+
+    def get_new_key(self):
+        return self.reserve_keys(1)[0]
+
+    def reserve_keys(self, count):
+        return [str(key) for key in self.call('reserve_keys', count)]
+
+    def create(self, value):
+        return str(self.call('create', value.as_dict()))
+
+    def read(self, key):
+        return self.__getitem__(key)
+
+    def update(self, *args, **kwargs):
+        """Store many objects, UPDATE_BLOCK to a request, with the requests
+        pipelined.
+        """
+        pairs = [(str(key), value.as_dict())
+                 for key, value in collections.OrderedDict(*args, **kwargs).items()]
+        with self.pipeline() as pipeline:
+            for start in range(0, len(pairs), self.UPDATE_BLOCK):
+                pipeline.call('update', pairs[start:start + self.UPDATE_BLOCK])
+
+    def batch(self):
+        """Each request is applied by the server on its own, so this groups
+        nothing.  It is here for compatibility with Store.
+        """
+        return _no_batch()
+
+    def delete(self, key):
+        self.__delitem__(key)
+
+    def as_dict(self):
+        return self.call('as_dict')
+
+    def snapshot(self):
+        return dict((key, item(self.item_class, record))
+                    for key, record in self.as_dict().items())
+
+    def ordered_keys(self, after=None):
+        """Yield keys in ascending order, starting after the key after.  Keys
+        are fetched ORDER_BLOCK at a time.
+        """
+        while True:
+            keys = self.call('ordered_keys', after, self.ORDER_BLOCK)
+            for key in keys:
+                yield str(key)
+            if len(keys) < self.ORDER_BLOCK:
+                return
+            after = keys[-1]
+
+    def ordered_items(self, after=None):
+        """Yield (key, object) pairs in key order, starting after the key
+        after.  Objects are fetched a block of keys at a time.
+        """
+        keys = []
+        for key in self.ordered_keys(after):
+            keys.append(key)
+            if len(keys) == self.ORDER_BLOCK:
+                for pair in self.__present(keys):
+                    yield pair
+                keys = []
+        for pair in self.__present(keys):
+            yield pair
+
+    def page(self, limit=None, after=None):
+        pairs = []
+        for pair in self.ordered_items(after):
+            if limit is not None and len(pairs) >= limit:
+                break
+            pairs.append(pair)
+        return pairs
+
+    def add_field_index(self, field, kind='sorted'):
+        """Index the objects on the server by one of their fields.
+        """
+        self.call('add_field_index', field, kind)
+
+    def query(self, where=None, ranges=None, sort=None, descending=False, limit=None):
+        """Find objects by their fields on the server, as Store.query does.
+        """
+        description, keys = self.call('query', where or {}, ranges or {}, sort,
+                                      descending, limit)
+        return description, [str(key) for key in keys]
+
+    def enable_json_cache(self, max_bytes):
+        self.call('enable_json_cache', max_bytes)
+        return self.json_cache
+
+    def pipeline(self):
+        """Return a Pipeline for sending requests without waiting for each
+        answer.
+        """
+        return Pipeline(self)
+
+    def call(self, method, *arguments):
+        """Call one of the store server's CALLS on the served store.
+        """
+        return json.loads(self.request(CALL, json.dumps([method, arguments])))
+
+    def request(self, opcode, payload):
+        """Send one request and return its answer.
+        """
+        connection = self.connection()
+        connection.send([self.frame(opcode, payload)])
+        return connection.receive()
+
+    def frame(self, opcode, payload):
+        payload = data(payload)
+        return REQUEST.pack(opcode, self.number, len(payload)) + payload
+
+    def connection(self):
+        """Return this thread's connection to the server, opening it if
+        needed.
+        """
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None or connection.pid != os.getpid():
+            connection = _Connection(self.path)
+            self.__local.connection = connection
+            with self.__lock:
+                self.__connections.append(connection)
+        return connection
+
+    def close(self):
+        """Close the connections of every thread.
+        """
+        with self.__lock:
+            for connection in self.__connections:
+                connection.close()
+            self.__connections = []
+        self.__local = threading.local()
+
+    def __present(self, keys):
+        return [(key, value) for key, value in zip(keys, self.get_many(keys))
+                if value is not None]
+
+    def __item(self, record):
+        return item(self.item_class, json.loads(record))
+
+
+class RemoteRepStore(RemoteStore):
+    """A RepStore served by a StoreServer."""
+    item_class = Rep
+
+    def enable_search(self):
+        self.call('enable_search')
+
+    def search(self, query=None, prefix=None, limit=20, offset=0):
+        """Return (total, [(key, score), ...]).  See TitleIndex.search.
+        """
+        total, ranked = self.call('search', query, prefix, limit, offset)
+        return total, [(str(key), score) for key, score in ranked]
+
+
+class RemotePinStore(RemoteStore):
+    """A PinStore served by a StoreServer.  Pins read from it write
+    themselves back when changed in place, as they do in a PinStore.
+    """
+    item_class = Pin
+
+    def __getitem__(self, key):
+        pin = super(RemotePinStore, self).__getitem__(key)
+        pin.watch(_RemotePinWatch(self, str(key)))
+        return pin
+
+    def enable_topological_order(self):
+        self.call('enable_topological_order')
+
+    def toposort(self):
+        return [str(key) for key in self.call('toposort')]
+
+    def get_children(self, parent_key):
+        return self.call('children', str(parent_key))
+
+    def get_parents(self, child_key):
+        return self.call('parents', str(child_key))
+
+    def descendants(self, key, depth=None, order='bfs'):
+        return self.__walk('descendants', key, depth, order)
+
+    def ancestors(self, key, depth=None, order='bfs'):
+        return self.__walk('ancestors', key, depth, order)
+
+    def subtree(self, key, depth=None, direction='descendants'):
+        return self.call('subtree', str(key), depth, direction)
+
+    def __walk(self, direction, key, depth, order):
+        steps = self.call('walk', direction, str(key), depth, order)
+        return iter([(step_depth, str(via), str(step_key))
+                     for step_depth, via, step_key in steps])
+
+
+class Pipeline(object):
+    """Requests queued on a RemoteStore and sent to the server together.
+
+    Each method queues a request and returns its position in results.  The
+    requests are sent when execute is called, or the with block ends, and
+    the answers are read after all of them are sent.  If any request failed
+    the first error is raised once every answer has been read.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.results = None
+        self.__frames = []
+        self.__decoders = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.execute()
+
+    def get(self, key):
+        return self.__queue(GET, str(key),
+                            lambda record: item(self.store.item_class, json.loads(record)))
+
+    def set(self, key, value):
+        return self.__queue(SET, '%s\n%s' % (key, json.dumps(value.as_dict())), None)
+
+    def delete(self, key):
+        return self.__queue(DELETE, str(key), None)
+
+    def call(self, method, *arguments):
+        return self.__queue(CALL, json.dumps([method, arguments]), json.loads)
+
+    def execute(self):
+        """Send the queued requests and return their results.
+        """
+        connection = self.store.connection()
+        connection.send(self.__frames)
+        self.results = []
+        failure = None
+        for decode in self.__decoders:
+            try:
+                answer = connection.receive()
+                self.results.append(answer if decode is None else decode(answer))
+            except (StoreServerError,) + ERRORS as error:
+                self.results.append(error)
+                failure = failure or error
+        self.__frames = []
+        self.__decoders = []
+        if failure is not None:
+            raise failure
+        return self.results
+
+    def __queue(self, opcode, payload, decode):
+        self.__frames.append(self.store.frame(opcode, payload))
+        self.__decoders.append(decode)
+        return len(self.__frames) - 1
+
+
+class _Connection(object):
+    """One socket to a store server."""
+
+    def __init__(self, path):
+        self.pid = os.getpid()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.reader = self.socket.makefile('rb')
+
+    def send(self, frames):
+        self.socket.sendall(b''.join(frames))
+
+    def receive(self):
+        """Read one answer, raising the error the server reported, if any.
+        """
+        status, length = RESPONSE.unpack(read_exactly(self.reader, RESPONSE.size))
+        answer = text(read_exactly(self.reader, length))
+        if status == OK:
+            return answer
+        if status == FAILED:
+            raise StoreServerError(answer)
+        raise ERRORS[status - 1](answer)
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+class _RemoteVersions(object):
+    """Reads the version counters of a served store.  See Versions."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def etag(self, key=None):
+        return self.store.call('version', key)[0]
+
+    @property
+    def modified(self):
+        return self.store.call('version', None)[1]
+
+
+class _RemoteJsonCache(object):
+    """Reads the statistics of a served store's JSON cache."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def stats(self):
+        return self.store.call('cache_stats')
+
+
+class _RemotePinWatch(object):
+    """Pin watcher that writes a pin read from a RemotePinStore back to the
+    server when it is changed in place.
+    """
+    __slots__ = ('store', 'key')
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def __call__(self, pin, field, old):
+        self.store[self.key] = pin
+
+    def __eq__(self, other):
+        return (isinstance(other, _RemotePinWatch) and
+                other.store is self.store and other.key == self.key)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.store), self.key))
+
+
+@contextlib.contextmanager
+def _no_batch():
+    yield
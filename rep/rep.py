@@ -6,6 +6,7 @@ class Rep(object):
     class do not track details about the system such as access time or size
     in bytes. That kind of information is kept separately.
     """
+    __slots__ = ('__title',)
     fields = ['title']
 
     """Each field can have a regular expression to describe legal values
@@ -22,6 +23,15 @@ class Rep(object):
         else:
             self.from_dict(kwargs)
 
+    @classmethod
+    def from_trusted(cls, title):
+        """Build a Rep from a title known to be valid, such as one read back
+        from a snapshot, without checking it.
+        """
+        rep = cls.__new__(cls)
+        rep.__title = title
+        return rep
+
     def as_dict(self):
         """Return the fields required to recreate this rep. Can be fed back to
         from_dict method.
@@ -1,44 +1,21 @@
-import collections
+from .rep import Rep
+from .search import TitleIndex
+from .store import Store
 
-class RepStore(collections.MutableMapping):
+class RepStore(Store):
     """A dictionary like interface for storing Rep objects"""
-
-    def __init__(self, *args, **kwargs):
-        self.__store = dict()
-        self.update(dict(*args, **kwargs))
-
-    def __getitem__(self, key):
-        return self.__store[str(key)]
-
-    def __setitem__(self, key, value):
-        self.__store[str(key)] = value
-
-    def __delitem__(self, key):
-        del self.__store[str(key)]
-
-    def __iter__(self):
-        return iter(self.__store)
-
-    def __len__(self):
-        return len(self.__store)
-
-    def get_new_key(self):
-        return str(int(max(self.__store.keys(), key=int)) + 1) if len(self.__store) else '1'
-
-    def create(self, value):
-        new_key = self.get_new_key()
-        self.__setitem__(new_key, value)
-        return new_key
-
-    def read(self, key):
-        return self.__getitem__(str(key))
-
-    def update(self, *args, **kwargs):
-        for key, value in dict(*args, **kwargs).iteritems():
-            self.__store[str(key)] = value
-
-    def delete(self, key):
-        self.__delitem__(str(key))
-
-    def as_dict(self):
-        return {key: value.as_dict() for key, value in self.__store.iteritems()}
+    item_class = Rep
+    title_index = None
+
+    def enable_search(self):
+        """Start maintaining a TitleIndex so the store can be searched.
+        """
+        if self.title_index is None:
+            self.title_index = self.add_index(TitleIndex())
+        return self.title_index
+
+    def search(self, query=None, prefix=None, limit=20, offset=0):
+        """Return (total, [(key, score), ...]) for Reps whose titles match
+        query and/or prefix.  See TitleIndex.search.
+        """
+        return self.enable_search().search(query, prefix, limit, offset)
@@ -0,0 +1,137 @@
+import bisect
+import heapq
+import re
+import threading
+
+from .key_order import sort_key
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(title):
+    """Split a title into lower case word tokens.
+    """
+    return TOKEN.findall(title.lower())
+
+
+class TitleIndex(object):
+    """Inverted index from title tokens to Rep keys, for RepStore.search.
+
+    It is a store index, so it is kept up to date on every change.  Tokens
+    are also kept in a sorted list so that every token starting with a prefix
+    can be found with a binary search.  New tokens are only sorted in, and
+    dropped ones swept out, the next time a prefix is searched, so a burst of
+    inserts does not pay for the sorting.
+    """
+
+    def __init__(self):
+        self.__postings = {}
+        self.__tokens = []
+        self.__new_tokens = []
+        self.__dropped = 0
+        self.__lengths = {}
+        self.__lock = threading.Lock()
+
+    def add(self, key, rep):
+        tokens = tokenize(rep.title)
+        postings = self.__postings
+        with self.__lock:
+            self.__lengths[key] = len(tokens)
+            for token in set(tokens):
+                if token in postings:
+                    postings[token].add(key)
+                else:
+                    postings[token] = set([key])
+                    self.__new_tokens.append(token)
+
+    def fill(self, scan):
+        """Add the Reps of a backend with a scan method, tokenizing each
+        part's titles where scan runs it.
+        """
+        for postings, lengths in scan(_tokenized):
+            with self.__lock:
+                self.__lengths.update(lengths)
+                for token in postings.viewkeys() & self.__postings.viewkeys():
+                    self.__postings[token].update(postings.pop(token))
+                self.__new_tokens.extend(postings)
+                self.__postings.update(postings)
+
+    def remove(self, key, rep):
+        tokens = tokenize(rep.title)
+        with self.__lock:
+            self.__lengths.pop(key, None)
+            for token in set(tokens):
+                keys = self.__postings.get(token)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.__postings[token]
+                        self.__dropped += 1
+
+    def search(self, query=None, prefix=None, limit=20, offset=0):
+        """Return (total, results) for the Reps whose titles contain every
+        word of query and, if prefix is given, a word starting with prefix.
+
+        The score of a match is the share of its title's words that the
+        search matched, so a title equal to the query scores 1.0.  results is
+        the list of (key, score) pairs from offset to offset + limit, best
+        first, ties in key order.  Candidates are taken from the rarest word
+        first, so a selective word keeps the search fast however common the
+        others are.
+        """
+        words = sorted(set(tokenize(query or '')), key=self.__frequency)
+        prefix = None if prefix is None else prefix.lower()
+        if not words and not prefix:
+            return 0, []
+        with self.__lock:
+            if words:
+                matches = set(self.__postings.get(words[0], ()))
+                for word in words[1:]:
+                    matches.intersection_update(self.__postings.get(word, ()))
+                if prefix:
+                    matches = self.__prefixed(prefix, matches)
+            else:
+                matches = self.__prefixed(prefix)
+            matched = len(words) + (1 if prefix else 0)
+            scored = [(key, matched / float(max(self.__lengths.get(key, 1), matched)))
+                      for key in matches]
+        ranked = heapq.nsmallest(offset + limit, scored,
+                                 key=lambda item: (-item[1], sort_key(item[0])))
+        return len(scored), ranked[offset:]
+
+    def __frequency(self, token):
+        return len(self.__postings.get(token, ()))
+
+    def __prefixed(self, prefix, among=None):
+        """Return the keys with a token starting with prefix, optionally only
+        those in among.
+        """
+        if self.__new_tokens or self.__dropped * 2 > len(self.__tokens):
+            self.__tokens = sorted(set(token for token in self.__tokens + self.__new_tokens
+                                       if token in self.__postings))
+            self.__new_tokens = []
+            self.__dropped = 0
+        keys = set()
+        tokens = self.__tokens
+        index = bisect.bisect_left(tokens, prefix)
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            postings = self.__postings.get(tokens[index], ())
+            keys.update(postings if among is None else among.intersection(postings))
+            index += 1
+        return keys
+
+def _tokenized(reps):
+    """Return the postings of the titles of reps, a mapping of Reps by key,
+    as a dict of token to a set of keys, and the number of tokens of each
+    title.
+    """
+    postings = {}
+    lengths = {}
+    for key, rep in reps.iteritems():
+        tokens = tokenize(rep.title)
+        lengths[key] = len(tokens)
+        for token in set(tokens):
+            if token in postings:
+                postings[token].add(key)
+            else:
+                postings[token] = set([key])
+    return postings, lengths
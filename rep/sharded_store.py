@@ -0,0 +1,212 @@
+import collections
+import itertools
+import json
+import marshal
+import multiprocessing
+import threading
+import zlib
+from multiprocessing.pool import ThreadPool
+
+from .pin_store import PinStore
+from .rep_store import RepStore
+
+POOLS = ('process', 'thread', 'serial')
+
+class ShardedBackend(collections.MutableMapping):
+    """Store backend that partitions keys across a number of shards, each a
+    plain dict, so that work over the whole store can run on several cores.
+
+    Reading, writing or deleting a key touches only its shard: integer keys
+    go to shard key % shards, others by a CRC of the key.  scan(function)
+    runs function on every shard at once and returns the results, which is
+    how json_lines() and the fill() of indexes that have one spread a full
+    pass over the store across the workers.
+
+    pool is how scans run:
+
+    thread  run on a pool of workers threads, which only helps where the
+            work releases the GIL (the default)
+    process fork workers processes for each scan, which see the shards as
+            they were at the fork and send their results back pickled, so
+            a scan costs a fork and the transfer of its results
+    serial  run one shard after another in the calling thread
+
+    workers defaults to the number of CPUs.  A forked worker inherits every
+    lock as it was at the fork, so a process pool is only safe where no
+    other thread can be holding one, such as a single threaded batch job;
+    it is never the default, and a server handling requests on threads
+    must not use it.
+    """
+    DEFAULT_SHARDS = 8
+    DEFAULT_POOL = 'thread'
+
+    def __init__(self, shards=DEFAULT_SHARDS, pool=DEFAULT_POOL, workers=None):
+        if pool not in POOLS:
+            raise ValueError("%s is not a valid pool" % pool)
+        if isinstance(shards, int):
+            shards = [{} for _ in range(shards)]
+        self.shards = shards
+        self.pool = pool
+        self.workers = workers or multiprocessing.cpu_count()
+        self.__threads = None
+        self.__lock = threading.Lock()
+
+    def shard(self, key):
+        """Return the shard that holds key, raising KeyError for a key that
+        is neither a string nor an integer.
+        """
+        try:
+            number = int(key)
+        except (TypeError, ValueError):
+            try:
+                data = key if isinstance(key, bytes) else key.encode('utf-8')
+            except AttributeError:
+                raise KeyError(key)
+            number = zlib.crc32(data) & 0xffffffff
+        return self.shards[number % len(self.shards)]
+
+    def __getitem__(self, key):
+        return self.shard(key)[key]
+
+    def __setitem__(self, key, value):
+        self.shard(key)[key] = value
+
+    def __delitem__(self, key):
+        del self.shard(key)[key]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.shards)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def __contains__(self, key):
+        try:
+            return key in self.shard(key)
+        except KeyError:
+            return False
+
+    def iteritems(self):
+        return itertools.chain.from_iterable(shard.iteritems() for shard in self.shards)
+
+    def copy(self):
+        return ShardedBackend([dict(shard) for shard in self.shards], self.pool, self.workers)
+
+    def get_many(self, keys):
+        """Return the objects under keys, in the same order, with None for
+        missing keys.
+        """
+        return [self.get(key) for key in keys]
+
+    def scan(self, function):
+        """Return the list of function(shard) for every shard, in shard
+        order, run on the pool.
+        """
+        shards = self.shards
+        if self.pool == 'serial' or self.workers < 2 or len(shards) < 2:
+            return [function(shard) for shard in shards]
+        if self.pool == 'thread':
+            with self.__lock:
+                if self.__threads is None:
+                    self.__threads = ThreadPool(self.workers)
+            return self.__threads.map(function, shards, chunksize=1)
+        global _scanning
+        with _scan_lock:
+            _scanning = (shards, function)
+            try:
+                processes = _fork_pool(min(self.workers, len(shards)))
+            finally:
+                _scanning = None
+        try:
+            return [_unpacked(result) for result in
+                    processes.map(_scan_shard, range(len(shards)), chunksize=1)]
+        finally:
+            processes.terminate()
+            processes.join()
+
+    def records(self):
+        """Return a dict of the as_dict records of every object by key,
+        each shard's built by a scan.  A process pool is not used: copying
+        the records back from the workers costs more than building them.
+        """
+        if self.pool == 'process':
+            parts = [_shard_records(shard) for shard in self.shards]
+        else:
+            parts = self.scan(_shard_records)
+        records = {}
+        for part in parts:
+            records.update(part)
+        return records
+
+    def json_lines(self):
+        """Return the objects as lines of JSON, [key, record], in one string
+        per shard, each encoded by a scan.
+        """
+        return self.scan(_shard_json_lines)
+
+    def close(self):
+        with self.__lock:
+            threads, self.__threads = self.__threads, None
+        if threads is not None:
+            threads.close()
+            threads.join()
+
+
+# The shards and function of the scan whose process pool is being forked.
+_scanning = None
+_scan_lock = threading.Lock()
+
+def _fork_pool(workers):
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('fork').Pool(workers)
+    return multiprocessing.Pool(workers)
+
+def _scan_shard(number):
+    """Run the scan's function on one shard in a worker process.  Results
+    made of plain values go back marshalled, which is quicker to write and
+    read than a pickle.
+    """
+    shards, function = _scanning
+    result = function(shards[number])
+    try:
+        return True, marshal.dumps(result)
+    except ValueError:
+        return False, result
+
+def _unpacked(result):
+    marshalled, value = result
+    return marshal.loads(value) if marshalled else value
+
+def _shard_records(shard):
+    return {key: value.as_dict() for key, value in shard.iteritems()}
+
+def _shard_json_lines(shard):
+    return ''.join(json.dumps([key, value.as_dict()]) + '\n' for key, value in shard.iteritems())
+
+
+class ShardedRepStore(RepStore):
+    """A RepStore kept in a ShardedBackend.  The shards, pool and workers
+    keyword arguments are passed on to it; see there before choosing the
+    process pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['backend'] = _sharded_backend(kwargs)
+        super(ShardedRepStore, self).__init__(*args, **kwargs)
+
+
+class ShardedPinStore(PinStore):
+    """A PinStore kept in a ShardedBackend.  The shards, pool and workers
+    keyword arguments are passed on to it; see there before choosing the
+    process pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['backend'] = _sharded_backend(kwargs)
+        super(ShardedPinStore, self).__init__(*args, **kwargs)
+
+
+def _sharded_backend(kwargs):
+    return ShardedBackend(kwargs.pop('shards', ShardedBackend.DEFAULT_SHARDS),
+                          kwargs.pop('pool', ShardedBackend.DEFAULT_POOL),
+                          kwargs.pop('workers', None))
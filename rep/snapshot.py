@@ -0,0 +1,241 @@
+"""Dump stores to, and load them from, compact binary snapshot files.
+
+    python -m rep.snapshot dump DIR [--backend NAME] [--data-dir DIR]
+    python -m rep.snapshot load DIR [--backend NAME] [--data-dir DIR] [--trusted]
+    python -m rep.snapshot info FILE...
+
+dump writes the Reps and Pins of a backend to DIR/reps.snap and
+DIR/pins.snap; load adds them to a backend.
+
+A snapshot holds one column per field, plus one for the keys, each
+starting on an 8 byte boundary after a JSON header:
+
+    MAGIC, header length (4 bytes, big endian), header JSON, columns
+
+The header gives the item class, the number of objects and the kind of
+each column.  An int column is an array of 64 bit integers, used when every
+value is an integer; a text column is a string table, with count + 1
+offsets followed by the UTF-8 strings back to back; a json column is a
+string table of the JSON encodings of the values, for anything else.
+Numbers are in the byte order of the machine that wrote the file, which the
+header records.
+
+Files are read through mmap, each column in one piece.  A trusted load
+builds objects with item_class.from_trusted, skipping the validation of
+their fields; only load snapshots you wrote yourself that way.
+"""
+from __future__ import print_function
+
+import argparse
+import array
+import contextlib
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+
+from .backends import BACKENDS, open_store
+from .pin import Pin
+from .pin_store import PinStore
+from .rep import Rep
+from .rep_store import RepStore
+
+MAGIC = b'REPSNAP\x01'
+HEADER = struct.Struct('!I')
+ITEM_CLASSES = {'Rep': Rep, 'Pin': Pin}
+STORES = (('reps', RepStore), ('pins', PinStore))
+INT64 = 'q' if 'q' in getattr(array, 'typecodes', '') else 'l'
+MAX_INT64 = 2 ** 63 - 1
+
+if sys.version_info[0] < 3:
+    INTEGERS = (int, long)
+else:
+    INTEGERS = (int,)
+
+def dump(store, path):
+    """Write the objects in store to a snapshot file at path, as they are
+    at the moment dump is called.
+    """
+    with _collector_paused():
+        items = sorted(store.snapshot().items())
+        columns = [('key', [key for key, _ in items])]
+        columns.extend((field, [getattr(value, field) for _, value in items])
+                       for field in store.item_class.fields)
+    kinds = ['int' if all(_is_integer_key(key) for key in columns[0][1]) else 'text']
+    kinds.extend(_kind(values) for _, values in columns[1:])
+    header = json.dumps({'item_class': store.item_class.__name__, 'count': len(items),
+                         'byteorder': sys.byteorder,
+                         'columns': [[name, kind] for (name, _), kind in zip(columns, kinds)]})
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as snapshot:
+        snapshot.write(MAGIC + HEADER.pack(len(header)) + header.encode('utf-8'))
+        for (_, values), kind in zip(columns, kinds):
+            _pad(snapshot)
+            if kind == 'int':
+                _write_array(snapshot, values)
+            else:
+                _write_strings(snapshot, values if kind == 'text' else
+                               [json.dumps(value) for value in values])
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.rename(temporary, path)
+
+def load(path, trusted=False):
+    """Return the item class of the snapshot at path and a dict of its
+    objects by key.  The objects' fields are validated unless trusted.
+    """
+    with open(path, 'rb') as snapshot:
+        if os.fstat(snapshot.fileno()).st_size == 0:
+            raise ValueError("%s is not a snapshot" % path)
+        data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a snapshot" % path)
+        length, = HEADER.unpack_from(data, len(MAGIC))
+        start = len(MAGIC) + HEADER.size
+        header = json.loads(data[start:start + length].decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError("%s was written with %s endian numbers" %
+                             (path, header['byteorder']))
+        item_class = ITEM_CLASSES[header['item_class']]
+        count = header['count']
+        position = start + length
+        columns = []
+        for _, kind in header['columns']:
+            position += -position % 8
+            if kind == 'int':
+                values, position = _read_array(data, position, count)
+            else:
+                values, position = _read_strings(data, position, count)
+                if kind == 'json':
+                    values = [json.loads(value) for value in values]
+            columns.append(values)
+    finally:
+        data.close()
+    if [name for name, _ in header['columns']] != ['key'] + list(item_class.fields):
+        raise ValueError("%s does not match the fields of %s" %
+                         (path, item_class.__name__))
+    with _collector_paused():
+        keys = [str(key) for key in columns[0]]
+        if trusted:
+            items = [item_class.from_trusted(*values) for values in zip(*columns[1:])]
+        else:
+            fields = item_class.fields
+            items = [item_class(**dict(zip(fields, values)))
+                     for values in zip(*columns[1:])]
+        return item_class, dict(zip(keys, items))
+
+def open_snapshot(path, store_class, trusted=False):
+    """Return a new in-memory store of store_class holding the objects of
+    the snapshot at path.  This skips the per-object work of update().
+    """
+    item_class, items = load(path, trusted)
+    if item_class is not store_class.item_class:
+        raise ValueError("%s holds %s objects" % (path, item_class.__name__))
+    with _collector_paused():
+        return store_class(backend=items)
+
+def restore(store, path, trusted=False):
+    """Add the objects of the snapshot at path to store, in one update.
+    """
+    item_class, items = load(path, trusted)
+    if item_class is not store.item_class:
+        raise ValueError("%s holds %s objects" % (path, item_class.__name__))
+    store.update(items)
+    return len(items)
+
+@contextlib.contextmanager
+def _collector_paused():
+    """Pause the cyclic garbage collector, which otherwise runs over and
+    over, scanning every object made so far, while millions are created.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _kind(values):
+    if all(type(value) in INTEGERS and -MAX_INT64 <= value <= MAX_INT64
+           for value in values):
+        return 'int'
+    if all(isinstance(value, str) for value in values):
+        return 'text'
+    return 'json'
+
+def _is_integer_key(key):
+    return key.isdigit() and str(int(key)) == key and int(key) <= MAX_INT64
+
+def _pad(snapshot):
+    snapshot.write(b'\0' * (-snapshot.tell() % 8))
+
+def _write_array(snapshot, values):
+    numbers = array.array(INT64, [int(value) for value in values])
+    snapshot.write(numbers.tostring() if sys.version_info[0] < 3 else numbers.tobytes())
+
+def _write_strings(snapshot, values):
+    encoded = [value.encode('utf-8') if not isinstance(value, bytes) else value
+               for value in values]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    _write_array(snapshot, offsets)
+    snapshot.write(b''.join(encoded))
+
+def _read_array(data, position, count):
+    numbers = array.array(INT64)
+    end = position + count * numbers.itemsize
+    if sys.version_info[0] < 3:
+        numbers.fromstring(data[position:end])
+    else:
+        numbers.frombytes(data[position:end])
+    return numbers, end
+
+def _read_strings(data, position, count):
+    offsets, position = _read_array(data, position, count + 1)
+    blob = data[position:position + offsets[-1]]
+    strings = [blob[start:end] for start, end in zip(offsets, offsets[1:])]
+    if sys.version_info[0] >= 3:
+        strings = [string.decode('utf-8') for string in strings]
+    return strings, position + offsets[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('dump', 'load', 'info'))
+    parser.add_argument('paths', nargs='+', metavar='PATH')
+    parser.add_argument('--backend', choices=[name for name in BACKENDS if name != 'memory'],
+                        default='log')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--sync', default='always')
+    parser.add_argument('--trusted', action='store_true',
+                        help='skip validating the objects loaded')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        for path in args.paths:
+            item_class, items = load(path, trusted=True)
+            print('%s: %d %s objects' % (path, len(items), item_class.__name__))
+        return
+    if len(args.paths) != 1:
+        parser.error('%s takes one snapshot directory' % args.command)
+    directory = args.paths[0]
+    if args.command == 'dump' and not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, store_class in STORES:
+        store = open_store(store_class, name, args.backend, args.data_dir, args.sync)
+        path = os.path.join(directory, '%s.snap' % name)
+        try:
+            if args.command == 'dump':
+                dump(store, path)
+                print('%s: dumped %d objects' % (path, len(store)))
+            else:
+                print('%s: loaded %d objects' % (path, restore(store, path, args.trusted)))
+        finally:
+            store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+import collections
+import contextlib
+import json
+import sqlite3
+import threading
+
+from .cached_backend import CachedBackend
+from .pin_store import PinStore
+from .rep_store import RepStore
+
+class SqliteBackend(collections.MutableMapping):
+    """Store backend that keeps objects in a table of an SQLite database.
+
+    Each object is saved as its as_dict record in JSON, along with a text
+    column for every field in item_class.fields.  The columns named in
+    indexed get an SQL index so select can look objects up by field.
+
+    Every thread gets its own connection for reads, created on first use, so
+    one backend can be shared by all the threads of a server.  Writes go
+    through one connection shared by every thread, taking turns, as SQLite
+    only lets one connection write at a time anyway; a thread in a write
+    reads through it too, so it sees its own changes.  Writes made inside
+    transaction() are committed together; any other write commits on its own.
+    """
+    ORDER_BLOCK = 1000
+    MANY_BLOCK = 500
+
+    def __init__(self, path, table, item_class, indexed=()):
+        self.path = path
+        self.table = table
+        self.item_class = item_class
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+        self.__writer = None
+        self.__write_lock = threading.RLock()
+        self.__version = None
+        self.__columns = ', '.join(['key', 'record'] + list(item_class.fields))
+        self.__placeholders = ', '.join('?' * (len(item_class.fields) + 2))
+        with self.transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, '
+                       'record TEXT NOT NULL, %s)' % (table, ', '.join(
+                           '%s TEXT' % field for field in item_class.fields)))
+            db.execute('CREATE INDEX IF NOT EXISTS %s_order ON %s (CAST(key AS INTEGER), key)' %
+                       (table, table))
+            for field in indexed:
+                db.execute('CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)' %
+                           (table, field, table, field))
+
+    def __getitem__(self, key):
+        row = self.__connection().execute(
+            'SELECT record FROM %s WHERE key = ?' % self.table, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self.__item(row[0])
+
+    def get_many(self, keys):
+        """Return the objects under keys, in the same order, with None for
+        missing keys, selecting up to MANY_BLOCK keys per query.
+        """
+        found = self.__select_many(keys)
+        return [None if found.get(key) is None else self.__item(found[key])
+                for key in keys]
+
+    def record(self, key):
+        """Return the as_dict record of the object under key, without
+        building the object.
+        """
+        row = self.__connection().execute(
+            'SELECT record FROM %s WHERE key = ?' % self.table, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def get_records(self, keys):
+        """Return the records of the objects under keys, in the same order,
+        with None for missing keys.
+        """
+        found = self.__select_many(keys)
+        return [None if found.get(key) is None else json.loads(found[key])
+                for key in keys]
+
+    def records(self):
+        """Return a dict of the records of every object by key.
+        """
+        return {str(key): json.loads(record) for key, record in self.__connection().execute(
+            'SELECT key, record FROM %s' % self.table)}
+
+    def __setitem__(self, key, value):
+        record = value.as_dict()
+        with self.transaction() as db:
+            db.execute('INSERT OR REPLACE INTO %s (%s) VALUES (%s)' %
+                       (self.table, self.__columns, self.__placeholders),
+                       [key, json.dumps(record)] +
+                       [_text(record[field]) for field in self.item_class.fields])
+
+    def __delitem__(self, key):
+        with self.transaction() as db:
+            deleted = db.execute('DELETE FROM %s WHERE key = ?' % self.table, (key,))
+            if deleted.rowcount == 0:
+                raise KeyError(key)
+
+    def __iter__(self):
+        for row in self.__connection().execute('SELECT key FROM %s' % self.table):
+            yield str(row[0])
+
+    def __len__(self):
+        return self.__connection().execute(
+            'SELECT COUNT(*) FROM %s' % self.table).fetchone()[0]
+
+    def __contains__(self, key):
+        return self.__connection().execute(
+            'SELECT 1 FROM %s WHERE key = ?' % self.table, (key,)).fetchone() is not None
+
+    def iteritems(self):
+        for key, record in self.__connection().execute(
+                'SELECT key, record FROM %s' % self.table):
+            yield str(key), self.__item(record)
+
+    def ordered_keys(self, after=None):
+        """Yield the keys in the order of KeyOrder, starting after the key
+        after: keys of digits only by value, then the rest as strings.  Keys
+        are fetched a block at a time so a long walk does not hold a read
+        transaction open.
+        """
+        after = None if after is None else str(after)
+        if after is None or after.isdigit():
+            number, key = (-1, '') if after is None else (int(after), after)
+            while True:
+                rows = self.__connection().execute(
+                    'SELECT key, CAST(key AS INTEGER) FROM %s WHERE %s AND '
+                    'CAST(key AS INTEGER) >= ? AND (CAST(key AS INTEGER) > ? OR key > ?) '
+                    'ORDER BY CAST(key AS INTEGER), key LIMIT ?' % (self.table, _DIGITS),
+                    (number, number, key, self.ORDER_BLOCK)).fetchall()
+                for row in rows:
+                    yield str(row[0])
+                if len(rows) < self.ORDER_BLOCK:
+                    break
+                key, number = rows[-1]
+            after = None
+        # The empty key is the first of the rest.
+        after, compare = ('', '>=') if after is None else (after, '>')
+        while True:
+            rows = self.__connection().execute(
+                'SELECT key FROM %s WHERE NOT %s AND key %s ? ORDER BY key LIMIT ?' %
+                (self.table, _DIGITS, compare), (after, self.ORDER_BLOCK)).fetchall()
+            for row in rows:
+                yield str(row[0])
+            if len(rows) < self.ORDER_BLOCK:
+                return
+            after, compare = rows[-1][0], '>'
+
+    def snapshot(self):
+        """Return the backend itself.  Each read is a single statement,
+        and SQLite runs every statement against one consistent state of the
+        database, so iterating the backend never sees a write half made.
+        """
+        return self
+
+    def select(self, field, value):
+        """Yield (key, record) for every object whose field equals value,
+        comparing as text.
+        """
+        if field not in self.item_class.fields:
+            raise AttributeError("%s is not a valid field" % field)
+        for key, record in self.__connection().execute(
+                'SELECT key, record FROM %s WHERE %s = ?' % (self.table, field),
+                (_text(value),)):
+            yield str(key), json.loads(record)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group the writes made inside the block into one transaction on
+        this thread's connection.  Transactions may be nested; only the
+        outermost one commits.
+        """
+        depth = getattr(self.__local, 'depth', 0)
+        if depth == 0:
+            self.__write_lock.acquire()
+            try:
+                db = self.__write_connection()
+                db.execute('BEGIN IMMEDIATE')
+            except Exception:
+                self.__write_lock.release()
+                raise
+        else:
+            db = self.__writer
+        self.__local.depth = depth + 1
+        try:
+            yield db
+        except Exception:
+            self.__local.depth = depth
+            if depth == 0:
+                try:
+                    db.execute('ROLLBACK')
+                finally:
+                    self.__write_lock.release()
+            raise
+        self.__local.depth = depth
+        if depth == 0:
+            try:
+                db.execute('COMMIT')
+            finally:
+                self.__write_lock.release()
+
+    def data_version(self):
+        """Return a number that changes whenever anything but this backend,
+        such as another process, commits a write to the database.  Writes
+        made through this backend, from any thread, leave it as it is.
+        While another thread is writing, the number last read is returned.
+        """
+        if not self.__write_lock.acquire(self.__version is None):
+            return self.__version
+        try:
+            self.__version = self.__write_connection().execute(
+                'PRAGMA data_version').fetchone()[0]
+            return self.__version
+        finally:
+            self.__write_lock.release()
+
+    def close(self):
+        """Close the connections of every thread.
+        """
+        with self.__write_lock, self.__lock:
+            for db in self.__connections:
+                db.close()
+            self.__connections = []
+            self.__writer = None
+        self.__local = threading.local()
+
+    def __connection(self):
+        if getattr(self.__local, 'depth', 0):
+            return self.__writer
+        db = getattr(self.__local, 'connection', None)
+        if db is None:
+            db = self.__local.connection = self.__open()
+        return db
+
+    def __write_connection(self):
+        if self.__writer is None:
+            self.__writer = self.__open()
+        return self.__writer
+
+    def __open(self):
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        with self.__lock:
+            self.__connections.append(db)
+        return db
+
+    def __select_many(self, keys):
+        found = {}
+        db = self.__connection()
+        for start in range(0, len(keys), self.MANY_BLOCK):
+            block = keys[start:start + self.MANY_BLOCK]
+            found.update(db.execute('SELECT key, record FROM %s WHERE key IN (%s)' %
+                                    (self.table, ', '.join('?' * len(block))), block))
+        return found
+
+    def __item(self, record):
+        return self.item_class(**{str(field): value
+                                  for field, value in json.loads(record).items()})
+
+
+class SqliteRepStore(RepStore):
+    """A RepStore kept in the reps table of an SQLite database.  Given a
+    cache_items keyword argument, up to that many Reps are kept in a
+    CachedBackend in front of it, written per cache_mode.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        kwargs['backend'] = _cached(SqliteBackend(path, 'reps', self.item_class), kwargs)
+        super(SqliteRepStore, self).__init__(*args, **kwargs)
+
+
+class SqlitePinStore(PinStore):
+    """A PinStore kept in the pins table of an SQLite database.  The parent
+    and child columns are indexed, so get_children and get_parents are
+    answered by indexed queries instead of an in-memory index.  The
+    cache_items and cache_mode keyword arguments are as for SqliteRepStore.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        self.__backend = _cached(SqliteBackend(path, 'pins', self.item_class,
+                                               indexed=('parent', 'child')), kwargs)
+        kwargs['backend'] = self.__backend
+        super(SqlitePinStore, self).__init__(*args, **kwargs)
+
+    def create_pin_index(self):
+        return _SqlitePinIndex(self.__backend)
+
+
+class _SqlitePinIndex(object):
+    """Answers PinIndex queries from the indexed pin columns."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def children(self, parent):
+        return [record['child'] for _, record in self.backend.select('parent', parent)]
+
+    def parents(self, child):
+        return [record['parent'] for _, record in self.backend.select('child', child)]
+
+
+# Keys of digits only, which sort by value.
+_DIGITS = "(key <> '' AND key NOT GLOB '*[^0-9]*')"
+
+def _cached(backend, kwargs):
+    cache_items = kwargs.pop('cache_items', 0)
+    cache_mode = kwargs.pop('cache_mode', 'write-through')
+    if not cache_items:
+        return backend
+    return CachedBackend(backend, cache_items, cache_mode)
+
+def _text(value):
+    return u'%s' % value
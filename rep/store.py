@@ -0,0 +1,484 @@
+import collections
+import contextlib
+import heapq
+import itertools
+import json
+import threading
+import weakref
+
+from .field_index import INDEX_KINDS, plan
+from .json_cache import JsonCache
+from .key_allocator import KeyAllocator
+from .key_order import KeyOrder, sort_key
+from .versions import Versions
+
+class Store(collections.MutableMapping):
+    """A dictionary like interface for storing objects under generated keys.
+
+    Objects are kept in a backend mapping, which is a plain dict unless a
+    backend keyword argument is given.  Any MutableMapping can be used, so
+    persistent storage engines plug in underneath without changing this
+    interface.  Keys are always strings.
+
+    Indexes registered in self.indexes are kept up to date on every change.
+    An index is any object with add(key, item) and remove(key, item) methods.
+
+    self.versions counts changes to the whole store and to each key, for
+    conditional requests.
+
+    Read only paths such as as_dict and json_fragment work from the objects'
+    as_dict records.  Backends that keep records rather than objects provide
+    record(key), get_records(keys) and records(), a dict of every record by
+    key, so those paths build no objects.  Backends that can split a pass
+    over every object into parts run on several workers provide
+    scan(function), which records, exports and the fill(scan) method of
+    indexes that have one go through.
+
+    Fields of the stored objects can be indexed with add_field_index and
+    looked up with query.
+
+    Keys can also be read in ascending order for pagination.  Backends that
+    can order their own keys provide ordered_keys(after); for the rest a
+    KeyOrder index is kept.
+
+    A store can be shared between threads.  Writes, and the index updates
+    that go with them, are serialized by a lock.  Backends whose writes
+    wait to be made durable provide group_commit(), a context manager
+    within which they do not wait; the store leaves it once the lock is
+    released, so writers can share the wait.  Reads take no lock:
+    single lookups go straight to the backend, and whole store reads such as
+    iteration and as_dict work on a snapshot, so they neither block writers
+    nor see a change half made.
+    """
+    item_class = None
+    json_cache = None
+    QUERY_BLOCK = 1000
+
+    def __init__(self, *args, **kwargs):
+        backend = kwargs.pop('backend', None)
+        self.__store = dict() if backend is None else backend
+        self.__keys = kwargs.pop('allocator', None) or KeyAllocator()
+        self.__lock = threading.RLock()
+        self.__batch = threading.local()
+        self.__snapshot = None
+        self.__snapshots = []
+        self.indexes = []
+        self.field_indexes = {}
+        self.versions = self.add_index(Versions(), fill=False)
+        for key in self.__store:
+            self.__keys.observe(key)
+        if not hasattr(self.__store, 'ordered_keys'):
+            self.__order = self.add_index(KeyOrder())
+        self.update(dict(*args, **kwargs))
+
+    def __getitem__(self, key):
+        return self.__store[str(key)]
+
+    def __setitem__(self, key, value):
+        key = str(key)
+        with self.__group_commit(), self.__lock:
+            self.__keys.observe(key)
+            self.__replace(key, self.__store.get(key), value)
+
+    def __delitem__(self, key):
+        key = str(key)
+        with self.__group_commit(), self.__lock:
+            value = self.__store[key]
+            self.__snapshot = None
+            del self.__store[key]
+            self._unindex(key, value)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.__store)
+
+    def get_new_key(self):
+        return self.__keys.next_key()
+
+    def reserve_keys(self, count):
+        return self.__keys.reserve(count)
+
+    def create(self, value):
+        new_key = self.get_new_key()
+        self.__setitem__(new_key, value)
+        return new_key
+
+    def read(self, key):
+        return self.__getitem__(str(key))
+
+    def record(self, key):
+        """Return the as_dict record of the object under key.
+        """
+        key = str(key)
+        if hasattr(self.__store, 'record'):
+            return self.__store.record(key)
+        return self.__store[key].as_dict()
+
+    def read_records(self, keys):
+        """Return the as_dict records of the objects under keys, in the same
+        order, with None for missing keys.
+        """
+        keys = [str(key) for key in keys]
+        if hasattr(self.__store, 'get_records'):
+            return self.__store.get_records(keys)
+        return [None if value is None else value.as_dict() for value in self.read_many(keys)]
+
+    def read_many(self, keys):
+        """Return the objects under keys, in the same order, with None for
+        missing keys.  Backends that can fetch many objects at once provide
+        get_many(keys); the rest are read a key at a time.
+        """
+        keys = [str(key) for key in keys]
+        if hasattr(self.__store, 'get_many'):
+            return self.__store.get_many(keys)
+        get = self.__store.get
+        return [get(key) for key in keys]
+
+    def update(self, *args, **kwargs):
+        with self.__group_commit(), self.__lock, self.batch():
+            # In the order given, so the writes before a refused one are
+            # the same every time.
+            for key, value in collections.OrderedDict(*args, **kwargs).iteritems():
+                self.__setitem__(key, value)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group the writes made inside the block into one transaction, for
+        backends that support transactions.  If the transaction is rolled
+        back, the index changes made inside the block are undone with it.
+        """
+        if not hasattr(self.__store, 'transaction'):
+            yield
+            return
+        if getattr(self.__batch, 'changes', None) is not None:
+            with self.__store.transaction():
+                yield
+            return
+        changes = self.__batch.changes = []
+        try:
+            with self.__store.transaction():
+                yield
+        except Exception:
+            self.__batch.changes = None
+            with self.__lock:
+                self.__snapshot = None
+                for added, key, value in reversed(changes):
+                    if added:
+                        self._unindex(key, value)
+                    else:
+                        self._index(key, value)
+            raise
+        finally:
+            self.__batch.changes = None
+
+    def delete(self, key):
+        self.__delitem__(str(key))
+
+    def as_dict(self):
+        return _records(self.snapshot())
+
+    def export(self, output):
+        """Write every object to the file output as a line of JSON, [key,
+        record], as they are at the moment export is called, in no
+        particular order.  Backends that can encode their objects in parts
+        provide json_lines(), returning the lines of each part as one
+        string.
+        """
+        for lines in _json_lines(self.snapshot()):
+            output.write(lines)
+
+    def snapshot(self):
+        """Return a read only mapping of the objects in the store as they
+        are now.  Later writes, including changes made to objects in place,
+        do not show in it, so it can be read at leisure while other threads
+        write.
+
+        The backend is copied with its copy() method, or key by key if it
+        has none, and the copy is shared by every caller until the next
+        write.  A backend with its own snapshot() method provides the
+        snapshot itself instead.
+        """
+        if hasattr(self.__store, 'snapshot'):
+            return self.__store.snapshot()
+        with self.__lock:
+            snapshot = self.__snapshot and self.__snapshot()
+            if snapshot is None:
+                copy = getattr(self.__store, 'copy', None)
+                snapshot = _Snapshot(dict(self.__store) if copy is None else copy())
+                self.__snapshot = weakref.ref(snapshot)
+                self.__snapshots = [ref for ref in self.__snapshots if ref() is not None]
+                self.__snapshots.append(self.__snapshot)
+            return snapshot
+
+    def enable_json_cache(self, max_bytes=JsonCache.DEFAULT_MAX_BYTES):
+        """Start caching the JSON encoding of objects in a JsonCache.
+        """
+        if self.json_cache is None:
+            self.json_cache = self.add_index(JsonCache(max_bytes), fill=False)
+        return self.json_cache
+
+    def json_fragment(self, key):
+        """Return the object under key encoded as JSON, from the JSON cache
+        when it is enabled.
+        """
+        key = str(key)
+        if self.json_cache is None:
+            return json.dumps(self.record(key))
+        return self.json_cache.fragment(key, self.record)
+
+    def json_fragments(self, keys):
+        """Return the objects under keys encoded as JSON, in the same order,
+        with None for missing keys.  Objects not in the JSON cache are read
+        with one read_records.
+        """
+        keys = [str(key) for key in keys]
+        if self.json_cache is None:
+            return [None if record is None else json.dumps(record)
+                    for record in self.read_records(keys)]
+        return self.json_cache.fragments(keys, self.read_records)
+
+    def ordered_keys(self, after=None):
+        """Yield keys in ascending order, starting after the key after.
+        """
+        if hasattr(self.__store, 'ordered_keys'):
+            return self.__store.ordered_keys(after)
+        return self.__order.keys(after)
+
+    def add_field_index(self, field, kind='sorted'):
+        """Index the objects by one of their fields, with a HashIndex for
+        equality lookups or a SortedIndex for ranges and ordering as well.
+        """
+        if field not in self.item_class.fields:
+            raise ValueError("%s is not a valid field" % field)
+        if kind not in INDEX_KINDS:
+            raise ValueError("%s is not a valid index kind" % kind)
+        with self.__lock:
+            for index in self.field_indexes.get(field, ()):
+                if index.kind == kind:
+                    return index
+            index = self.add_index(INDEX_KINDS[kind](field))
+            self.field_indexes.setdefault(field, []).append(index)
+        return index
+
+    def query(self, where=None, ranges=None, sort=None, descending=False, limit=None):
+        """Find the objects whose fields equal the values in where, a dict
+        of field to value, and lie in the ranges, a dict of field to (low,
+        high) with both ends included and None for an open end.
+
+        Returns (plan, keys): the keys of up to limit matches ordered by the
+        field sort, descending if asked, ties and unsorted results in key
+        order (reversed when descending); and the description of the plan
+        field_index.plan chose to find them, using the field indexes where
+        they help.
+        """
+        where = where or {}
+        ranges = ranges or {}
+        for field in list(where) + list(ranges) + ([] if sort is None else [sort]):
+            if field not in self.item_class.fields:
+                raise ValueError("%s is not a valid field" % field)
+        chosen = plan(self.field_indexes, len(self), where, ranges, sort, limit)
+        index = chosen.index
+        if index is None:
+            candidates = self.ordered_keys()
+        elif chosen.access == 'equal':
+            candidates = index.equal(where[index.field])
+        else:
+            low, high = ranges.get(index.field, (None, None))
+            candidates = index.range(low, high, descending and sort == index.field)
+        in_order = (sort is None and chosen.access in ('scan', 'equal') or
+                    index is not None and index.kind == 'sorted' and index.field == sort)
+        matches = []
+        candidates = iter(candidates)
+        # Reading in order with a limit, start with a block of limit
+        # candidates and double it while too few of them match.
+        size = self.QUERY_BLOCK
+        if in_order and limit is not None:
+            size = min(size, max(limit, 1))
+        while not (in_order and limit is not None and len(matches) >= limit):
+            block = list(itertools.islice(candidates, size))
+            if not block:
+                break
+            size = min(size * 2, self.QUERY_BLOCK)
+            matches.extend((key, record) for key, record in zip(block, self.read_records(block))
+                           if record is not None and _matches(record, where, ranges))
+        if not in_order:
+            if sort is None:
+                order = lambda match: sort_key(match[0])
+                descending = False
+            else:
+                order = lambda match: (match[1][sort], sort_key(match[0]))
+            if limit is None:
+                matches.sort(key=order, reverse=descending)
+            elif descending:
+                matches = heapq.nlargest(limit, matches, key=order)
+            else:
+                matches = heapq.nsmallest(limit, matches, key=order)
+        return chosen.describe(), [key for key, _ in matches[:limit]]
+
+    def ordered_items(self, after=None):
+        """Yield (key, object) pairs in key order, starting after the key
+        after.  Objects deleted during the walk are skipped.
+        """
+        for key in self.ordered_keys(after):
+            try:
+                yield key, self.__store[key]
+            except KeyError:
+                pass
+
+    def page(self, limit=None, after=None):
+        """Return up to limit (key, object) pairs in key order, starting
+        after the key after.  Pass the last key returned as after to get the
+        next page.
+        """
+        return list(itertools.islice(self.ordered_items(after), limit))
+
+    def add_index(self, index, fill=True):
+        """Register an index and, unless fill is false, fill it with the
+        objects already stored.
+        """
+        with self.__lock:
+            if fill and hasattr(index, 'fill') and hasattr(self.__store, 'scan'):
+                index.fill(self.__store.scan)
+            elif fill:
+                for key, value in self.__store.iteritems():
+                    index.add(key, value)
+            self.indexes.append(index)
+        return index
+
+    def item_changed(self, key, value, previous):
+        """Record that the object stored under key was changed in place.
+        previous is a copy of the object as it was before the change.
+        Returns False, recording nothing, if key is no longer stored.
+        """
+        key = str(key)
+        with self.__group_commit(), self.__lock:
+            if key not in self.__store:
+                return False
+            for ref in self.__snapshots:
+                snapshot = ref()
+                if snapshot is not None:
+                    snapshot._restore(key, value, previous)
+            self.__replace(key, previous, value)
+        return True
+
+    def close(self):
+        """Release the backend, if it holds any resources.
+        """
+        if hasattr(self.__store, 'close'):
+            self.__store.close()
+
+    def __group_commit(self):
+        if hasattr(self.__store, 'group_commit'):
+            return self.__store.group_commit()
+        return _no_transaction()
+
+    def __replace(self, key, old, value):
+        """Store value under key in place of old, which may be None.  If an
+        index or the backend rejects value, the change is rolled back and the
+        exception passed on.
+        """
+        self.__snapshot = None
+        if old is not None:
+            self._unindex(key, old)
+        try:
+            self._index(key, value)
+            try:
+                self.__store[key] = value
+            except Exception:
+                self._unindex(key, value)
+                raise
+        except Exception:
+            if old is not None:
+                self._index(key, old)
+            raise
+
+    def _index(self, key, value):
+        added = []
+        try:
+            for index in self.indexes:
+                index.add(key, value)
+                added.append(index)
+        except Exception:
+            for index in reversed(added):
+                index.remove(key, value)
+            raise
+        self.__changed(True, key, value)
+
+    def _unindex(self, key, value):
+        for index in self.indexes:
+            index.remove(key, value)
+        self.__changed(False, key, value)
+
+    def __changed(self, added, key, value):
+        changes = getattr(self.__batch, 'changes', None)
+        if changes is not None:
+            changes.append((added, key, value))
+
+
+class _Snapshot(collections.Mapping):
+    """A read only view of a copy of a store's backend.  See Store.snapshot.
+    """
+
+    def __init__(self, items):
+        self.__items = items
+
+    def __getitem__(self, key):
+        return self.__items[str(key)]
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key):
+        return str(key) in self.__items
+
+    def iteritems(self):
+        return self.__items.iteritems()
+
+    def records(self):
+        return _records(self.__items)
+
+    def json_lines(self):
+        return _json_lines(self.__items)
+
+    def _restore(self, key, value, previous):
+        """Put back the copy previous of an object changed in place, if the
+        snapshot still shares the changed object value.
+        """
+        if self.__items.get(key) is value:
+            self.__items[key] = previous
+
+
+def _matches(record, where, ranges):
+    for field, value in where.items():
+        if record[field] != value:
+            return False
+    for field, (low, high) in ranges.items():
+        if low is not None and record[field] < low or high is not None and record[field] > high:
+            return False
+    return True
+
+def _records(items):
+    """Return a dict of the as_dict records of the objects in items, a
+    backend or a snapshot, by key.
+    """
+    if hasattr(items, 'records'):
+        return items.records()
+    return {key: value.as_dict() for key, value in items.iteritems()}
+
+def _json_lines(items):
+    """Return the lines of JSON, [key, record], of the objects in items, a
+    backend or a snapshot, as a list of strings.
+    """
+    if hasattr(items, 'json_lines'):
+        return items.json_lines()
+    return [''.join(json.dumps([key, record]) + '\n'
+                    for key, record in _records(items).iteritems())]
+
+@contextlib.contextmanager
+def _no_transaction():
+    yield
@@ -0,0 +1,271 @@
+"""Serve a RepStore and a PinStore to other processes over a Unix socket.
+
+    python -m rep.store_server [--socket PATH] [--backend NAME] [--data-dir DIR]
+
+Worker processes reach the stores through RemoteRepStore and RemotePinStore,
+so every worker sees the same data.
+
+Requests and responses are length prefixed frames.  A request is a
+REQUEST header (opcode, store number, payload length) followed by the
+payload, and is answered by a RESPONSE header (status, payload length) and
+payload.  Responses come back in request order, so a client can send many
+requests before reading any answer.  Objects travel as the JSON of their
+as_dict records; the record of a GET is taken from the store's JSON cache.
+
+GET       payload key; answer the object's JSON
+GET_MANY  payload keys, one per line; answer one JSON object per line, an
+          empty line for a missing key
+SET       payload key, a newline, then the object's JSON
+DELETE    payload key
+CALL      payload JSON [method, [arguments]] for the methods in CALLS;
+          answer the JSON of the result
+"""
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import os
+import signal
+import socket
+import struct
+import threading
+
+from .backends import BACKENDS, open_store
+from .json_cache import JsonCache
+from .pin_store import PinStore
+from .rep_store import RepStore
+from .topological_order import CycleError
+
+STORES = ('reps', 'pins')
+STORE_CLASSES = (RepStore, PinStore)
+
+REQUEST = struct.Struct('!BBI')
+RESPONSE = struct.Struct('!BI')
+
+GET, GET_MANY, SET, DELETE, CALL = range(5)
+
+OK = 0
+# An error of type ERRORS[n] is answered with status n + 1 and its message.
+# A subclass must come before its base class.
+ERRORS = (CycleError, KeyError, ValueError, AttributeError, TypeError)
+FAILED = 255
+
+def item(item_class, record):
+    """Build an object of item_class from its as_dict record.
+    """
+    return item_class(**{str(field): value for field, value in record.items()})
+
+def text(data):
+    """Return data, bytes received from a socket, as a native string.
+    """
+    return data if isinstance(data, str) else data.decode('utf-8')
+
+def data(value):
+    """Return a native string as bytes to send on a socket.
+    """
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+def read_exactly(stream, size):
+    """Read size bytes from stream, or raise EOFError if it ends first.
+    """
+    chunk = stream.read(size)
+    if len(chunk) < size:
+        raise EOFError("connection closed")
+    return chunk
+
+
+def _walk(store, direction, key, depth, order):
+    if direction not in ('descendants', 'ancestors'):
+        raise ValueError("%s is not a valid direction" % direction)
+    return list(getattr(store, direction)(key, depth, order))
+
+def _update(store, pairs):
+    store.update((key, item(store.item_class, record)) for key, record in pairs)
+
+def _cache_stats(store):
+    return None if store.json_cache is None else store.json_cache.stats()
+
+def _enable_json_cache(store, max_bytes):
+    store.enable_json_cache(max_bytes)
+
+def _enable_search(store):
+    store.enable_search()
+
+def _enable_topological_order(store):
+    store.enable_topological_order()
+
+# The methods a client can CALL.  Each takes the store and the arguments
+# sent, and returns something that can be encoded as JSON.
+CALLS = {
+    'len': len,
+    'contains': lambda store, key: key in store,
+    'keys': list,
+    'ordered_keys': lambda store, after, limit: list(
+        itertools.islice(store.ordered_keys(after), limit)),
+    'reserve_keys': lambda store, count: store.reserve_keys(count),
+    'create': lambda store, record: store.create(item(store.item_class, record)),
+    'update': _update,
+    'as_dict': lambda store: store.as_dict(),
+    'version': lambda store, key: [store.versions.etag(key), store.versions.modified],
+    'enable_json_cache': _enable_json_cache,
+    'cache_stats': _cache_stats,
+    'enable_search': _enable_search,
+    'search': lambda store, query, prefix, limit, offset: store.search(
+        query, prefix, limit, offset),
+    'add_field_index': lambda store, field, kind: store.add_field_index(field, kind).kind,
+    'query': lambda store, where, ranges, sort, descending, limit: store.query(
+        where, dict((field, tuple(bounds)) for field, bounds in ranges.items()),
+        sort, descending, limit),
+    'enable_topological_order': _enable_topological_order,
+    'toposort': lambda store: store.toposort(),
+    'children': lambda store, key: store.get_children(key),
+    'parents': lambda store, key: store.get_parents(key),
+    'walk': _walk,
+    'subtree': lambda store, key, depth, direction: store.subtree(key, depth, direction),
+}
+
+
+class StoreServer(object):
+    """Serves stores, a dict of store name (see STORES) to store, on the
+    Unix socket at path.  Each connection is served by its own thread;
+    the stores are safe to share between them.
+    """
+    BACKLOG = 128
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, path, stores):
+        self.path = path
+        self.stores = [stores[name] for name in STORES]
+        self.__listener = None
+        self.__stopped = threading.Event()
+
+    def start(self):
+        """Listen on the socket and serve connections in the background.
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.__listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__listener.bind(self.path)
+        self.__listener.listen(self.BACKLOG)
+        acceptor = threading.Thread(target=self.__accept)
+        acceptor.daemon = True
+        acceptor.start()
+        return self
+
+    def serve_forever(self):
+        """Serve connections until close is called.
+        """
+        if self.__listener is None:
+            self.start()
+        while not self.__stopped.wait(1):
+            pass
+
+    def close(self):
+        """Stop accepting connections and remove the socket.
+        """
+        self.__stopped.set()
+        if self.__listener is not None:
+            self.__listener.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def __accept(self):
+        while not self.__stopped.is_set():
+            try:
+                connection, _ = self.__listener.accept()
+            except socket.error:
+                return
+            server = threading.Thread(target=self.__serve, args=(connection,))
+            server.daemon = True
+            server.start()
+
+    def __serve(self, connection):
+        # Every request already received is answered before the answers are
+        # sent, together, so a pipelining client costs one send per batch.
+        received = bytearray()
+        try:
+            while True:
+                chunk = connection.recv(self.RECEIVE_SIZE)
+                if not chunk:
+                    return
+                received += chunk
+                answers = []
+                start = 0
+                while len(received) - start >= REQUEST.size:
+                    opcode, number, length = REQUEST.unpack_from(received, start)
+                    end = start + REQUEST.size + length
+                    if len(received) < end:
+                        break
+                    status, answer = self.__answer(
+                        opcode, number, bytes(received[start + REQUEST.size:end]))
+                    answer = data(answer)
+                    answers.append(RESPONSE.pack(status, len(answer)))
+                    answers.append(answer)
+                    start = end
+                del received[:start]
+                if answers:
+                    connection.sendall(b''.join(answers))
+        except socket.error:
+            pass
+        finally:
+            connection.close()
+
+    def __answer(self, opcode, number, payload):
+        if number >= len(self.stores):
+            return FAILED, '%d is not a valid store number' % number
+        try:
+            return OK, self.__do(opcode, self.stores[number], text(payload))
+        except ERRORS as error:
+            status = [isinstance(error, error_class) for error_class in ERRORS].index(True) + 1
+            return status, str(error.args[0] if error.args else '')
+        except Exception as error:
+            return FAILED, '%s: %s' % (type(error).__name__, error)
+
+    @staticmethod
+    def __do(opcode, store, payload):
+        if opcode == GET:
+            return store.json_fragment(payload)
+        if opcode == GET_MANY:
+            return '\n'.join(text or '' for text in store.json_fragments(payload.split('\n')))
+        if opcode == SET:
+            key, record = payload.split('\n', 1)
+            store[key] = item(store.item_class, json.loads(record))
+            return ''
+        if opcode == DELETE:
+            del store[payload]
+            return ''
+        if opcode == CALL:
+            method, arguments = json.loads(payload)
+            if method not in CALLS:
+                raise AttributeError("%s is not a store method" % method)
+            return json.dumps(CALLS[method](store, *arguments))
+        raise ValueError("%s is not a valid opcode" % opcode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', default='rep.sock')
+    parser.add_argument('--backend', choices=BACKENDS, default='memory')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--sync', default='always')
+    parser.add_argument('--json-cache-bytes', type=int, default=JsonCache.DEFAULT_MAX_BYTES)
+    args = parser.parse_args()
+
+    stores = {}
+    for name, store_class in zip(STORES, STORE_CLASSES):
+        stores[name] = open_store(store_class, name, args.backend, args.data_dir, args.sync)
+        if args.json_cache_bytes:
+            stores[name].enable_json_cache(args.json_cache_bytes)
+    stores['reps'].enable_search()
+    server = StoreServer(args.socket, stores)
+    signal.signal(signal.SIGTERM, lambda *_: server.close())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+    for store in stores.values():
+        store.close()
+
+if __name__ == '__main__':
+    main()
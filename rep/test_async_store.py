@@ -0,0 +1,55 @@
+"""unittest and doc for AsyncStore, non-blocking access to a store"""
+
+from unittest import TestCase
+
+from . import AsyncStore, Pin, PinStore, Rep, RepStore
+
+class AsyncStoreTest(TestCase):
+    """AsyncStore runs store reads on a pool of threads."""
+    def setUp(self):
+        self.rep_store = RepStore()
+        self.keys = [self.rep_store.create(Rep(title='rep %d' % number))
+                     for number in range(10)]
+        self.async_store = AsyncStore(self.rep_store, workers=3)
+
+    def tearDown(self):
+        self.async_store.close()
+
+    def test_read(self):
+        """read returns a result whose get waits for the Rep."""
+        result = self.async_store.read(self.keys[0])
+        self.assertEquals(result.get().title, 'rep 0')
+
+    def test_read_error(self):
+        """Errors are raised by get."""
+        with self.assertRaises(KeyError):
+            self.async_store.read('missing').get()
+
+    def test_read_many(self):
+        """read_many fans out over the workers and keeps the keys' order,
+        with None for missing keys."""
+        reps = self.async_store.read_many(self.keys + ['missing']).get()
+        self.assertEquals([rep and rep.title for rep in reps],
+                          ['rep %d' % number for number in range(10)] + [None])
+
+    def test_iter_items(self):
+        """iter_items walks the store in key order a block at a time."""
+        self.async_store.BLOCK = 4
+        self.assertEquals([key for key, _ in self.async_store.iter_items()], self.keys)
+        self.assertEquals([key for key, _ in self.async_store.iter_items(self.keys[7])],
+                          self.keys[8:])
+
+    def test_iter_fragments(self):
+        """iter_fragments skips keys that are not stored."""
+        self.async_store.BLOCK = 4
+        fragments = list(self.async_store.iter_fragments(['missing'] + self.keys[:5]))
+        self.assertEquals([key for key, _ in fragments], self.keys[:5])
+        self.assertEquals(fragments[0][1], '{"title": "rep 0"}')
+
+    def test_submit(self):
+        """Any other store call can be run on the pool."""
+        pin_store = PinStore()
+        pin_store.create(Pin(1, 2))
+        async_pins = AsyncStore(pin_store, workers=2)
+        self.assertEquals(async_pins.submit(pin_store.get_children, 1).get(), [2])
+        async_pins.close()
@@ -0,0 +1,174 @@
+"""unittest and doc for CachedBackend, which caches objects of a slower backend"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from . import (
+    CachedBackend,
+    CycleError,
+    Pin,
+    PinStore,
+    Rep,
+    RepStore,
+    SqliteBackend,
+    SqlitePinStore,
+    SqliteRepStore,
+    test_pin_store,
+    test_rep_store,
+    test_sqlite_store,
+)
+from .backends import open_store
+
+class CachedRepStoreTest(test_rep_store.RepStoreTest):
+    """A RepStore behind a small write-through cache passes the same tests
+    as RepStore."""
+    def setUp(self):
+        self.rep_store = RepStore(backend=CachedBackend({}, max_items=2))
+
+
+class CachedPinStoreTest(test_pin_store.PinStoreTest):
+    """A PinStore behind a small write-back cache passes the same tests as
+    PinStore."""
+    def setUp(self):
+        self.pin_store = PinStore(backend=CachedBackend({}, max_items=3, mode='write-back',
+                                                        max_dirty=2))
+
+
+class CachedSqliteRepStoreTest(test_sqlite_store.SqliteRepStoreTest):
+    """SqliteRepStore passes the same tests with a write-through cache."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rep_store = SqliteRepStore(os.path.join(self.path, 'rep.db'), cache_items=5)
+
+
+class CachedSqlitePinStoreTest(test_sqlite_store.SqlitePinStoreTest):
+    """SqlitePinStore passes the same tests with a write-back cache, whose
+    waiting Pins are written before the indexed queries."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.pin_store = SqlitePinStore(os.path.join(self.path, 'rep.db'), cache_items=5,
+                                        cache_mode='write-back')
+
+    def test_cycle_in_update(self):
+        """Write-back writes are not grouped into transactions, so the Pins
+        stored before the one refused are kept, and stay in the order."""
+        self.pin_store.enable_topological_order()
+        with self.assertRaises(CycleError):
+            self.pin_store.update([('1', Pin('1', '2')), ('2', Pin('2', '3')),
+                                   ('3', Pin('3', '1'))])
+        self.assertEquals(len(self.pin_store), 2)
+        self.assertEquals(len(self.pin_store.toposort()), 3)
+
+
+class CachedBackendTest(TestCase):
+    """Reads are served from the cache, which is kept up to date."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.database = os.path.join(self.path, 'rep.db')
+        self.sqlite = SqliteBackend(self.database, 'reps', Rep)
+        self.cache = CachedBackend(self.sqlite, max_items=3, check_interval=0)
+        for key in '12345':
+            self.cache[key] = Rep(title='rep %s' % key)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.path)
+
+    def test_counts(self):
+        """ Hits, misses and evictions are counted, and the least recently
+        used objects are evicted first.
+        """
+        self.assertEquals(self.cache.stats()['entries'], 3)
+        self.assertEquals(self.cache.stats()['evictions'], 2)
+        self.assertEquals(self.cache['5'].title, 'rep 5')
+        self.assertEquals(self.cache['1'].title, 'rep 1')
+        self.assertEquals(self.cache.get_many(['5', '1', '2', 'missing']),
+                          [self.cache['5'], self.cache['1'], self.cache['2'], None])
+        stats = self.cache.stats()
+        self.assertEquals((stats['hits'], stats['misses']), (6, 3))
+        self.assertTrue(self.cache['5'] is self.cache['5'])
+        self.assertEquals(self.cache.record('1'), {'title': 'rep 1'})
+        self.assertEquals(self.cache.get_records(['2', 'missing']), [{'title': 'rep 2'}, None])
+        self.assertRaises(KeyError, self.cache.__getitem__, 'missing')
+        self.assertRaises(ValueError, CachedBackend, {}, mode='write-around')
+
+    def test_write_back(self):
+        """ Write-back caches write when enough writes are waiting, or
+        before a whole store read.
+        """
+        cache = CachedBackend(self.sqlite, max_items=10, mode='write-back', max_dirty=3)
+        cache['1'] = Rep(title='first')
+        cache['1'] = Rep(title='again')
+        cache['6'] = Rep(title='six')
+        self.assertEquals(self.sqlite['1'].title, 'rep 1')
+        self.assertEquals(cache['1'].title, 'again')
+        self.assertEquals(cache.stats()['dirty'], 2)
+        self.assertEquals(len(cache), 6)
+        self.assertEquals(self.sqlite['1'].title, 'again')
+        self.assertEquals(cache.stats()['writebacks'], 2)
+        cache['7'] = Rep(title='seven')
+        del cache['7']
+        self.assertFalse('7' in cache or '7' in self.sqlite)
+        cache['8'] = Rep(title='eight')
+        self.assertEquals(list(cache.ordered_keys('6')), ['8'])
+        self.assertFalse(hasattr(cache, 'transaction'))
+
+    def test_write_back_kept(self):
+        """ A write waiting in a full write-back cache is never the one
+        evicted to make room for it.
+        """
+        cache = CachedBackend(self.sqlite, max_items=4, mode='write-back', max_dirty=4)
+        cache['6'] = Rep(title='rep 6')
+        cache['7'] = Rep(title='rep 7')
+        for key in '1122':
+            cache[key]
+        cache['8'] = Rep(title='rep 8')
+        self.assertTrue('8' in cache)
+        self.assertEquals(cache['8'].title, 'rep 8')
+        cache.flush()
+        self.assertEquals(self.sqlite['8'].title, 'rep 8')
+
+    def test_own_threads(self):
+        """ Writes made through the backend by other threads of this
+        process do not drop the cache.
+        """
+        self.assertEquals(self.cache['5'].title, 'rep 5')
+        writer = threading.Thread(target=self.cache.__setitem__,
+                                  args=('6', Rep(title='rep 6')))
+        writer.start()
+        writer.join()
+        other = SqliteBackend(self.database, 'reps', Rep)
+        self.assertEquals(other['6'].title, 'rep 6')
+        other.close()
+        self.assertEquals(self.cache['5'].title, 'rep 5')
+        self.assertEquals(self.cache.stats()['invalidations'], 0)
+
+    def test_invalidation(self):
+        """ Writes to the database by another connection drop the cache.
+        """
+        self.assertEquals(self.cache['5'].title, 'rep 5')
+        other = SqliteBackend(self.database, 'reps', Rep)
+        other['5'] = Rep(title='changed')
+        other.close()
+        self.assertEquals(self.cache['5'].title, 'changed')
+        self.assertEquals(self.cache.stats()['invalidations'], 3)
+        self.cache.invalidate(['5'])
+        self.assertEquals(self.cache.stats()['invalidations'], 4)
+
+    def test_sqlite_backend(self):
+        """ The sqlite backend is cached when cache_items is given.
+        """
+        for store_class in (RepStore, PinStore):
+            item_store = open_store(store_class, 'items', 'sqlite', self.path, cache_items=10)
+            item_store[1] = store_class.item_class(**{field: 1 for field in
+                                                      store_class.item_class.fields})
+            self.assertEquals(item_store.read_many([1]), [item_store[1]])
+            item_store.close()
+        pin_store = open_store(PinStore, 'pins', 'sqlite', self.path, cache_items=10,
+                               cache_mode='write-back')
+        pin_store.create(Pin(2, 3))
+        self.assertEquals(pin_store.get_children(2), [3])
+        pin_store.close()
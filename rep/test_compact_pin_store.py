@@ -0,0 +1,79 @@
+"""unittest and doc for CompactPinStore, the columnar PinStore"""
+
+from unittest import TestCase
+
+from . import (
+    CompactPinStore,
+    Pin,
+)
+
+class CompactPinStoreTest(TestCase):
+    """CompactPinStore keeps pins between integer Rep keys in typed arrays
+    and builds Pin objects only when they are read.
+    """
+    def setUp(self):
+        self.pin_store = CompactPinStore()
+
+    def test_create_read(self):
+        """Pins read back with integer parents and children."""
+        key = self.pin_store.create(Pin('1', 2))
+        self.assertEquals(self.pin_store[key].as_dict(), {'parent': 1, 'child': 2})
+
+    def test_integers_only(self):
+        """Pins between keys that are not integers are rejected."""
+        with self.assertRaises(ValueError):
+            self.pin_store.create(Pin('key1', 'key2'))
+        self.assertEquals(len(self.pin_store), 0)
+        self.assertEquals(self.pin_store.get_children('key1'), [])
+
+    def test_delete_reuses_slot(self):
+        """Deleted pins are gone and their slot is used again."""
+        first = self.pin_store.create(Pin(1, 2))
+        del self.pin_store[first]
+        second = self.pin_store.create(Pin(3, 4))
+        with self.assertRaises(KeyError):
+            self.pin_store[first]
+        self.assertEquals(self.pin_store.as_dict(), {second: {'parent': 3, 'child': 4}})
+
+    def test_children_and_parents(self):
+        """get_children and get_parents follow inserts, updates and deletes."""
+        keys = [self.pin_store.create(Pin(1, child)) for child in (2, 3, 4)]
+        self.pin_store.update({keys[0]: Pin(5, 2)})
+        del self.pin_store[keys[1]]
+        self.assertEquals(self.pin_store.get_children(1), [4])
+        self.assertEquals(self.pin_store.get_children('5'), [2])
+        self.assertEquals(self.pin_store.get_parents(4), [1])
+
+    def test_in_place_change(self):
+        """Changing a materialized pin writes it back to the columns."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store[key].child = 3
+        self.assertEquals(self.pin_store[key].child, 3)
+        self.assertEquals(self.pin_store.get_children(1), [3])
+
+    def test_rejected_in_place_change(self):
+        """A change to a value that cannot be stored is undone."""
+        key = self.pin_store.create(Pin(1, 2))
+        pin = self.pin_store[key]
+        with self.assertRaises(ValueError):
+            pin.parent = 'not a key'
+        self.assertEquals(pin.parent, 1)
+        self.assertEquals(self.pin_store.get_children(1), [2])
+
+    def test_page(self):
+        """Keys are paged in order."""
+        keys = [self.pin_store.create(Pin(1, child)) for child in range(5)]
+        del self.pin_store[keys[2]]
+        self.assertEquals([key for key, _ in self.pin_store.page(2, after=keys[0])],
+                          [keys[1], keys[3]])
+
+    def test_order_out_of_order(self):
+        """Keys written out of order, deleted or written again are paged
+        in order, each once."""
+        self.pin_store.update({key: Pin(1, key) for key in ('5', '3', '9', '1')})
+        self.assertEquals([key for key, _ in self.pin_store.page()], ['1', '3', '5', '9'])
+        del self.pin_store['3']
+        del self.pin_store['9']
+        self.pin_store.update({'3': Pin(1, 3), '2': Pin(1, 2)})
+        self.assertEquals([key for key, _ in self.pin_store.page()], ['1', '2', '3', '5'])
+        self.assertEquals([key for key, _ in self.pin_store.page(after='2')], ['3', '5'])
@@ -0,0 +1,146 @@
+"""Stress tests for stores shared between threads"""
+
+import random
+import threading
+from unittest import TestCase
+
+from . import CompactPinStore, Pin, PinStore, Rep, RepStore
+
+THREADS = 8
+OPERATIONS = 300
+
+def hammer(worker, threads=THREADS):
+    """Run worker(number) in many threads at once and return the exceptions
+    they raised.
+    """
+    errors = []
+    start = threading.Event()
+    def run(number):
+        start.wait()
+        try:
+            worker(number)
+        except Exception as error:
+            errors.append(error)
+    workers = [threading.Thread(target=run, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.set()
+    for thread in workers:
+        thread.join()
+    return errors
+
+
+class RepStoreConcurrencyTest(TestCase):
+    """Many threads can create, read, update and delete Reps at once."""
+    def setUp(self):
+        self.store = RepStore()
+        self.store.enable_search()
+        self.store.enable_json_cache()
+
+    def test_create(self):
+        """ Keys created concurrently are never handed out twice.
+        """
+        created = [[] for _ in range(THREADS)]
+        def worker(number):
+            for _ in range(OPERATIONS):
+                created[number].append(self.store.create(Rep(title='rep')))
+        self.assertEquals(hammer(worker), [])
+        keys = [key for keys in created for key in keys]
+        self.assertEquals(len(set(keys)), THREADS * OPERATIONS)
+        self.assertEquals(len(self.store), THREADS * OPERATIONS)
+
+    def test_mixed(self):
+        """ Mixed writes alongside whole store reads raise nothing and leave
+        the indexes agreeing with the store.
+        """
+        def writer(number):
+            rand = random.Random(number)
+            mine = []
+            for _ in range(OPERATIONS):
+                action = rand.random()
+                if action < 0.5 or not mine:
+                    mine.append(self.store.create(Rep(title='word%d' % rand.randint(0, 9))))
+                elif action < 0.8:
+                    self.store[rand.choice(mine)] = Rep(title='word%d' % rand.randint(0, 9))
+                else:
+                    del self.store[mine.pop(rand.randrange(len(mine)))]
+                if mine:
+                    self.store.json_fragment(rand.choice(mine))
+        def reader(number):
+            for _ in range(OPERATIONS // 25):
+                snapshot = self.store.as_dict()
+                listed = list(self.store.ordered_keys())
+                self.assertTrue(len(snapshot) >= 0 and len(listed) >= 0)
+                self.store.search('word1')
+        def worker(number):
+            (writer if number % 2 else reader)(number)
+        self.assertEquals(hammer(worker), [])
+        keys = sorted(self.store, key=int)
+        self.assertEquals(list(self.store.ordered_keys()), keys)
+        total, _ = self.store.search(prefix='word', limit=0)
+        self.assertEquals(total, len(keys))
+        for key in keys:
+            self.assertEquals(self.store.json_fragment(key),
+                              '{"title": "%s"}' % self.store[key].title)
+
+    def test_snapshot(self):
+        """ A snapshot does not change while the store is written.
+        """
+        for number in range(100):
+            self.store.create(Rep(title='%d' % number))
+        snapshot = self.store.snapshot()
+        before = dict((key, rep.title) for key, rep in snapshot.iteritems())
+        def worker(number):
+            for key in list(before)[number::THREADS]:
+                del self.store[key]
+                self.store.create(Rep(title='new'))
+        self.assertEquals(hammer(worker), [])
+        self.assertEquals(dict((key, rep.title) for key, rep in snapshot.iteritems()),
+                          before)
+
+
+class PinStoreConcurrencyTest(TestCase):
+    """Many threads can add, move and delete pins at once."""
+    store_class = PinStore
+
+    def setUp(self):
+        self.store = self.store_class()
+
+    def test_mixed(self):
+        """ Concurrent pin changes, in place or not, leave the parent and
+        child indexes agreeing with the store.
+        """
+        def worker(number):
+            rand = random.Random(number)
+            mine = []
+            for _ in range(OPERATIONS):
+                action = rand.random()
+                if action < 0.5 or not mine:
+                    mine.append(self.store.create(Pin(rand.randint(0, 9), rand.randint(0, 9))))
+                elif action < 0.7:
+                    self.store[rand.choice(mine)].child = rand.randint(0, 9)
+                elif action < 0.8:
+                    list(self.store.descendants(rand.randint(0, 9)))
+                    self.store.as_dict()
+                else:
+                    del self.store[mine.pop(rand.randrange(len(mine)))]
+        self.assertEquals(hammer(worker), [])
+        pins = self.store.as_dict()
+        for parent in range(10):
+            self.assertEquals(sorted(self.store.get_children(parent)),
+                              sorted(pin['child'] for pin in pins.values()
+                                     if pin['parent'] == parent))
+
+    def test_snapshot_in_place(self):
+        """ A pin changed in place keeps its old value in an earlier
+        snapshot.
+        """
+        key = self.store.create(Pin(1, 2))
+        snapshot = self.store.snapshot()
+        self.store[key].child = 3
+        self.assertEquals(snapshot[key].child, 2)
+        self.assertEquals(self.store[key].child, 3)
+
+
+class CompactPinStoreConcurrencyTest(PinStoreConcurrencyTest):
+    store_class = CompactPinStore
@@ -0,0 +1,166 @@
+"""unittest and doc for field indexes and Store.query"""
+
+from unittest import TestCase
+
+from . import HashIndex, Pin, PinStore, Rep, RepStore, SortedIndex
+
+class FieldIndexTest(TestCase):
+    """Field indexes follow the changes to a store."""
+    def setUp(self):
+        self.store = RepStore()
+        self.keys = {}
+        for title in ['pear', 'apple', 'fig', 'apple', 'kiwi']:
+            key = self.store.create(Rep(title=title))
+            self.keys.setdefault(title, []).append(key)
+
+    def test_hash_index(self):
+        """ A HashIndex finds the keys with a value, in key order.
+        """
+        index = self.store.add_field_index('title', 'hash')
+        self.assertTrue(isinstance(index, HashIndex))
+        self.assertEquals(index.equal('apple'), self.keys['apple'])
+        self.assertEquals(index.count('kiwi'), 1)
+        self.store[self.keys['kiwi'][0]] = Rep(title='apple')
+        self.assertEquals(index.count('kiwi'), 0)
+        self.assertEquals(index.count('apple'), 3)
+        self.assertEquals(index.equal('plum'), [])
+
+    def test_sorted_index(self):
+        """ A SortedIndex reads keys in field order, from low to high with
+        both included.
+        """
+        index = self.store.add_field_index('title')
+        self.assertTrue(isinstance(index, SortedIndex))
+        self.assertEquals(list(index.range('b', 'kiwi')), self.keys['fig'] + self.keys['kiwi'])
+        self.assertEquals(list(index.range(high='apple')), self.keys['apple'])
+        self.assertEquals(list(index.range('kiwi', descending=True)),
+                          self.keys['pear'] + self.keys['kiwi'])
+        del self.store[self.keys['pear'][0]]
+        self.assertEquals(index.count_range('kiwi'), 1)
+        self.assertEquals(len(index), 4)
+
+    def test_bulk_changes(self):
+        """ A burst of changes is merged into a SortedIndex in one pass, and
+        an object added and removed before the merge leaves no entry.
+        """
+        index = self.store.add_field_index('title')
+        self.assertEquals(len(index), 5)
+        key = self.store.create(Rep(title='lime'))
+        del self.store[key]
+        self.store.update((key, Rep(title='n%04d' % number))
+                          for number, key in enumerate(self.store.reserve_keys(100)))
+        self.assertEquals(len(index), 105)
+        self.assertEquals(index.count_range('n', 'o'), 100)
+        self.assertEquals(index.count('lime'), 0)
+        index.READ_BLOCK = 7
+        ascending = list(index.range('n', 'o'))
+        self.assertEquals(len(ascending), 100)
+        self.assertEquals(list(index.range('n', 'o', descending=True)), ascending[::-1])
+
+    def test_same_index(self):
+        """ Adding an index again returns the existing one.
+        """
+        index = self.store.add_field_index('title')
+        self.assertTrue(self.store.add_field_index('title') is index)
+        self.assertFalse(self.store.add_field_index('title', 'hash') is index)
+
+    def test_invalid(self):
+        """ Only fields of the objects can be indexed or queried, with a
+        known kind of index.
+        """
+        self.assertRaises(ValueError, self.store.add_field_index, 'size')
+        self.assertRaises(ValueError, self.store.add_field_index, 'title', 'tree')
+        self.assertRaises(ValueError, self.store.query, {'size': 1})
+        self.assertRaises(ValueError, self.store.query, sort='size')
+
+
+class QueryTest(TestCase):
+    """Store.query answers the same with or without indexes."""
+    def setUp(self):
+        self.store = RepStore()
+        self.store.update((key, Rep(title='title %03d' % (number % 50)))
+                          for number, key in enumerate(self.store.reserve_keys(200)))
+
+    def check(self, plan, *args, **kwargs):
+        """ Check that query chooses plan and finds what a scan finds.
+        """
+        chosen, keys = self.store.query(*args, **kwargs)
+        self.assertEquals(chosen, plan)
+        scan = RepStore(backend=dict(self.store.items()))
+        self.assertEquals(scan.query(*args, **kwargs), ('scan', keys))
+        return keys
+
+    def test_scan(self):
+        """ Without indexes every object is read.
+        """
+        keys = self.check('scan', {'title': 'title 007'})
+        self.assertEquals(keys, ['8', '58', '108', '158'])
+        keys = self.check('scan', ranges={'title': ('title 048', None)}, sort='title',
+                          descending=True, limit=3)
+        self.assertEquals(keys, ['200', '150', '100'])
+
+    def test_equal(self):
+        """ An equality condition is looked up in an index on its field.
+        """
+        self.store.add_field_index('title', 'hash')
+        keys = self.check('hash title equal', {'title': 'title 007'}, limit=2)
+        self.assertEquals(keys, ['8', '58'])
+
+    def test_range(self):
+        """ A range is read from a sorted index, in field order when sorted
+        by that field.
+        """
+        self.store.add_field_index('title')
+        keys = self.check('sorted title range',
+                          ranges={'title': ('title 010', 'title 011')})
+        self.assertEquals(keys, ['11', '12', '61', '62', '111', '112', '161', '162'])
+        keys = self.check('sorted title range', ranges={'title': ('title 010', 'title 011')},
+                          sort='title', descending=True, limit=3)
+        self.assertEquals(keys, ['162', '112', '62'])
+
+    def test_ordered(self):
+        """ Sorting with a limit walks a sorted index on the sort field and
+        stops early.
+        """
+        self.store.add_field_index('title')
+        keys = self.check('sorted title ordered', sort='title', limit=5)
+        self.assertEquals(keys, ['1', '51', '101', '151', '2'])
+
+    def test_replaced_then_deleted(self):
+        """ An object replaced with an equal one, deleted and written again
+        between reads is indexed once, under its last value.
+        """
+        store = RepStore()
+        store.add_field_index('title')
+        store['1'] = Rep(title='b')
+        self.assertEquals(store.query(sort='title', limit=10)[1], ['1'])
+        store['1'] = Rep(title='b')
+        del store['1']
+        store['1'] = Rep(title='a')
+        self.assertEquals(store.query(sort='title', limit=10)[1], ['1'])
+        self.assertEquals(store.query({'title': 'b'})[1], [])
+
+    def test_cheapest(self):
+        """ The index that reads the fewest objects is chosen.
+        """
+        self.store.add_field_index('title')
+        self.check('sorted title equal', {'title': 'title 007'},
+                   {'title': ('title 000', 'title 040')})
+        self.check('sorted title range', {'title': 'title 007'},
+                   {'title': ('title 007', 'title 007')}, sort='title')
+
+
+class PinQueryTest(TestCase):
+    """Any store can have field indexes."""
+    def test_pins(self):
+        """ Pins are queried by parent and child.
+        """
+        store = PinStore()
+        keys = [store.create(Pin(parent, child)) for parent, child in
+                [(1, 2), (1, 3), (2, 3), (3, 1)]]
+        store.add_field_index('child')
+        self.assertEquals(store.query({'parent': 1}, {'child': (3, None)}),
+                          ('sorted child range', [keys[1]]))
+        store[keys[1]].child = 4
+        self.assertEquals(store.query(sort='child', descending=True, limit=2),
+                          ('sorted child ordered', [keys[1], keys[2]]))
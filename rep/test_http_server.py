@@ -0,0 +1,125 @@
+"""unittest and doc for WorkerServer, which serves a WSGI app with keep-alive"""
+
+import socket
+import threading
+import time
+from unittest import TestCase
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from . import http_server
+
+class WorkerServerTest(TestCase):
+    """Connections are kept between requests and drained on shutdown."""
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+        self.slow = 0
+        self.listener = http_server.listen('127.0.0.1', 0)
+        self.port = self.listener.getsockname()[1]
+        self.server = http_server.WorkerServer(self.app, self.listener.fileno(), threads=4,
+                                               keep_alive=2)
+        self.serving = threading.Thread(target=self.server.serve_forever)
+        self.serving.daemon = True
+        self.serving.start()
+
+    def tearDown(self):
+        self.release.set()
+        if not self.server.draining:
+            self.server.stop()
+        self.serving.join()
+        self.listener.close()
+
+    def app(self, environ, start_response):
+        if environ['PATH_INFO'] == '/slow':
+            with self.lock:
+                self.slow += 1
+                self.started.set()
+            self.release.wait()
+        body = b'unread'
+        if environ['PATH_INFO'] != '/unread':
+            body = b'%d' % len(environ['wsgi.input'].read())
+        start_response('200 OK', [('Content-Length', str(len(body)))])
+        return [body]
+
+    def connect(self):
+        return httplib.HTTPConnection('127.0.0.1', self.port, timeout=10)
+
+    def test_keep_alive(self):
+        """ Requests on one connection share it, unless a body is left
+        unread.
+        """
+        connection = self.connect()
+        connection.request('POST', '/', b'body')
+        self.assertEquals(connection.getresponse().read(), b'4')
+        sock = connection.sock
+        connection.request('GET', '/')
+        response = connection.getresponse()
+        self.assertEquals(response.read(), b'0')
+        self.assertTrue(connection.sock is sock)
+        self.assertEquals(response.getheader('Connection'), None)
+        connection.request('POST', '/unread', b'body')
+        response = connection.getresponse()
+        self.assertEquals(response.read(), b'unread')
+        self.assertEquals(response.getheader('Connection'), 'close')
+        connection.request('GET', '/')
+        self.assertEquals(connection.getresponse().read(), b'0')
+        self.assertFalse(connection.sock is sock)
+        connection.close()
+
+    def test_drain(self):
+        """ Stopping closes idle connections and lets the requests in
+        progress finish, telling their clients the connection will close.
+        """
+        idle = self.connect()
+        idle.request('GET', '/')
+        idle.getresponse().read()
+        busy = self.connect()
+        busy.request('GET', '/slow')
+        self.assertTrue(self.started.wait(10))
+        self.server.stop()
+        self.serving.join()
+        self.assertEquals(idle.sock.recv(1), b'')
+        self.assertFalse(self.server.drain(0.1))
+        threading.Timer(0.2, self.release.set).start()
+        start = time.time()
+        self.assertTrue(self.server.drain(10))
+        self.assertLess(time.time() - start, 5)
+        response = busy.getresponse()
+        self.assertEquals(response.read(), b'0')
+        self.assertEquals(response.getheader('Connection'), 'close')
+        idle.close()
+        busy.close()
+
+    def test_stop_when_full(self):
+        """ Stopping does not wait for a free thread when every one is busy,
+        and calls the on_stop callbacks so that long requests can end.
+        """
+        stopped = threading.Event()
+        self.server.on_stop(stopped.set)
+        busy = [self.connect() for _ in range(4)]
+        for connection in busy:
+            connection.request('GET', '/slow')
+        for _ in range(1000):
+            if self.slow == 4:
+                break
+            time.sleep(0.01)
+        self.assertEquals(self.slow, 4)
+        waiting = self.connect()
+        waiting.request('GET', '/')
+        time.sleep(0.1)
+        self.server.stop()
+        self.serving.join(10)
+        self.assertFalse(self.serving.is_alive())
+        self.assertTrue(stopped.is_set())
+        self.release.set()
+        self.assertTrue(self.server.drain(10))
+        for connection in busy:
+            self.assertEquals(connection.getresponse().read(), b'0')
+            connection.close()
+        self.assertRaises((httplib.HTTPException, socket.error), waiting.getresponse)
+        waiting.close()
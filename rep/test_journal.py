@@ -0,0 +1,76 @@
+"""unittest and doc for ChangeJournal, the record of changes to stores"""
+
+import threading
+from unittest import TestCase
+
+from . import ChangeJournal, Pin, PinStore, Rep, RepStore, ResyncRequired
+
+class ChangeJournalTest(TestCase):
+    """A ChangeJournal numbers the changes to the stores it watches."""
+    def setUp(self):
+        self.journal = ChangeJournal(size=10)
+        self.rep_store = RepStore()
+        self.pin_store = PinStore()
+        self.journal.watch(self.rep_store, 'reps')
+        self.journal.watch(self.pin_store, 'pins')
+
+    def test_changes(self):
+        """ Puts and deletes to every watched store are numbered in order.
+        """
+        key = self.rep_store.create(Rep(title='journaled'))
+        pin_key = self.pin_store.create(Pin(1, 2))
+        del self.rep_store[key]
+        self.assertEquals(self.journal.since(0), [
+            {'seq': 1, 'store': 'reps', 'op': 'put', 'key': key,
+             'value': {'title': 'journaled'}},
+            {'seq': 2, 'store': 'pins', 'op': 'put', 'key': pin_key,
+             'value': {'parent': 1, 'child': 2}},
+            {'seq': 3, 'store': 'reps', 'op': 'delete', 'key': key, 'value': None}])
+        self.assertEquals([change['seq'] for change in self.journal.since(1, limit=1)], [2])
+        self.assertEquals(self.journal.since(3), [])
+
+    def test_replace(self):
+        """ Replacing an object, or changing it in place, is a single put.
+        """
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store[key].child = 3
+        changes = self.journal.since(1)
+        self.assertEquals(len(changes), 1)
+        self.assertEquals(changes[0]['value'], {'parent': 1, 'child': 3})
+        self.assertEquals(changes[0]['seq'], self.journal.seq)
+
+    def test_dropped(self):
+        """ Only the last size changes are kept; asking for older ones
+        raises ResyncRequired with the number to follow on from.
+        """
+        for number in range(12):
+            self.rep_store.create(Rep(title='rep %d' % number))
+        self.assertEquals(len(self.journal.since(2)), 10)
+        with self.assertRaises(ResyncRequired) as context:
+            self.journal.since(1)
+        self.assertEquals(context.exception.seq, 12)
+
+    def test_ahead(self):
+        """ A sequence number ahead of the journal, as after a restart, also
+        needs a resync.
+        """
+        self.assertRaises(ResyncRequired, self.journal.since, 5)
+
+    def test_wait(self):
+        """ wait returns as soon as there is a change after the number given.
+        """
+        self.assertFalse(self.journal.wait(0, timeout=0.01))
+        writer = threading.Timer(0.01, self.rep_store.create, [Rep(title='late')])
+        writer.start()
+        self.assertTrue(self.journal.wait(0, timeout=5))
+        writer.join()
+
+    def test_interrupt(self):
+        """ interrupt wakes the readers waiting for a change, and later
+        waits return at once.
+        """
+        threading.Timer(0.01, self.journal.interrupt).start()
+        self.assertFalse(self.journal.wait(0, timeout=5))
+        self.assertFalse(self.journal.wait(0, timeout=5))
+        self.rep_store.create(Rep(title='still recorded'))
+        self.assertTrue(self.journal.wait(0, timeout=5))
@@ -0,0 +1,74 @@
+"""unittest and doc for JsonCache, the cache of objects encoded as JSON"""
+
+import json
+from unittest import TestCase
+
+from . import Pin, PinStore, Rep, RepStore
+
+class JsonCacheTest(TestCase):
+    """Store.json_fragment serves objects from a JsonCache once enabled."""
+    def setUp(self):
+        self.rep_store = RepStore()
+        self.cache = self.rep_store.enable_json_cache()
+        self.key = self.rep_store.create(Rep(title='cached'))
+
+    def test_hit(self):
+        """ The second request for an object is served from the cache.
+        """
+        first = self.rep_store.json_fragment(self.key)
+        second = self.rep_store.json_fragment(self.key)
+        self.assertEquals(json.loads(second), {'title': 'cached'})
+        self.assertEquals(first, second)
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_invalidated(self):
+        """ Replacing or deleting an object drops its cached JSON.
+        """
+        self.rep_store.json_fragment(self.key)
+        self.rep_store[self.key] = Rep(title='changed')
+        self.assertEquals(json.loads(self.rep_store.json_fragment(self.key)),
+                          {'title': 'changed'})
+        del self.rep_store[self.key]
+        self.assertRaises(KeyError, self.rep_store.json_fragment, self.key)
+
+    def test_fragments(self):
+        """ json_fragments serves cached objects and reads the rest with
+        one read_many, caching them.
+        """
+        self.rep_store.json_fragment(self.key)
+        other = self.rep_store.create(Rep(title='batched'))
+        texts = self.rep_store.json_fragments([self.key, other, 'missing'])
+        self.assertEquals([json.loads(text) for text in texts[:2]],
+                          [{'title': 'cached'}, {'title': 'batched'}])
+        self.assertEquals(texts[2], None)
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 3))
+        self.rep_store.json_fragments([other])
+        self.assertEquals(self.cache.hits, 2)
+
+    def test_changed_in_place(self):
+        """ A Pin changed in place is encoded again.
+        """
+        pin_store = PinStore()
+        pin_store.enable_json_cache()
+        key = pin_store.create(Pin(1, 2))
+        pin_store.json_fragment(key)
+        pin_store[key].child = 3
+        self.assertEquals(json.loads(pin_store.json_fragment(key)),
+                          {'parent': 1, 'child': 3})
+
+    def test_eviction(self):
+        """ Least recently used fragments are evicted to stay under max_bytes.
+        """
+        size = len(self.rep_store.json_fragment(self.key))
+        self.cache.max_bytes = size * 2
+        second = self.rep_store.create(Rep(title='cacheX'))
+        third = self.rep_store.create(Rep(title='cacheY'))
+        self.rep_store.json_fragment(second)
+        self.rep_store.json_fragment(self.key)
+        self.rep_store.json_fragment(third)
+        stats = self.cache.stats()
+        self.assertEquals(stats['entries'], 2)
+        self.assertEquals(stats['evictions'], 1)
+        self.assertEquals(stats['bytes'], size * 2)
+        self.rep_store.json_fragment(self.key)
+        self.assertEquals(self.cache.stats()['evictions'], 1)
@@ -0,0 +1,65 @@
+"""unittest and doc for KeyAllocator, the key generator shared by the stores"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from . import KeyAllocator
+
+class KeyAllocatorTest(TestCase):
+    """A KeyAllocator hands out increasing keys from a high-water mark that
+    never moves backwards, so keys are never reused.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'keys')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_first_key(self):
+        """The first key handed out is '1'."""
+        self.assertEquals(KeyAllocator().next_key(), '1')
+
+    def test_keys_increase(self):
+        """Each new key is one more than the last."""
+        keys = KeyAllocator()
+        self.assertEquals([keys.next_key() for _ in range(3)], ['1', '2', '3'])
+
+    def test_reserve(self):
+        """A block of keys can be reserved at once for batch inserts."""
+        keys = KeyAllocator()
+        self.assertEquals(keys.reserve(3), ['1', '2', '3'])
+        self.assertEquals(keys.next_key(), '4')
+
+    def test_observe(self):
+        """Keys stored without being allocated move the mark past them."""
+        keys = KeyAllocator()
+        keys.observe('41')
+        keys.observe('7')
+        keys.observe('not a number')
+        self.assertEquals(keys.next_key(), '42')
+
+    def test_threads(self):
+        """Concurrent callers never receive the same key."""
+        keys = KeyAllocator()
+        allocated = []
+
+        def allocate():
+            allocated.extend(keys.next_key() for _ in range(1000))
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(set(allocated)), 8000)
+
+    def test_persisted(self):
+        """A persisted allocator never reuses keys after a restart."""
+        keys = KeyAllocator(self.path, block_size=10)
+        handed_out = keys.reserve(25)
+        restarted = KeyAllocator(self.path, block_size=10)
+        self.assertNotIn(restarted.next_key(), handed_out)
@@ -0,0 +1,54 @@
+"""unittest and doc for KeyOrder, the ordered key index used for pagination"""
+
+from unittest import TestCase
+
+from .key_order import KeyOrder
+
+class KeyOrderTest(TestCase):
+    """KeyOrder yields store keys in ascending order."""
+    def setUp(self):
+        self.order = KeyOrder()
+
+    def test_numeric_order(self):
+        """Numeric keys are ordered by value, not as strings."""
+        for key in ('2', '10', '1'):
+            self.order.add(key)
+        self.assertEquals(list(self.order.keys()), ['1', '2', '10'])
+
+    def test_other_keys_last(self):
+        """Keys that are not numbers come after the numeric ones."""
+        for key in ('b', '3', 'a'):
+            self.order.add(key)
+        self.assertEquals(list(self.order.keys()), ['3', 'a', 'b'])
+
+    def test_after(self):
+        """Iteration can start after any key, even one that was removed."""
+        for key in range(1, 6):
+            self.order.add(str(key))
+        self.order.remove('3')
+        self.assertEquals(list(self.order.keys(after='2')), ['4', '5'])
+        self.assertEquals(list(self.order.keys(after='3')), ['4', '5'])
+
+    def test_readded(self):
+        """A key removed and added again appears once."""
+        for key in ('1', '2', '3'):
+            self.order.add(key)
+        for _ in range(3):
+            self.order.remove('2')
+            self.order.add('2')
+        self.assertEquals(list(self.order.keys()), ['1', '2', '3'])
+
+    def test_replaced_keep_place(self):
+        """Keys added back before or after removed keys are swept out stay
+        in order, however they first arrived."""
+        for key in ('1', '3', '2', '4'):
+            self.order.add(key)
+        for key in ('3', '2', '1'):
+            self.order.remove(key)
+            self.order.add(key)
+        self.assertEquals(list(self.order.keys()), ['1', '2', '3', '4'])
+        for key in ('1', '2', '3'):
+            self.order.remove(key)
+        self.assertEquals(list(self.order.keys()), ['4'])
+        self.order.add('2')
+        self.assertEquals(list(self.order.keys()), ['2', '4'])
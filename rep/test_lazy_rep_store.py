@@ -0,0 +1,48 @@
+"""unittest and doc for LazyRepStore, the RepStore that keeps only titles"""
+
+import json
+
+from . import LazyRepStore, PinStore, Rep, RepStore, test_rep_store
+from .backends import open_store
+from .compact_pin_store import CompactPinStore
+
+class LazyRepStoreTest(test_rep_store.RepStoreTest):
+    """LazyRepStore passes the same tests as RepStore."""
+    def setUp(self):
+        self.rep_store = LazyRepStore()
+
+    def test_records_only(self):
+        """ as_dict, record and the JSON of Reps are made from their titles
+        without building Rep objects.
+        """
+        key = self.rep_store.create(Rep(title='lazy'))
+        from_trusted = Rep.__dict__['from_trusted']
+        def refuse(cls, title):
+            raise AssertionError('a Rep was built')
+        Rep.from_trusted = classmethod(refuse)
+        try:
+            self.assertEquals(self.rep_store.as_dict(), {key: {'title': 'lazy'}})
+            self.assertEquals(self.rep_store.record(key), {'title': 'lazy'})
+            self.assertEquals(self.rep_store.read_records([key, 'missing']),
+                              [{'title': 'lazy'}, None])
+            self.assertEquals(json.loads(self.rep_store.json_fragment(key)), {'title': 'lazy'})
+            self.rep_store.enable_json_cache()
+            self.assertEquals(self.rep_store.json_fragments([key]), ['{"title": "lazy"}'])
+        finally:
+            Rep.from_trusted = from_trusted
+
+    def test_read_builds(self):
+        """ Reading a Rep builds a new one each time, so changes made to it
+        in place are not stored.
+        """
+        key = self.rep_store.create(Rep(title='built'))
+        rep = self.rep_store[key]
+        rep.title = 'changed'
+        self.assertEquals(self.rep_store[key].title, 'built')
+
+    def test_compact_backend(self):
+        """ The compact backend keeps Reps in a LazyRepStore and Pins in a
+        CompactPinStore.
+        """
+        self.assertIsInstance(open_store(RepStore, 'reps', 'compact'), LazyRepStore)
+        self.assertIsInstance(open_store(PinStore, 'pins', 'compact'), CompactPinStore)
@@ -0,0 +1,177 @@
+"""unittest and doc for LogBackend, the append-only persistent storage engine"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from . import (
+    LogBackend,
+    Pin,
+    PinStore,
+    Rep,
+    RepStore,
+)
+from . import test_pin_store, test_rep_store
+
+class LogBackendTest(TestCase):
+    """A LogBackend keeps a store's objects in memory and appends every change
+    to a log on disk, so the data survives a restart.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        shutil.rmtree(self.path)
+
+    def open(self, item_class=Rep, **kwargs):
+        backend = LogBackend(self.path, item_class, **kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def reopen(self, backend, item_class=Rep, **kwargs):
+        backend.close()
+        return self.open(item_class, **kwargs)
+
+    def test_persisted(self):
+        """Reps written to the log are there after reopening."""
+        backend = self.open()
+        RepStore(backend=backend).update({'1': Rep(title="one"), '2': Rep(title="two")})
+        reopened = RepStore(backend=self.reopen(backend))
+        self.assertEquals(reopened.as_dict(), {'1': {'title': "one"},
+                                               '2': {'title': "two"}})
+
+    def test_delete_persisted(self):
+        """Deletes are logged too."""
+        backend = self.open()
+        store = RepStore(backend=backend)
+        key = store.create(Rep(title="deleted"))
+        store.delete(key)
+        self.assertEquals(len(self.reopen(backend)), 0)
+
+    def test_pin_changed_in_place(self):
+        """Pins changed in place are written back to the log."""
+        backend = self.open(Pin)
+        store = PinStore(backend=backend)
+        key = store.create(Pin(1, 2))
+        store[key].child = 3
+        reopened = PinStore(backend=self.reopen(backend, Pin))
+        self.assertEquals(reopened[key].child, 3)
+        self.assertEquals(reopened.get_children(1), [3])
+
+    def test_torn_write(self):
+        """A half written entry at the end of the log is dropped."""
+        backend = self.open()
+        backend['1'] = Rep(title="kept")
+        backend.close()
+        with open(os.path.join(self.path, LogBackend.LOG), 'ab') as log:
+            log.write(b'["2",{"title":"tor')
+        reopened = self.open()
+        self.assertEquals(list(reopened), ['1'])
+        reopened['3'] = Rep(title="after")
+        self.assertEquals(sorted(self.reopen(reopened)), ['1', '3'])
+
+    def test_compact(self):
+        """Compaction replaces the log with a snapshot of the live objects."""
+        backend = self.open()
+        for title in range(10):
+            backend['1'] = Rep(title=title)
+        backend.compact()
+        self.assertFalse(os.path.exists(os.path.join(self.path, LogBackend.OLD_LOG)))
+        self.assertEquals(os.path.getsize(os.path.join(self.path, LogBackend.LOG)), 0)
+        self.assertEquals(self.reopen(backend)['1'].title, '9')
+
+    def test_automatic_compaction(self):
+        """The log is compacted in the background once it grows large."""
+        backend = self.open(compact_min=10, compact_ratio=2)
+        for title in range(25):
+            backend['1'] = Rep(title=title)
+        backend.close()
+        with open(os.path.join(self.path, LogBackend.LOG), 'rb') as log:
+            self.assertLess(len(log.readlines()), 10)
+        self.assertEquals(self.open()['1'].title, '24')
+
+    def test_interrupted_compaction(self):
+        """A log left behind by an interrupted compaction is replayed."""
+        backend = self.open()
+        backend['1'] = Rep(title="old")
+        backend.close()
+        os.rename(os.path.join(self.path, LogBackend.LOG),
+                  os.path.join(self.path, LogBackend.OLD_LOG))
+        reopened = self.open()
+        self.assertEquals(reopened['1'].title, "old")
+        self.assertFalse(os.path.exists(os.path.join(self.path, LogBackend.OLD_LOG)))
+
+    def test_sync_policies(self):
+        """Every sync policy writes the same data."""
+        for sync in LogBackend.SYNC_POLICIES:
+            backend = self.open(sync=sync, group_size=2)
+            backend[sync] = Rep(title=sync)
+            self.assertEquals(self.reopen(backend)[sync].title, sync)
+
+    def test_compaction_while_flushing(self):
+        """Writers that start compactions, and compact() itself, run
+        alongside the interval flusher without deadlocking it."""
+        backend = self.open(sync='interval', group_interval=0.0001, group_size=5,
+                            compact_min=20, compact_ratio=2)
+        def write(name):
+            for number in range(300):
+                backend[name] = Rep(title=number)
+                if number % 50 == 0:
+                    backend.compact(wait=False)
+        writers = [threading.Thread(target=write, args=(str(name),)) for name in range(4)]
+        for writer in writers:
+            writer.daemon = True
+            writer.start()
+        for writer in writers:
+            writer.join(30)
+            self.assertFalse(writer.is_alive())
+        reopened = self.reopen(backend)
+        self.assertEquals(sorted(reopened), ['0', '1', '2', '3'])
+        self.assertEquals(set(rep.title for rep in reopened.values()), set(['299']))
+
+    def test_group_commit(self):
+        """Writes made by a store inside group_commit are synced when the
+        outermost block ends."""
+        backend = self.open()
+        store = RepStore(backend=backend)
+        log = os.path.join(self.path, LogBackend.LOG)
+        with backend.group_commit():
+            store['1'] = Rep(title="one")
+            with backend.group_commit():
+                store.update({'2': Rep(title="two")})
+            self.assertEquals(os.path.getsize(log), 0)
+        self.assertEquals(len(open(log, 'rb').readlines()), 2)
+        store['3'] = Rep(title="three")
+        self.assertEquals(len(open(log, 'rb').readlines()), 3)
+
+    def test_invalid_sync_policy(self):
+        """Unknown sync policies are rejected."""
+        with self.assertRaises(ValueError):
+            LogBackend(self.path, Rep, sync='sometimes')
+
+
+class LogRepStoreTest(test_rep_store.RepStoreTest):
+    """RepStore behaves the same when backed by a LogBackend."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rep_store = RepStore(backend=LogBackend(self.path, Rep, sync='never'))
+
+    def tearDown(self):
+        self.rep_store.close()
+        shutil.rmtree(self.path)
+
+
+class LogPinStoreTest(test_pin_store.PinStoreTest):
+    """PinStore behaves the same when backed by a LogBackend."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.pin_store = PinStore(backend=LogBackend(self.path, Pin, sync='never'))
+
+    def tearDown(self):
+        self.pin_store.close()
+        shutil.rmtree(self.path)
@@ -0,0 +1,148 @@
+"""unittest and doc for the metrics Registry and instrumented stores"""
+
+import time
+from unittest import TestCase
+
+from . import Pin, PinStore, Rep, RepStore
+from .metrics import Histogram, Registry, instrument_store
+
+class HistogramTest(TestCase):
+    """Histograms count values in buckets and estimate quantiles from them."""
+    def test_empty(self):
+        """ There are no quantiles before anything is observed.
+        """
+        self.assertEquals(Histogram().quantile(0.5), None)
+
+    def test_quantiles(self):
+        """ Quantiles are interpolated within the bucket they fall in.
+        """
+        histogram = Histogram(buckets=(1, 2, 3, 4))
+        for value in (0.5, 1.5, 2.5, 3.5):
+            histogram.observe(value)
+        self.assertEquals(histogram.quantile(0.5), 2)
+        self.assertEquals(histogram.quantile(1), 4)
+        self.assertEquals(histogram.count, 4)
+        self.assertEquals(histogram.sum, 8)
+
+    def test_overflow(self):
+        """ Values above the largest bucket are estimated as that bucket.
+        """
+        histogram = Histogram(buckets=(1, 2))
+        histogram.observe(100)
+        self.assertEquals(histogram.quantile(0.99), 2)
+
+    def test_time(self):
+        """ time() observes how long its block takes.
+        """
+        histogram = Histogram()
+        with histogram.time():
+            pass
+        self.assertEquals(histogram.count, 1)
+
+
+class RegistryTest(TestCase):
+    """A Registry renders its metrics in the Prometheus text format."""
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_series(self):
+        """ Asking for a metric with the same name and labels returns the
+        same series.
+        """
+        counter = self.registry.counter('hits_total', 'Hits.', route='/a')
+        self.assertIs(self.registry.counter('hits_total', 'Hits.', route='/a'), counter)
+        self.assertIsNot(self.registry.counter('hits_total', 'Hits.', route='/b'), counter)
+
+    def test_kind_clash(self):
+        """ A name cannot be used for two kinds of metric.
+        """
+        self.registry.counter('hits', 'Hits.')
+        self.assertRaises(ValueError, self.registry.histogram, 'hits', 'Hits.')
+
+    def test_render(self):
+        """ Counters, gauges and histograms are rendered with their labels,
+        histograms with cumulative buckets and estimated quantiles.
+        """
+        self.registry.counter('hits_total', 'Hits.', route='/a').inc(2)
+        self.registry.gauge('size', 'Size.', lambda: 7)
+        self.registry.histogram('latency_seconds', 'Latency.', route='/a').observe(0.002)
+        lines = self.registry.render().splitlines()
+        self.assertIn('# TYPE hits_total counter', lines)
+        self.assertIn('hits_total{route="/a"} 2', lines)
+        self.assertIn('size 7', lines)
+        self.assertIn('# TYPE latency_seconds histogram', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.001"} 0', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.0025"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 1', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 1', lines)
+        self.assertTrue(any(line.startswith('latency_seconds_quantile{route="/a",quantile="0.99"}')
+                            for line in lines))
+
+    def test_escape(self):
+        """ Quotes and backslashes in label values are escaped.
+        """
+        self.registry.counter('hits_total', 'Hits.', route='a"b\\').inc()
+        self.assertIn(r'hits_total{route="a\"b\\"} 1', self.registry.render())
+
+
+class InstrumentStoreTest(TestCase):
+    """instrument_store times store operations and reports the store size."""
+    def setUp(self):
+        self.registry = Registry()
+        self.rep_store = instrument_store(RepStore(), self.registry, 'reps')
+
+    def operation(self, name):
+        return self.registry.histogram('rep_store_operation_seconds', '',
+                                       store='reps', operation=name)
+
+    def test_counts(self):
+        """ Each call of an instrumented method is timed.
+        """
+        key = self.rep_store.create(Rep(title='timed'))
+        self.rep_store.read(key)
+        self.rep_store.read(key)
+        self.assertEquals(self.operation('create').count, 1)
+        self.assertEquals(self.operation('read').count, 2)
+
+    def test_errors(self):
+        """ Calls that raise are timed and counted as errors.
+        """
+        self.assertRaises(KeyError, self.rep_store.read, 'missing')
+        self.assertEquals(self.operation('read').count, 1)
+        self.assertEquals(self.registry.counter('rep_store_operation_errors_total', '',
+                                                store='reps', operation='read').value, 1)
+
+    def test_walk(self):
+        """ Walks are timed as they are consumed, without the time the
+        caller spends between steps.
+        """
+        class SlowPinStore(PinStore):
+            def descendants(self, *args, **kwargs):
+                for step in PinStore.descendants(self, *args, **kwargs):
+                    time.sleep(0.01)
+                    yield step
+        pin_store = instrument_store(SlowPinStore(), self.registry, 'pins')
+        pin_store.update({'1': Pin(1, 2), '2': Pin(2, 3)})
+        for _ in pin_store.descendants(1):
+            time.sleep(0.1)
+        walked = self.registry.histogram('rep_store_operation_seconds', '',
+                                         store='pins', operation='descendants')
+        self.assertEquals(walked.count, 1)
+        self.assertTrue(0.02 <= walked.sum < 0.1)
+
+    def test_size(self):
+        """ The number of objects in the store is read when rendering.
+        """
+        self.rep_store.create(Rep(title='counted'))
+        self.assertIn('rep_store_objects{store="reps"} 1', self.registry.render())
+
+    def test_json_cache(self):
+        """ The JSON cache counts of the store are reported, as 0 while it
+        has no cache.
+        """
+        self.assertIn('rep_store_json_cache_hits{store="reps"} 0', self.registry.render())
+        self.rep_store.enable_json_cache()
+        key = self.rep_store.create(Rep(title='cached'))
+        self.rep_store.json_fragment(key)
+        self.rep_store.json_fragment(key)
+        self.assertIn('rep_store_json_cache_hits{store="reps"} 1', self.registry.render())
@@ -18,3 +18,19 @@ class PinTest(TestCase):
         """A Pin stores two Rep keys.
         """
         self.assertEquals(self.pin.child, 'key2')
+
+    def test_watch(self):
+        """Watchers are told about in place changes with the old value."""
+        changes = []
+        self.pin.watch(lambda pin, field, old: changes.append((field, old)))
+        self.pin.parent = 'key3'
+        self.assertEquals(changes, [('parent', 'key1')])
+
+    def test_failed_watch(self):
+        """A change rejected by a watcher is undone."""
+        def reject(pin, field, old):
+            raise ValueError("rejected")
+        self.pin.watch(reject)
+        with self.assertRaises(ValueError):
+            self.pin.child = 'key3'
+        self.assertEquals(self.pin.child, 'key2')
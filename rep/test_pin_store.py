@@ -94,3 +94,89 @@ class PinStoreTest(TestCase):
         self.assertEquals(self.pin_store.get_children(1),
                           [self.pin_store[key].child])
 
+    def test_keys_not_reused(self):
+        """Deleting the newest Pin does not free its key for reuse."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store.delete(key)
+        self.assertNotEquals(self.pin_store.create(Pin(1, 2)), key)
+
+    def test_get_parents(self):
+        """The get_parents method returns the parent of every pin whose child
+        matches the key argument."""
+        self.pin_store.create(Pin(1, 3))
+        self.pin_store.create(Pin(2, 3))
+        self.assertEquals(sorted(self.pin_store.get_parents('3')), [1, 2])
+
+    def test_children_after_delete(self):
+        """Deleted pins no longer show up as children or parents."""
+        key = self.pin_store.create(Pin(1, 2))
+        del self.pin_store[key]
+        self.assertEquals(self.pin_store.get_children(1), [])
+        self.assertEquals(self.pin_store.get_parents(2), [])
+
+    def test_children_after_update(self):
+        """Replacing a pin with update reindexes it."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store.update({key: Pin(3, 4)})
+        self.assertEquals(self.pin_store.get_children(1), [])
+        self.assertEquals(self.pin_store.get_children(3), [4])
+        self.assertEquals(self.pin_store.get_parents(4), [3])
+
+    def test_children_after_in_place_change(self):
+        """Changing the fields of a stored pin in place reindexes it."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store[key].parent = 5
+        self.pin_store[key].child = 6
+        self.assertEquals(self.pin_store.get_children(1), [])
+        self.assertEquals(self.pin_store.get_children(5), [6])
+        self.assertEquals(self.pin_store.get_parents(6), [5])
+
+    def test_removed_pin_not_watched(self):
+        """A pin removed from the store can change without affecting it."""
+        pin = Pin(1, 2)
+        key = self.pin_store.create(pin)
+        del self.pin_store[key]
+        pin.parent = 7
+        self.assertEquals(self.pin_store.get_children(7), [])
+
+    def create_graph(self):
+        """Pin 1 -> 2 -> 3 -> 1, 2 -> 4 and 4 -> 3, which has a cycle."""
+        for parent, child in ((1, 2), (2, 3), (3, 1), (2, 4), (4, 3)):
+            self.pin_store.create(Pin(parent, child))
+
+    def test_descendants(self):
+        """descendants walks every Rep below a key once, even around cycles."""
+        self.create_graph()
+        steps = list(self.pin_store.descendants(1))
+        self.assertEquals(sorted(key for _, _, key in steps), ['2', '3', '4'])
+        self.assertEquals([(depth, via) for depth, via, key in steps if key == '4'],
+                          [(2, '2')])
+
+    def test_descendants_depth(self):
+        """The walk can be limited to a number of steps."""
+        self.create_graph()
+        self.assertEquals(list(self.pin_store.descendants(1, depth=1)), [(1, '1', '2')])
+        self.assertEquals(sorted(key for _, _, key in self.pin_store.descendants(
+            1, depth=2, order='dfs')), ['2', '3', '4'])
+
+    def test_ancestors(self):
+        """ancestors walks every Rep above a key."""
+        self.create_graph()
+        self.assertEquals(sorted(key for _, _, key in self.pin_store.ancestors(4)),
+                          ['1', '2', '3'])
+
+    def test_subtree(self):
+        """subtree nests the walk into dicts."""
+        for parent, child in ((1, 2), (1, 3), (2, 4)):
+            self.pin_store.create(Pin(parent, child))
+        self.assertEquals(self.pin_store.subtree(1),
+                          {'2': {'4': {}}, '3': {}})
+
+    def test_walk_cache_invalidated(self):
+        """Cached walks are dropped when a pin changes."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.assertEquals(self.pin_store.subtree(1), {'2': {}})
+        self.pin_store[key].child = 3
+        self.assertEquals(self.pin_store.subtree(1), {'3': {}})
+        self.pin_store.create(Pin(3, 4))
+        self.assertEquals(self.pin_store.subtree(1), {'3': {'4': {}}})
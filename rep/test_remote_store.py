@@ -0,0 +1,141 @@
+"""unittest and doc for StoreServer and the RemoteStore clients"""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from . import (
+    Pin,
+    PinStore,
+    RemotePinStore,
+    RemoteRepStore,
+    Rep,
+    RepStore,
+    StoreServer,
+    test_pin_store,
+    test_rep_store,
+)
+from .remote_store import StoreServerError
+from .store_server import GET, REQUEST
+
+class ServedStores(object):
+    """Starts a StoreServer with fresh stores for each test."""
+    def start_server(self):
+        self.path = tempfile.mkdtemp()
+        self.socket = os.path.join(self.path, 'rep.sock')
+        self.served = {'reps': RepStore(), 'pins': PinStore()}
+        self.server = StoreServer(self.socket, self.served).start()
+
+    def stop_server(self, *stores):
+        for store in stores:
+            store.close()
+        self.server.close()
+        shutil.rmtree(self.path)
+
+
+class RemoteRepStoreTest(ServedStores, test_rep_store.RepStoreTest):
+    """RemoteRepStore passes the same tests as RepStore."""
+    def setUp(self):
+        self.start_server()
+        self.rep_store = RemoteRepStore(self.socket, 'reps')
+
+    def tearDown(self):
+        self.stop_server(self.rep_store)
+
+    def test_shared(self):
+        """Clients of the same server see the same Reps."""
+        other = RemoteRepStore(self.socket, 'reps')
+        key = self.rep_store.create(Rep(title="shared"))
+        self.assertEquals(other[key].title, "shared")
+        self.assertEquals(self.served['reps'][key].title, "shared")
+        other.close()
+
+    def test_get_many(self):
+        """get_many reads many Reps in one request, giving None for missing
+        keys."""
+        keys = [self.rep_store.create(Rep(title=title)) for title in ('one', 'two')]
+        reps = self.rep_store.get_many(keys + ['999'])
+        self.assertEquals([rep and rep.title for rep in reps], ['one', 'two', None])
+
+    def test_pipeline(self):
+        """A pipeline sends its requests together and collects the
+        answers."""
+        with self.rep_store.pipeline() as pipeline:
+            pipeline.set('1', Rep(title='one'))
+            pipeline.get('1')
+            pipeline.call('len')
+        self.assertEquals(pipeline.results[1].title, 'one')
+        self.assertEquals(pipeline.results[2], 1)
+
+    def test_pipeline_error(self):
+        """A failed request in a pipeline raises only after every answer is
+        read, so the connection stays usable."""
+        pipeline = self.rep_store.pipeline()
+        pipeline.get('404')
+        pipeline.set('1', Rep(title='after'))
+        with self.assertRaises(KeyError):
+            pipeline.execute()
+        self.assertEquals(self.rep_store['1'].title, 'after')
+
+    def test_errors(self):
+        """Invalid Reps are refused with the same error as locally."""
+        with self.assertRaises(ValueError):
+            self.rep_store.create(Rep(title="valid").from_dict({'title': ' '}))
+
+    def test_invalid_store(self):
+        """A request for a store the server does not have fails, and the
+        connection stays usable."""
+        connection = self.rep_store.connection()
+        connection.send([REQUEST.pack(GET, 7, 1) + b'1'])
+        with self.assertRaises(StoreServerError):
+            connection.receive()
+        self.rep_store['1'] = Rep(title='after')
+        self.assertEquals(self.rep_store['1'].title, 'after')
+
+    def test_large_request(self):
+        """Requests larger than one receive are put back together."""
+        keys = [str(key) for key in range(1, 20001)]
+        self.rep_store.update((key, Rep(title='rep %s' % key)) for key in keys)
+        reps = self.rep_store.get_many(keys)
+        self.assertEquals(len(reps), len(keys))
+        self.assertEquals(reps[-1].title, 'rep 20000')
+
+    def test_search(self):
+        """Searches are answered by the served store's index."""
+        self.rep_store.enable_search()
+        key = self.rep_store.create(Rep(title="remote search"))
+        self.assertEquals(self.rep_store.search('search'), (1, [(key, 0.5)]))
+
+    def test_query(self):
+        """Queries are answered by the served store's field indexes."""
+        self.rep_store.add_field_index('title')
+        keys = [self.rep_store.create(Rep(title=title)) for title in ('b', 'a', 'c')]
+        self.assertEquals(self.rep_store.query(ranges={'title': ('a', 'b')}, sort='title'),
+                          ('sorted title range', [keys[1], keys[0]]))
+        with self.assertRaises(ValueError):
+            self.rep_store.query(sort='size')
+
+
+class RemotePinStoreTest(ServedStores, test_pin_store.PinStoreTest):
+    """RemotePinStore passes the same tests as PinStore."""
+    def setUp(self):
+        self.start_server()
+        self.pin_store = RemotePinStore(self.socket, 'pins')
+
+    def tearDown(self):
+        self.stop_server(self.pin_store)
+
+    def test_in_place_change_shared(self):
+        """A pin changed in place is written back to the server."""
+        key = self.pin_store.create(Pin(1, 2))
+        self.pin_store[key].child = 3
+        self.assertEquals(self.served['pins'].get_children(1), [3])
+
+    def test_toposort(self):
+        """Cycles are refused by the served store's topological order."""
+        self.pin_store.enable_topological_order()
+        self.pin_store.create(Pin(2, 1))
+        with self.assertRaises(ValueError):
+            self.pin_store.create(Pin(1, 2))
+        self.assertEquals(self.pin_store.toposort(), ['2', '1'])
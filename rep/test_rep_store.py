@@ -54,6 +54,35 @@ class RepStoreTest(TestCase):
         key = self.rep_store.create(Rep(title="read test"))
         self.assertEquals(self.rep_store.read(key).title, "read test")
 
+    def test_read_many(self):
+        """read_many reads many Reps at once, in the order of the keys given,
+        with None for missing keys.
+        """
+        first = self.rep_store.create(Rep(title="first"))
+        second = self.rep_store.create(Rep(title="second"))
+        reps = self.rep_store.read_many([second, 999, first])
+        self.assertEquals(reps[0].title, "second")
+        self.assertEquals(reps[1], None)
+        self.assertEquals(reps[2].title, "first")
+
+    def test_records(self):
+        """record and read_records give the as_dict records of Reps.
+        """
+        key = self.rep_store.create(Rep(title="recorded"))
+        self.assertEquals(self.rep_store.record(key), {'title': 'recorded'})
+        self.assertEquals(self.rep_store.read_records([key, 999]),
+                          [{'title': 'recorded'}, None])
+        with self.assertRaises(KeyError):
+            self.rep_store.record(999)
+
+    def test_json_fragments(self):
+        """json_fragments gives the JSON of many Reps at once, with None for
+        missing keys.
+        """
+        key = self.rep_store.create(Rep(title="encoded"))
+        self.assertEquals(self.rep_store.json_fragments([key, 999]),
+                          [self.rep_store.json_fragment(key), None])
+
     def test_update(self):
         """The update method works the same as the dictionary method."""
         key = self.rep_store.create(Rep(title="initial update test"))
@@ -71,3 +100,24 @@ class RepStoreTest(TestCase):
         """The as_dict method returns the store as a dictionary."""
         key = self.rep_store.create(Rep(title="as_dict test"))
         self.assertEquals(self.rep_store.as_dict()[key]['title'], "as_dict test")
+
+    def test_keys_not_reused(self):
+        """Deleting the newest Rep does not free its key for reuse."""
+        key = self.rep_store.create(Rep(title="first"))
+        self.rep_store.delete(key)
+        self.assertNotEquals(self.rep_store.create(Rep(title="second")), key)
+
+    def test_ordered_keys(self):
+        """ordered_keys yields keys in ascending numeric order."""
+        keys = [self.rep_store.create(Rep(title=title)) for title in range(12)]
+        self.rep_store.delete(keys[5])
+        del keys[5]
+        self.assertEquals(list(self.rep_store.ordered_keys()), keys)
+        self.assertEquals(list(self.rep_store.ordered_keys(after=keys[8])), keys[9:])
+
+    def test_page(self):
+        """page returns a limited number of Reps after a cursor key."""
+        keys = [self.rep_store.create(Rep(title=title)) for title in range(5)]
+        page = self.rep_store.page(2, after=keys[1])
+        self.assertEquals([key for key, _ in page], keys[2:4])
+        self.assertEquals(page[0][1].title, '2')
@@ -0,0 +1,55 @@
+"""unittest and doc for TitleIndex, the search index over Rep titles"""
+
+from unittest import TestCase
+
+from . import Rep, RepStore
+
+class SearchTest(TestCase):
+    """RepStore.search finds Reps by the words in their titles."""
+    def setUp(self):
+        self.rep_store = RepStore()
+        self.rep_store.enable_search()
+        self.keys = {}
+        for title in ("Brian Redmond", "Titus Redmond", "Redmond",
+                      "Brian's notes", "Red fish"):
+            self.keys[title] = self.rep_store.create(Rep(title=title))
+
+    def search(self, *args, **kwargs):
+        return [key for key, _ in self.rep_store.search(*args, **kwargs)[1]]
+
+    def test_every_word(self):
+        """Matches contain every word of the query, in any case."""
+        self.assertEquals(self.search('redmond BRIAN'), [self.keys["Brian Redmond"]])
+
+    def test_ranking(self):
+        """Titles made up of fewer other words rank first."""
+        self.assertEquals(self.search('redmond'),
+                          [self.keys["Redmond"], self.keys["Brian Redmond"],
+                           self.keys["Titus Redmond"]])
+        self.assertEquals(self.rep_store.search('redmond')[1][0][1], 1.0)
+
+    def test_prefix(self):
+        """A prefix matches any word starting with it."""
+        self.assertEquals(sorted(self.search(prefix='Re')),
+                          sorted(self.keys[title] for title in self.keys
+                                 if title != "Brian's notes"))
+        self.assertEquals(self.search('brian', prefix='no'), [self.keys["Brian's notes"]])
+
+    def test_paging(self):
+        """Results are paged with limit and offset; total counts them all."""
+        total, results = self.rep_store.search('redmond', limit=1, offset=1)
+        self.assertEquals(total, 3)
+        self.assertEquals([key for key, _ in results], [self.keys["Brian Redmond"]])
+
+    def test_updates(self):
+        """The index follows updates and deletes."""
+        self.rep_store.update({self.keys["Red fish"]: Rep(title="Blue fish")})
+        self.rep_store.delete(self.keys["Redmond"])
+        self.assertEquals(self.search(prefix='red'),
+                          [self.keys["Brian Redmond"], self.keys["Titus Redmond"]])
+        self.assertEquals(self.search('blue'), [self.keys["Red fish"]])
+
+    def test_no_match(self):
+        """Unknown words and empty queries match nothing."""
+        self.assertEquals(self.search('redmond nobody'), [])
+        self.assertEquals(self.search(), [])
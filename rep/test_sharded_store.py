@@ -0,0 +1,107 @@
+"""unittest and doc for the sharded stores, which split their keys across shards"""
+
+import io
+import json
+from unittest import TestCase
+
+from . import (
+    PinStore,
+    Rep,
+    RepStore,
+    ShardedBackend,
+    ShardedPinStore,
+    ShardedRepStore,
+    test_pin_store,
+    test_rep_store,
+)
+from .backends import open_store
+
+class ShardedRepStoreTest(test_rep_store.RepStoreTest):
+    """ShardedRepStore passes the same tests as RepStore, scanning with a
+    pool of processes."""
+    def setUp(self):
+        self.rep_store = ShardedRepStore(shards=3, pool='process', workers=2)
+
+    def test_sharded_backend(self):
+        """ The sharded backend keeps Reps and Pins in sharded stores.
+        """
+        self.assertIsInstance(open_store(RepStore, 'reps', 'sharded'), ShardedRepStore)
+        self.assertIsInstance(open_store(PinStore, 'pins', 'sharded'), ShardedPinStore)
+
+
+class ShardedPinStoreTest(test_pin_store.PinStoreTest):
+    """ShardedPinStore passes the same tests as PinStore, scanning with a
+    pool of threads."""
+    def setUp(self):
+        self.pin_store = ShardedPinStore(shards=3, pool='thread', workers=2)
+
+    def tearDown(self):
+        self.pin_store.close()
+
+
+class ShardedBackendTest(TestCase):
+    """Scans give the same answers whichever pool runs them."""
+    def setUp(self):
+        self.stores = [ShardedRepStore(shards=4, pool=pool, workers=3)
+                       for pool in ('serial', 'thread', 'process')]
+        for store in self.stores:
+            store.update((key, Rep(title='rep %s of %s' % (int(key) % 7, key)))
+                         for key in store.reserve_keys(50))
+            store['named'] = Rep(title='not a number')
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+
+    def test_routing(self):
+        """ Each key is kept in one shard, integer keys by their value.
+        """
+        backend = ShardedBackend(shards=4)
+        for key in ['1', '6', 'named']:
+            backend[key] = Rep(title=key)
+        self.assertEquals(sorted(backend), ['1', '6', 'named'])
+        self.assertEquals(sum(len(shard) for shard in backend.shards), 3)
+        self.assertTrue('1' in backend.shards[1] and '6' in backend.shards[2])
+        self.assertTrue(backend.shard('named') is backend.shard('named'))
+        self.assertTrue('named' in backend.shard('named'))
+        self.assertEquals(backend.get_many(['6', 'missing']), [backend['6'], None])
+        self.assertRaises(KeyError, backend.__getitem__, None)
+        self.assertFalse(None in backend)
+        self.assertEquals(backend.pool, 'thread')
+        self.assertRaises(ValueError, ShardedBackend, pool='fibers')
+
+    def test_as_dict(self):
+        """ as_dict is built from a scan of every shard.
+        """
+        expected = dict((key, value.as_dict()) for key, value in self.stores[0].items())
+        for store in self.stores:
+            self.assertEquals(store.as_dict(), expected)
+
+    def test_export(self):
+        """ export writes a line of JSON for every object.
+        """
+        for store in self.stores:
+            output = io.BytesIO()
+            store.export(output)
+            lines = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEquals(dict(lines), store.as_dict())
+            self.assertEquals(len(lines), 51)
+
+    def test_index_fill(self):
+        """ Indexes filled from a scan match those kept up to date one
+        change at a time.
+        """
+        incremental = RepStore(backend=dict(self.stores[0].items()))
+        incremental.enable_search()
+        incremental.add_field_index('title')
+        incremental.add_field_index('title', 'hash')
+        for store in self.stores:
+            store.enable_search()
+            self.assertEquals(store.search('rep', 'o', limit=100),
+                              incremental.search('rep', 'o', limit=100))
+            self.assertEquals(store.search('number'), (1, [('named', 1.0 / 3)]))
+            store.add_field_index('title')
+            store.add_field_index('title', 'hash')
+            for query in ({'where': {'title': 'rep 3 of 10'}},
+                          {'ranges': {'title': ('rep 2', 'rep 4')}, 'sort': 'title'}):
+                self.assertEquals(store.query(**query), incremental.query(**query))
@@ -0,0 +1,88 @@
+"""unittest and doc for binary snapshots of RepStores and PinStores"""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from . import Pin, PinStore, Rep, RepStore, SqliteRepStore
+from .snapshot import dump, load, open_snapshot, restore
+
+class SnapshotTest(TestCase):
+    """Stores can be dumped to a snapshot file and loaded back."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rep_path = os.path.join(self.path, 'reps.snap')
+        self.rep_store = RepStore()
+        for number in range(5):
+            self.rep_store.create(Rep(title='Rep number %d' % number))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_reps(self):
+        """ A RepStore opened from a snapshot holds the same Reps, and keeps
+        handing out new keys after theirs.
+        """
+        dump(self.rep_store, self.rep_path)
+        loaded = open_snapshot(self.rep_path, RepStore)
+        self.assertEquals(loaded.as_dict(), self.rep_store.as_dict())
+        self.assertEquals(loaded.create(Rep(title='new')), '6')
+
+    def test_pins(self):
+        """ Pins are kept as integer columns and indexed once loaded.
+        """
+        pin_store = PinStore()
+        pin_store.create(Pin(1, 2))
+        pin_store.create(Pin(1, 3))
+        path = os.path.join(self.path, 'pins.snap')
+        dump(pin_store, path)
+        loaded = open_snapshot(path, PinStore)
+        self.assertEquals(loaded.as_dict(), pin_store.as_dict())
+        self.assertEquals(sorted(loaded.get_children(1)), [2, 3])
+
+    def test_other_values(self):
+        """ Keys and fields that are not integers are kept as they are.
+        """
+        pin_store = PinStore()
+        pin_store['first'] = Pin('a', None)
+        path = os.path.join(self.path, 'pins.snap')
+        dump(pin_store, path)
+        self.assertEquals(open_snapshot(path, PinStore).as_dict(),
+                          {'first': {'parent': 'a', 'child': None}})
+
+    def test_trusted(self):
+        """ A trusted load skips validating fields, so it takes what the
+        file says; an untrusted one rejects invalid values.
+        """
+        self.rep_store['1'] = Rep(title='valid')
+        dump(self.rep_store, self.rep_path)
+        with open(self.rep_path, 'r+b') as snapshot:
+            data = snapshot.read()
+            snapshot.seek(data.index(b'valid'))
+            snapshot.write(b' bad ')
+        self.assertRaises(ValueError, load, self.rep_path)
+        _, reps = load(self.rep_path, trusted=True)
+        self.assertEquals(reps['1'].title, ' bad ')
+
+    def test_restore(self):
+        """ A snapshot can be added to a store of any backend.
+        """
+        dump(self.rep_store, self.rep_path)
+        sqlite_store = SqliteRepStore(os.path.join(self.path, 'rep.db'))
+        self.assertEquals(restore(sqlite_store, self.rep_path), 5)
+        self.assertEquals(sqlite_store.as_dict(), self.rep_store.as_dict())
+        sqlite_store.close()
+
+    def test_wrong_store(self):
+        """ A snapshot only loads into a store of its own item class.
+        """
+        dump(self.rep_store, self.rep_path)
+        self.assertRaises(ValueError, open_snapshot, self.rep_path, PinStore)
+
+    def test_not_a_snapshot(self):
+        """ Other files are rejected.
+        """
+        with open(self.rep_path, 'wb') as other:
+            other.write(b'{"title": "json"}\n')
+        self.assertRaises(ValueError, load, self.rep_path)
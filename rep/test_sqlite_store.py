@@ -0,0 +1,128 @@
+"""unittest and doc for the SQLite backed RepStore and PinStore"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from . import (
+    ChangeJournal,
+    CycleError,
+    Pin,
+    Rep,
+    SqliteBackend,
+    SqlitePinStore,
+    SqliteRepStore,
+    test_pin_store,
+    test_rep_store,
+)
+from .key_order import KeyOrder
+
+class SqliteRepStoreTest(test_rep_store.RepStoreTest):
+    """SqliteRepStore passes the same tests as RepStore."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rep_store = SqliteRepStore(os.path.join(self.path, 'rep.db'))
+
+    def tearDown(self):
+        self.rep_store.close()
+        shutil.rmtree(self.path)
+
+    def test_persisted(self):
+        """Reps are still there when the database is opened again."""
+        key = self.rep_store.create(Rep(title="persisted"))
+        self.rep_store.close()
+        reopened = SqliteRepStore(os.path.join(self.path, 'rep.db'))
+        self.assertEquals(reopened[key].title, "persisted")
+        self.assertNotEquals(reopened.get_new_key(), key)
+        reopened.close()
+
+    def test_update_is_one_transaction(self):
+        """A failing update leaves none of its Reps behind."""
+        class Broken(object):
+            def as_dict(self):
+                raise ValueError("cannot be stored")
+        with self.assertRaises(ValueError):
+            self.rep_store.update([('1', Rep(title="one")), ('2', Broken())])
+        self.assertEquals(len(self.rep_store), 0)
+
+    def test_failed_update_unindexed(self):
+        """A failing update takes its Reps back out of the indexes."""
+        class Broken(object):
+            def as_dict(self):
+                raise ValueError("cannot be stored")
+        journal = ChangeJournal()
+        journal.watch(self.rep_store, 'reps')
+        self.rep_store['1'] = Rep(title="kept")
+        version = self.rep_store.versions.of('1')
+        with self.assertRaises(ValueError):
+            self.rep_store.update([('1', Rep(title="replaced")), ('2', Rep(title="dropped")),
+                                   ('3', Broken())])
+        self.assertEquals(self.rep_store['1'].title, "kept")
+        self.assertEquals([key for key, _ in self.rep_store.search("dropped")[1]], [])
+        self.assertEquals([key for key, _ in self.rep_store.search("kept")[1]], ['1'])
+        self.assertNotEquals(self.rep_store.versions.of('1'), version)
+        self.assertEquals(self.rep_store.versions.of('2'), 0)
+        self.assertEquals(list(self.rep_store.ordered_keys()), ['1'])
+        last = {}
+        for change in journal.since(0):
+            last[change['key']] = change['op']
+        self.assertEquals(last['1'], 'put')
+        self.assertNotEquals(last.get('2'), 'put')
+
+    def test_ordered_keys(self):
+        """Keys are ordered as by KeyOrder, after any cursor."""
+        backend = SqliteBackend(os.path.join(self.path, 'order.db'), 'reps', Rep)
+        backend.ORDER_BLOCK = 2
+        order = KeyOrder()
+        keys = ['10', '9', '2', '02', '', 'abc', 'b', '-3', '1x', '007']
+        for key in keys:
+            backend[key] = Rep(title='key [%s]' % key)
+            order.add(key)
+        for after in [None, '0', '5', '99', 'zzz'] + keys:
+            self.assertEquals(list(backend.ordered_keys(after)), list(order.keys(after)))
+        backend.close()
+
+    def test_threads(self):
+        """Each thread uses its own connection to the same database."""
+        def create():
+            for _ in range(20):
+                self.rep_store.create(Rep(title="threaded"))
+        threads = [threading.Thread(target=create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(self.rep_store), 80)
+
+
+class SqlitePinStoreTest(test_pin_store.PinStoreTest):
+    """SqlitePinStore passes the same tests as PinStore."""
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.pin_store = SqlitePinStore(os.path.join(self.path, 'rep.db'))
+
+    def tearDown(self):
+        self.pin_store.close()
+        shutil.rmtree(self.path)
+
+    def test_children_use_index(self):
+        """get_children is answered by an indexed query."""
+        backend = SqliteBackend(os.path.join(self.path, 'rep.db'), 'pins', Pin)
+        with backend.transaction() as db:
+            plan = db.execute('EXPLAIN QUERY PLAN SELECT key FROM pins '
+                              'WHERE parent = ?', ('1',)).fetchall()
+        backend.close()
+        self.assertIn('pins_parent', str(plan))
+
+    def test_cycle_in_update(self):
+        """An update refused for a cycle leaves no pins in the order."""
+        self.pin_store.enable_topological_order()
+        with self.assertRaises(CycleError):
+            self.pin_store.update([('1', Pin('1', '2')), ('2', Pin('2', '3')),
+                                   ('3', Pin('3', '1'))])
+        self.assertEquals(len(self.pin_store), 0)
+        self.assertEquals(self.pin_store.toposort(), [])
+        self.pin_store['2'] = Pin('2', '3')
+        self.assertEquals(self.pin_store.toposort(), ['2', '3'])
@@ -0,0 +1,101 @@
+"""unittest and doc for TopologicalOrder, which keeps pins free of cycles"""
+
+import random
+from unittest import TestCase
+
+from . import CycleError, Pin, PinStore, TopologicalOrder
+
+class TopologicalOrderTest(TestCase):
+    """A PinStore with a topological order refuses pins that close a cycle."""
+    def setUp(self):
+        self.pin_store = PinStore()
+        self.order = self.pin_store.enable_topological_order()
+
+    def check_order(self):
+        """ Every parent comes before its children, and only Reps with pins
+        are listed.
+        """
+        order = self.pin_store.toposort()
+        positions = dict((rep, position) for position, rep in enumerate(order))
+        reps = set()
+        for pin in self.pin_store.values():
+            self.assertTrue(positions[str(pin.parent)] < positions[str(pin.child)])
+            reps.update([str(pin.parent), str(pin.child)])
+        self.assertEquals(sorted(order), sorted(reps))
+
+    def test_cycle(self):
+        """ A pin that would close a cycle is refused and not stored.
+        """
+        keys = [self.pin_store.create(Pin(parent, parent + 1)) for parent in range(5)]
+        self.assertRaises(CycleError, self.pin_store.create, Pin(5, 0))
+        self.assertRaises(CycleError, self.pin_store.create, Pin(3, 3))
+        self.assertEquals(len(self.pin_store), 5)
+        self.assertEquals(self.pin_store.get_children(5), [])
+        del self.pin_store[keys[2]]
+        self.pin_store.create(Pin(5, 0))
+        self.check_order()
+
+    def test_in_place_change(self):
+        """ Changing a pin in place to close a cycle is undone.
+        """
+        self.pin_store.create(Pin(1, 2))
+        key = self.pin_store.create(Pin(2, 3))
+        pin = self.pin_store[key]
+        with self.assertRaises(CycleError):
+            pin.child = 1
+        self.assertEquals(pin.child, 3)
+        self.assertEquals(self.pin_store[key].child, 3)
+        self.assertEquals(self.pin_store.toposort(), ['1', '2', '3'])
+
+    def test_reorder(self):
+        """ A pin against the current order moves the Reps below its child,
+        or those above its parent, whichever are fewer.
+        """
+        self.pin_store.update({'1': Pin('a', 'b'), '2': Pin('c', 'd'), '3': Pin('d', 'e')})
+        self.pin_store.create(Pin('e', 'a'))
+        self.check_order()
+        self.assertRaises(CycleError, self.pin_store.create, Pin('b', 'c'))
+        self.check_order()
+
+    def test_removed(self):
+        """ Reps are dropped from the order with their last pin, and a
+        repeated pin is only dropped with its last copy.
+        """
+        first = self.pin_store.create(Pin(1, 2))
+        second = self.pin_store.create(Pin(1, 2))
+        del self.pin_store[first]
+        self.assertRaises(CycleError, self.pin_store.create, Pin(2, 1))
+        del self.pin_store[second]
+        self.assertEquals(len(self.order), 0)
+        self.pin_store.create(Pin(2, 1))
+        self.assertEquals(self.pin_store.toposort(), ['2', '1'])
+
+    def test_random(self):
+        """ Random pins are refused exactly when a walk finds a cycle.
+        """
+        chooser = random.Random(23)
+        for _ in range(300):
+            parent, child = chooser.randint(0, 40), chooser.randint(0, 40)
+            closes = parent == child or any(
+                str(rep) == str(parent) for _, _, rep in self.pin_store.descendants(child))
+            try:
+                self.pin_store.create(Pin(parent, child))
+                self.assertFalse(closes)
+            except CycleError:
+                self.assertTrue(closes)
+            if chooser.random() < 0.2:
+                del self.pin_store[chooser.choice(list(self.pin_store))]
+        self.check_order()
+
+    def test_existing_cycle(self):
+        """ The order cannot be started over pins that have a cycle.
+        """
+        pin_store = PinStore()
+        pin_store.update({'1': Pin(1, 2), '2': Pin(2, 1)})
+        self.assertRaises(CycleError, pin_store.enable_topological_order)
+        self.assertRaises(CycleError, pin_store.toposort)
+        self.assertTrue(pin_store.topological_order is None)
+        del pin_store['2']
+        self.assertEquals(pin_store.toposort(), ['1', '2'])
+        self.assertTrue(pin_store.topological_order is None)
+        self.assertTrue(isinstance(self.order, TopologicalOrder))
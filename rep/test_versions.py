@@ -0,0 +1,26 @@
+"""unittest and doc for Versions, the change counters behind ETags"""
+
+from unittest import TestCase
+
+from . import Rep, RepStore
+
+class VersionsTest(TestCase):
+    """Every Store keeps a Versions index of its changes."""
+
+    def test_versions(self):
+        """ Every change to a store bumps its version, and records it against
+        the key that changed.
+        """
+        store = RepStore()
+        first = store.create(Rep(title='first'))
+        second = store.create(Rep(title='second'))
+        store[first] = Rep(title='changed')
+        self.assertEquals(store.versions.of(second), 2)
+        self.assertGreater(store.versions.of(first), 2)
+        self.assertEquals(store.versions.etag(), '%s-%d' % (store.versions.epoch,
+                                                           store.versions.of(first)))
+
+    def test_epoch(self):
+        """ Stores opened separately never share ETags.
+        """
+        self.assertNotEqual(RepStore().versions.etag(), RepStore().versions.etag())
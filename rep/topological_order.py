@@ -0,0 +1,130 @@
+import operator
+import threading
+
+class CycleError(ValueError):
+    """A pin would make a Rep its own ancestor."""
+
+
+class TopologicalOrder(object):
+    """A topological order of the Reps joined by the pins of a PinStore,
+    every parent before its children, kept up to date as pins change.
+
+    It is a store index, and adding a pin that would close a cycle raises
+    CycleError, so the store refuses the pin.  Each Rep has a position, and
+    a pin whose parent is already placed before its child costs nothing
+    more.  A Rep new to the order is placed first when it arrives as a
+    parent and last when it arrives as a child, so graphs built top down or
+    bottom up keep to that.  Otherwise, as in the Pearce-Kelly algorithm,
+    only the Reps that must move are searched and reordered; here the
+    smaller of the child's descendants and the parent's ancestors, found by
+    searching both at once.  A pin that would close a cycle is refused once
+    either search reaches the other end.
+
+    Rep keys are compared as strings, as in PinIndex.
+    """
+
+    def __init__(self):
+        self.__positions = {}
+        self.__children = {}
+        self.__parents = {}
+        self.__first = 0
+        self.__last = 0
+        self.__lock = threading.Lock()
+
+    def add(self, key, pin):
+        parent, child = str(pin.parent), str(pin.child)
+        if parent == child:
+            raise CycleError("%s cannot be pinned under itself" % child)
+        with self.__lock:
+            positions = self.__positions
+            if parent not in positions:
+                self.__first -= 1
+                positions[parent] = self.__first
+            if child not in positions:
+                self.__last += 1
+                positions[child] = self.__last
+            if positions[child] < positions[parent]:
+                self.__reorder(parent, child)
+            children = self.__children.setdefault(parent, {})
+            children[child] = children.get(child, 0) + 1
+            parents = self.__parents.setdefault(child, {})
+            parents[parent] = parents.get(parent, 0) + 1
+
+    def remove(self, key, pin):
+        parent, child = str(pin.parent), str(pin.child)
+        with self.__lock:
+            if self.__discard(self.__children, parent, child):
+                self.__discard(self.__parents, child, parent)
+                for rep in (parent, child):
+                    if rep not in self.__children and rep not in self.__parents:
+                        del self.__positions[rep]
+
+    def keys(self):
+        """Return the keys of the Reps with pins, every parent before its
+        children.
+        """
+        with self.__lock:
+            placed = list(self.__positions.items())
+        placed.sort(key=operator.itemgetter(1))
+        return [rep for rep, _ in placed]
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __reorder(self, parent, child):
+        """Restore the order for a new pin from parent to child, which is
+        placed after it, or raise CycleError if child is an ancestor of
+        parent.
+
+        The Reps below child and those above parent are searched in turn,
+        a Rep at a time.  When one search runs out first, without meeting
+        the other end of the pin, the Reps it found are moved, in their
+        current order, after every other Rep (those below child) or before
+        them (those above parent), so only the smaller side is visited.
+        """
+        children, parents = self.__children, self.__parents
+        below, below_stack = set([child]), [child]
+        above, above_stack = set([parent]), [parent]
+        while True:
+            if not below_stack:
+                self.__move(below, after=True)
+                return
+            for rep in children.get(below_stack.pop(), ()):
+                if rep == parent:
+                    raise CycleError("%s is already an ancestor of %s" % (child, parent))
+                if rep not in below:
+                    below.add(rep)
+                    below_stack.append(rep)
+            if not above_stack:
+                self.__move(above, after=False)
+                return
+            for rep in parents.get(above_stack.pop(), ()):
+                if rep == child:
+                    raise CycleError("%s is already an ancestor of %s" % (child, parent))
+                if rep not in above:
+                    above.add(rep)
+                    above_stack.append(rep)
+
+    def __move(self, reps, after):
+        positions = self.__positions
+        moved = sorted(reps, key=positions.get)
+        if after:
+            for position, rep in enumerate(moved, self.__last + 1):
+                positions[rep] = position
+            self.__last += len(moved)
+        else:
+            for position, rep in enumerate(moved, self.__first - len(moved)):
+                positions[rep] = position
+            self.__first -= len(moved)
+
+    @staticmethod
+    def __discard(edges, rep, other):
+        counts = edges.get(rep)
+        if counts is None or other not in counts:
+            return False
+        counts[other] -= 1
+        if not counts[other]:
+            del counts[other]
+            if not counts:
+                del edges[rep]
+        return True
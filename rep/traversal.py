@@ -0,0 +1,104 @@
+import collections
+import threading
+
+ORDERS = ('bfs', 'dfs')
+
+def walk(start, neighbours, max_depth=None, order='bfs'):
+    """Walk the graph of Rep keys reachable from start.
+
+    neighbours(key) returns the keys one step away, for example
+    PinStore.get_children.  Yields (depth, via, key) once for every key
+    reached, where via is the key it was reached from.  Keys are compared and
+    yielded as strings and each is yielded at most once, so cycles end the
+    walk instead of looping.  max_depth limits how many steps are taken;
+    None means no limit.  order is 'bfs' for breadth first or 'dfs' for depth
+    first pre-order.
+    """
+    if order not in ORDERS:
+        raise ValueError("%s is not a valid order" % order)
+    if order == 'bfs':
+        return _breadth_first(str(start), neighbours, max_depth)
+    return _depth_first(str(start), neighbours, max_depth)
+
+def _breadth_first(start, neighbours, max_depth):
+    seen = set([start])
+    pending = collections.deque([(0, start)])
+    while pending:
+        depth, key = pending.popleft()
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for neighbour in neighbours(key):
+            neighbour = str(neighbour)
+            if neighbour not in seen:
+                seen.add(neighbour)
+                yield depth + 1, key, neighbour
+                pending.append((depth + 1, neighbour))
+
+def _depth_first(start, neighbours, max_depth):
+    # With a max_depth, a key first reached down a long path is expanded
+    # again if a shorter path turns up later, so the walk reaches the same
+    # keys as a breadth first one.
+    shallowest = {start: 0}
+    pending = [(0, None, start)]
+    while pending:
+        depth, via, key = pending.pop()
+        if via is not None:
+            if key in shallowest and (max_depth is None or shallowest[key] <= depth):
+                continue
+            if key not in shallowest:
+                yield depth, via, key
+            shallowest[key] = depth
+        if max_depth is not None and depth >= max_depth:
+            continue
+        steps = [(depth + 1, key, str(neighbour)) for neighbour in neighbours(key)]
+        pending.extend(reversed(steps))
+
+
+def tree(start, steps):
+    """Nest the (depth, via, key) steps of a walk from start into a tree of
+    dicts, keyed by Rep key.
+    """
+    nodes = {str(start): {}}
+    for _, via, key in steps:
+        nodes[key] = nodes[via][key] = {}
+    return nodes[str(start)]
+
+
+class TraversalCache(object):
+    """A size bounded LRU cache of finished walks for a PinStore.
+
+    It is registered as a store index so that any change to a pin clears it.
+    The generation number goes up on every clear, so a walk that was running
+    while a pin changed is not cached.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.generation = 0
+        self.__walks = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def add(self, key, pin):
+        self.clear()
+
+    def remove(self, key, pin):
+        self.clear()
+
+    def clear(self):
+        with self.__lock:
+            self.generation += 1
+            self.__walks.clear()
+
+    def get(self, query):
+        with self.__lock:
+            steps = self.__walks.pop(query, None)
+            if steps is not None:
+                self.__walks[query] = steps
+            return steps
+
+    def put(self, query, steps, generation):
+        with self.__lock:
+            if generation == self.generation:
+                self.__walks[query] = steps
+                while len(self.__walks) > self.size:
+                    self.__walks.popitem(last=False)
@@ -0,0 +1,39 @@
+import time
+
+class Versions(object):
+    """Version counters for a Store, kept as a store index.
+
+    version goes up on every change to the store and modified is the time of
+    the last change.  Each key also remembers the store version at which it
+    last changed; keys not changed since the store was opened are at version
+    0.  epoch is different for every Versions object, so version numbers
+    from before a restart are never mistaken for current ones.
+    """
+
+    def __init__(self):
+        self.epoch = '%x' % int(time.time() * 1000000)
+        self.version = 0
+        self.modified = time.time()
+        self.__keys = {}
+
+    def add(self, key, item):
+        self.__changed()
+        self.__keys[key] = self.version
+
+    def remove(self, key, item):
+        self.__changed()
+        self.__keys.pop(key, None)
+
+    def of(self, key):
+        """Return the version at which key last changed.
+        """
+        return self.__keys.get(str(key), 0)
+
+    def etag(self, key=None):
+        """Return an entity tag for the whole store, or for one key.
+        """
+        return '%s-%d' % (self.epoch, self.version if key is None else self.of(key))
+
+    def __changed(self):
+        self.version += 1
+        self.modified = time.time()
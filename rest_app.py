@@ -1,119 +1,968 @@
 #!flask/bin/python
 
 """ This flask app provides the RESTful interface to a RepStore.
+
+create_app(config) makes an app with stores of its own, configured by the
+REP_* settings below, which config overrides.  Run as a script, it is
+served by rep.http_server:
+
+    python rest_app.py [--port N] [--workers N] [--threads N] [--keep-alive S]
+                       [--drain-timeout S] [--backend NAME] [--data-dir DIR] [--dev]
+
+Each worker process loads its stores in the background and answers 503 to
+everything but /ready until they are loaded.  More than one worker needs the
+remote backend, so that they share one dataset.  SIGTERM drains the
+requests in progress before exiting.  --dev runs the Werkzeug development
+server, with the debugger and reloader, instead.
+
+The storage backend is chosen with the REP_BACKEND environment variable:
+
+    memory  keep everything in process memory (the default)
+    compact keep Reps as titles and Pins as integer columns in memory,
+            building objects only when they are read
+    sharded keep everything in process memory split across shards, so that
+            exports and index builds run on a pool of threads; a process
+            pool would fork while request threads hold locks
+    log     append-only log files under REP_DATA_DIR, synced per REP_SYNC
+    sqlite  an SQLite database in REP_DATA_DIR, with up to REP_CACHE_ITEMS
+            objects per store cached in memory, written write-through or
+            write-back per REP_CACHE_MODE; 0 turns the cache off
+    remote  the stores of a rep.store_server listening on REP_SOCKET, so
+            that any number of worker processes share one dataset
+
+REP_SNAPSHOT_DIR names a directory of reps.snap and pins.snap files, as
+written by python -m rep.snapshot dump, to start from.  The memory backend
+is built straight from them; other backends load them only when empty.
+Set REP_SNAPSHOT_TRUSTED to 1 to skip validating their objects.
+
+REP_FANOUT sets how many reads run at once when a response needs many
+objects, such as the children of a Rep; the default 0 reads one at a time.
+
+Objects are sent from a cache of their JSON encodings of at most
+REP_JSON_CACHE_BYTES per store; 0 turns the cache off.
+
+Request latencies per route, store operation timings and store sizes are
+served in the Prometheus text format at /metrics unless REP_METRICS is 0.
+
+REP_FIELD_INDEXES lists the fields to index for queries on the list
+endpoints, as comma separated field:kind pairs, where kind is hash for
+equality lookups alone or sorted for ranges and ordering too.  Each applies
+to the store whose objects have that field; the default is title:sorted.
+
+Unless REP_ACYCLIC is 0, Pins that would make a Rep its own ancestor are
+refused with 409 Conflict, and the Reps are kept in a topological order,
+served at /pins/toposort.
+
+The last REP_JOURNAL_SIZE changes to the Reps and Pins are kept in a
+change journal, read from /changes, so that copies can be kept up to date
+without fetching the lists again.  The journal only sees the changes made
+by this process, so it is not kept for the remote backend.
 """
 
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+
 from flask import (
     abort,
+    Blueprint,
+    current_app,
     Flask,
+    has_app_context,
     jsonify,
     make_response,
     redirect,
     request,
+    Response,
+    stream_with_context,
 )
+from werkzeug.local import LocalProxy
+
+from rep import backends
+from rep import http_server
+from rep import metrics
+from rep import snapshot
 from rep import (
+    AsyncStore,
+    ChangeJournal,
+    CycleError,
+    JsonCache,
     Pin,
     PinStore,
+    RemotePinStore,
+    RemoteRepStore,
     Rep,
     RepStore,
+    ResyncRequired,
 )
 
-app = Flask(__name__)
+DEFAULT_CONFIG = dict(
+    REP_BACKEND=os.environ.get('REP_BACKEND', 'memory'),
+    REP_DATA_DIR=os.environ.get('REP_DATA_DIR', 'data'),
+    REP_SYNC=os.environ.get('REP_SYNC', 'always'),
+    REP_SOCKET=os.environ.get('REP_SOCKET', 'rep.sock'),
+    REP_SNAPSHOT_DIR=os.environ.get('REP_SNAPSHOT_DIR'),
+    REP_SNAPSHOT_TRUSTED=int(os.environ.get('REP_SNAPSHOT_TRUSTED', 0)),
+    REP_FANOUT=int(os.environ.get('REP_FANOUT', 0)),
+    REP_JSON_CACHE_BYTES=int(os.environ.get('REP_JSON_CACHE_BYTES',
+                                            JsonCache.DEFAULT_MAX_BYTES)),
+    REP_METRICS=int(os.environ.get('REP_METRICS', 1)),
+    REP_JOURNAL_SIZE=int(os.environ.get('REP_JOURNAL_SIZE', ChangeJournal.DEFAULT_SIZE)),
+    REP_FIELD_INDEXES=os.environ.get('REP_FIELD_INDEXES', 'title:sorted'),
+    REP_ACYCLIC=int(os.environ.get('REP_ACYCLIC', 1)),
+    REP_CACHE_ITEMS=int(os.environ.get('REP_CACHE_ITEMS', 0)),
+    REP_CACHE_MODE=os.environ.get('REP_CACHE_MODE', 'write-through'),
+)
+
+api = Blueprint('rep', __name__)
+
+def create_app(config=None, background=False):
+    """ Create an app serving the REST interface from stores of its own,
+    configured by DEFAULT_CONFIG updated with config.
+
+    The stores are opened, and filled from any snapshot, before create_app
+    returns, or in a background thread if background is true.  Until they
+    are ready /ready answers 503 and so does every other route.
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    app.register_blueprint(api)
+    state = app.extensions['rep'] = Service(app.config)
+    if state.registry is not None:
+        app.before_request(start_timer)
+        app.after_request(record_request)
+    if background:
+        loader = threading.Thread(target=state.load, args=(app.logger,))
+        loader.daemon = True
+        loader.start()
+    else:
+        state.load()
+    return app
+
+_default_app = []
+_default_app_lock = threading.Lock()
+
+def default_app():
+    """ Return the app configured from the environment alone, created on
+    first use.  It is what app, store and pin_store refer to outside a
+    request.
+    """
+    with _default_app_lock:
+        if not _default_app:
+            _default_app.append(create_app())
+        return _default_app[0]
+
+def service():
+    """ Return the Service of the app handling the current request, or of
+    the default app outside one.
+    """
+    if has_app_context():
+        return current_app.extensions['rep']
+    return default_app().extensions['rep']
+
+app = LocalProxy(default_app)
+store = LocalProxy(lambda: service().store)
+pin_store = LocalProxy(lambda: service().pin_store)
+
+
+class Service(object):
+    """ The stores of an app and what is kept alongside them: the change
+    journal, the metrics registry and the AsyncStores reads fan out over.
+    ready is set once load has opened them.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.store = None
+        self.pin_store = None
+        self.journal = None
+        self.registry = metrics.Registry() if config['REP_METRICS'] else None
+        self.fanout = {}
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.error = None
+
+    def load(self, logger=None):
+        """ Open the stores per the config, filling them from any snapshot,
+        then set ready.  An error is kept in error, and logged to logger if
+        one is given, instead of raised.
+        """
+        try:
+            self.__load()
+        except Exception as error:
+            if logger is None:
+                raise
+            logger.exception("Loading the stores failed")
+            self.error = '%s: %s' % (type(error).__name__, error)
+            return
+        self.ready.set()
+
+    def __load(self):
+        config = self.config
+        self.store = open_store(RepStore, 'reps', config)
+        self.store.enable_search()
+        self.pin_store = open_store(PinStore, 'pins', config)
+        item_stores = (self.store, self.pin_store)
+        if config['REP_JSON_CACHE_BYTES']:
+            for item_store in item_stores:
+                item_store.enable_json_cache(config['REP_JSON_CACHE_BYTES'])
+
+        for spec in config['REP_FIELD_INDEXES'].split(','):
+            if spec.strip():
+                field, _, kind = spec.strip().partition(':')
+                for item_store in item_stores:
+                    if field in item_store.item_class.fields:
+                        item_store.add_field_index(field, kind or 'sorted')
+
+        if config['REP_ACYCLIC']:
+            self.pin_store.enable_topological_order()
+
+        if config['REP_JOURNAL_SIZE'] and config['REP_BACKEND'] != 'remote':
+            self.journal = ChangeJournal(config['REP_JOURNAL_SIZE'])
+            self.journal.watch(self.store, 'reps')
+            self.journal.watch(self.pin_store, 'pins')
+
+        if self.registry is not None:
+            metrics.instrument_store(self.store, self.registry, 'reps')
+            metrics.instrument_store(self.pin_store, self.registry, 'pins')
+        self.enable_fanout(config['REP_FANOUT'])
+
+    def enable_fanout(self, workers):
+        """ Read the objects of multi-key responses with workers concurrent
+        store reads through an AsyncStore, or one at a time if workers is 0.
+        This pays off for backends whose reads wait on I/O.
+        """
+        for async_store in self.fanout.values():
+            async_store.close()
+        self.fanout.clear()
+        if workers:
+            for item_store in (self.store, self.pin_store):
+                self.fanout[item_store.item_class] = AsyncStore(item_store, workers)
 
-store = RepStore()
-pin_store = PinStore()
+    def stop(self):
+        """ Have responses that run until the client leaves, the change
+        streams, end, for a server that is shutting down.
+        """
+        self.stopping.set()
+        if self.journal is not None:
+            self.journal.interrupt()
 
-@app.route('/')
+    def close(self):
+        """ Close the AsyncStores and the stores.
+        """
+        self.enable_fanout(0)
+        for item_store in (self.store, self.pin_store):
+            if item_store is not None:
+                item_store.close()
+
+
+def open_store(store_class, name, config=None):
+    """ Create a store of store_class using the backend in config, by
+    default that of the current app, filled from the configured snapshot if
+    there is one.  name separates the data of different stores.
+    """
+    if config is None:
+        config = service().config
+    backend = config['REP_BACKEND']
+    path = None
+    if config['REP_SNAPSHOT_DIR']:
+        path = os.path.join(config['REP_SNAPSHOT_DIR'], '%s.snap' % name)
+    trusted = bool(config['REP_SNAPSHOT_TRUSTED'])
+    if backend == 'memory' and path is not None:
+        return snapshot.open_snapshot(path, store_class, trusted)
+    if backend == 'remote':
+        remote_class = {RepStore: RemoteRepStore, PinStore: RemotePinStore}[store_class]
+        item_store = remote_class(config['REP_SOCKET'], name)
+    else:
+        item_store = backends.open_store(store_class, name, backend,
+                                         config['REP_DATA_DIR'], config['REP_SYNC'],
+                                         config['REP_CACHE_ITEMS'], config['REP_CACHE_MODE'])
+    if path is not None and not len(item_store):
+        snapshot.restore(item_store, path, trusted)
+    return item_store
+
+def start_timer():
+    request.environ['rep.request_start'] = time.time()
+
+def record_request(response):
+    """ Time the request by route and count it by route and status.
+    Streamed responses are timed until their first byte.
+    """
+    registry = service().registry
+    current = request._get_current_object()
+    method = current.method
+    route = current.url_rule.rule if current.url_rule else 'unmatched'
+    start = current.environ.get('rep.request_start')
+    if start is not None:
+        registry.histogram('rep_http_request_duration_seconds',
+                           'Time taken to answer HTTP requests.',
+                           method=method, route=route).observe(time.time() - start)
+    registry.counter('rep_http_requests_total', 'HTTP requests answered.',
+                     method=method, route=route,
+                     status=response.status_code).inc()
+    return response
+
+@api.before_request
+def require_ready():
+    """ Answer 503 Service Unavailable until the stores are ready.
+    """
+    if request.endpoint != 'rep.get_ready' and not service().ready.is_set():
+        response = make_response(jsonify({'error': 'Not ready'}), 503)
+        response.headers['Retry-After'] = '1'
+        return response
+
+json_key = json.encoder.encode_basestring_ascii
+
+def enable_fanout(workers):
+    """ Fan out the reads of the current app's multi-key responses over
+    workers concurrent store reads.  See Service.enable_fanout.
+    """
+    service().enable_fanout(workers)
+
+FRAGMENT_BLOCK = 1000
+
+def fragments(item_store, keys):
+    """ Yield (key, JSON text) for each of keys, skipping keys that are not
+    in item_store and repeats.  The objects are read FRAGMENT_BLOCK keys at
+    a time with json_fragments, so a backend that fetches many objects at
+    once needs one round trip per block rather than one per key.
+    """
+    unique = unique_keys(keys)
+    async_store = service().fanout.get(item_store.item_class)
+    if async_store is not None:
+        for pair in async_store.iter_fragments(unique):
+            yield pair
+        return
+    while True:
+        block = list(itertools.islice(unique, FRAGMENT_BLOCK))
+        if not block:
+            return
+        for key, text in zip(block, item_store.json_fragments(block)):
+            if text is not None:
+                yield key, text
+
+def unique_keys(keys):
+    seen = set()
+    for key in keys:
+        key = str(key)
+        if key not in seen:
+            seen.add(key)
+            yield key
+
+def json_items(item_store, keys):
+    """ Return a JSON object mapping keys to their objects, assembled from
+    the objects' JSON fragments.
+    """
+    registry = service().registry
+    if registry is None:
+        return assemble(item_store, keys)
+    with registry.histogram('rep_serialize_seconds',
+                            'Time taken to assemble JSON responses from stored objects.',
+                            route=request.url_rule.rule).time():
+        return assemble(item_store, keys)
+
+def assemble(item_store, keys):
+    return '{%s}' % ', '.join('%s: %s' % (json_key(key), text)
+                              for key, text in fragments(item_store, keys))
+
+def json_response(text):
+    return Response(text, mimetype='application/json')
+
+def list_items(item_store):
+    """ Shared implementation of the list endpoints.
+
+    Without arguments the whole store is returned as a single dict.  With
+    ids, a comma separated list of keys, only those objects are returned,
+    read in one batch; keys that are not stored are left out.  With
+    limit and/or after the store is paged through in key order: items holds
+    up to limit objects following the key after, and next is the after value
+    for the following page, or null on the last page.  stream=json or
+    stream=ndjson streams the (optionally paged) objects as they are read
+    instead of building the whole response first.  A limit below one is
+    refused.
+
+    Arguments naming fields make a query, see query_items.
+    """
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    stream = request.args.get('stream')
+    ids = request.args.get('ids')
+    if limit is not None and limit < 1:
+        abort(400)
+    if is_query(item_store):
+        if ids is not None or after is not None or stream is not None:
+            abort(400)
+        return query_items(item_store, limit)
+    if ids is not None:
+        return json_response(json_items(item_store, parse_ids(ids)))
+    if stream is not None:
+        return stream_items(item_store, stream, limit, after)
+    if limit is None and after is None:
+        return json_response(json_items(item_store, item_store.ordered_keys()))
+    keys = list(itertools.islice(item_store.ordered_keys(after),
+                                 None if limit is None else limit + 1))
+    more = limit is not None and len(keys) > limit
+    keys = keys[:limit]
+    return json_response('{"items": %s, "next": %s}' % (
+        json_items(item_store, keys), json.dumps(keys[-1] if more else None)))
+
+def is_query(item_store):
+    """ Return whether the request's arguments make a query on the fields
+    of item_store.
+    """
+    for name in request.args:
+        if name == 'sort' or name.rsplit('_', 1)[0] in item_store.item_class.fields:
+            return True
+    return False
+
+def query_items(item_store, limit):
+    """ Answer a query on the fields of item_store.  field=value matches
+    objects whose field equals value, field_from=low and field_to=high
+    those whose field lies from low to high, both included, and every
+    condition given must hold.  sort=field orders the matches by field and
+    sort=-field in reverse, otherwise they are in key order; limit keeps
+    the first limit of them.
+
+    Values of fields with a format, such as titles, are text; the others
+    are read as JSON, falling back to text.  The response is {"items":
+    [{"key": ..., "value": ...}, ...], "plan": ...}, where plan describes
+    how the store found the matches, such as "sorted title range" or "scan".
+    """
+    fields = item_store.item_class.fields
+    where = {}
+    ranges = {}
+    for name, text in request.args.items():
+        if name in fields:
+            where[name] = parse_value(item_store, name, text)
+        elif name.rsplit('_', 1)[0] in fields:
+            field, end = name.rsplit('_', 1)
+            if end not in ('from', 'to'):
+                abort(400)
+            low, high = ranges.get(field, (None, None))
+            value = parse_value(item_store, field, text)
+            ranges[field] = (value, high) if end == 'from' else (low, value)
+    sort = request.args.get('sort')
+    descending = sort is not None and sort.startswith('-')
+    if descending:
+        sort = sort[1:]
+    try:
+        plan, keys = item_store.query(where, ranges, sort or None, descending, limit)
+    except ValueError:
+        abort(400)
+    return json_response('{"items": [%s], "plan": %s}' % (
+        ', '.join('{"key": %s, "value": %s}' % (json_key(key), text)
+                  for key, text in fragments(item_store, keys)),
+        json.dumps(plan)))
+
+def parse_value(item_store, field, text):
+    """ Return the value of field given as text in a query.
+    """
+    if field in getattr(item_store.item_class, 'format', {}):
+        return text
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_ids(ids):
+    """ Return the keys in a comma separated ids argument, aborting with 400
+    unless every one is an integer.
+    """
+    keys = [key.strip() for key in ids.split(',') if key.strip()]
+    if not all(key.isdigit() for key in keys):
+        abort(400)
+    return [str(int(key)) for key in keys]
+
+def stream_items(item_store, stream, limit, after):
+    """ Stream objects in key order, either as a single JSON dict or as
+    newline delimited JSON with one {"key": ..., "value": ...} per line.
+    """
+    items = fragments(item_store, itertools.islice(item_store.ordered_keys(after), limit))
+    if stream == 'ndjson':
+        def generate():
+            for key, text in items:
+                yield '{"key": %s, "value": %s}\n' % (json_key(key), text)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    if stream == 'json':
+        def generate():
+            separator = '{'
+            for key, text in items:
+                yield '%s%s: %s' % (separator, json_key(key), text)
+                separator = ', '
+            yield '{}' if separator == '{' else '}'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+    abort(400)
+
+def conditional(etag, modified, build):
+    """ Answer a GET conditionally.  If the request's If-None-Match names
+    etag an empty 304 is returned without calling build, otherwise the
+    response from build().  Either way ETag and Last-Modified are set.
+    """
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    response.last_modified = modified
+    return response
+
+def require_match(item_store, key):
+    """ Abort with 412 Precondition Failed if the request has an If-Match
+    header that does not name the current ETag of key.
+    """
+    if request.if_match and (str(key) not in item_store or
+                             item_store.versions.etag(key) not in request.if_match):
+        abort(412)
+
+def related_etag(*stores):
+    """ Return the ETag and Last-Modified time of a response built from
+    several stores.
+    """
+    return ('.'.join(item_store.versions.etag() for item_store in stores),
+            max(item_store.versions.modified for item_store in stores))
+
+BULK_BATCH_SIZE = 1000
+
+def bulk_create(item_store, parse):
+    """ Shared implementation of the bulk ingest endpoints.
+
+    The request body is newline delimited JSON with one object per line.
+    Lines are read and validated with parse a batch at a time, each batch
+    gets a block of keys and is stored with a single update.  The response
+    streams one result per non-blank input line, either {"line": n, "key": k}
+    or {"line": n, "error": message}, so neither the upload nor the results
+    are held in memory.
+    """
+    def generate():
+        batch = []
+        for number, line in enumerate(request.stream, 1):
+            if line.strip():
+                batch.append((number, line))
+            if len(batch) >= BULK_BATCH_SIZE:
+                yield store_batch(item_store, parse, batch)
+                batch = []
+        if batch:
+            yield store_batch(item_store, parse, batch)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def store_batch(item_store, parse, batch):
+    """ Validate and store one batch of bulk lines, returning the NDJSON
+    results for the batch.
+    """
+    results = []
+    items = []
+    for number, line in batch:
+        try:
+            items.append((number, parse(json.loads(line))))
+        except (AttributeError, TypeError, ValueError) as error:
+            results.append({'line': number, 'error': str(error)})
+    keys = item_store.reserve_keys(len(items))
+    try:
+        item_store.update((key, item) for key, (_, item) in zip(keys, items))
+        results.extend({'line': number, 'key': key} for key, (number, _) in zip(keys, items))
+    except ValueError:
+        # An index refused an item, such as a Pin closing a cycle, so store
+        # the batch an item at a time to find which.  The keys are new, so
+        # any already there were stored before the refusal by a backend
+        # without transactions.
+        for key, (number, item) in zip(keys, items):
+            try:
+                if key not in item_store:
+                    item_store[key] = item
+                results.append({'line': number, 'key': key})
+            except ValueError as error:
+                results.append({'line': number, 'error': str(error)})
+    results.sort(key=lambda result: result['line'])
+    return ''.join(json.dumps(result) + '\n' for result in results)
+
+@api.route('/')
 def index():
     """ This is a placeholder for the root.
     """
     return "Hello, World!"
 
-@app.route('/rep/api/v1.0/reps', methods=['GET'])
+@api.route('/rep/api/v1.0/reps', methods=['GET'])
 def get_reps():
-    """ This outputs all the Reps as a single dict.  This will eventually need
-    to be limited in some way.
+    """ This outputs the Reps as a single dict, a page at a time or as a
+    stream.  See list_items.
+    """
+    return conditional(store.versions.etag(), store.versions.modified,
+                       lambda: list_items(store))
+
+@api.route('/rep/api/v1.0/reps/search', methods=['GET'])
+def search_reps():
+    """ Search Rep titles.  Matches contain every word of q and, if given, a
+    word starting with prefix.  Results are ranked best first and paged with
+    limit and offset; next is the offset of the following page, or null.
     """
-    return jsonify(store.as_dict())
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit < 0 or offset < 0:
+        abort(400)
+    total, ranked = store.search(request.args.get('q'), request.args.get('prefix'),
+                                 limit, offset)
+    results = []
+    records = store.read_records(key for key, _ in ranked)
+    for (key, score), record in zip(ranked, records):
+        if record is not None:
+            results.append({'key': key, 'score': score, 'rep': record})
+    return jsonify({'results': results, 'total': total,
+                    'next': offset + limit if offset + limit < total else None})
 
-@app.route('/rep/api/v1.0/reps/<int:key>', methods=['GET'])
+@api.route('/rep/api/v1.0/reps/<int:key>', methods=['GET'])
 def get_rep(key):
     """ Return a specific Rep referenced by its local key.
     """
-    try:
-        return jsonify(store[key].as_dict())
-    except KeyError:
+    if str(key) not in store:
         abort(404)
+    return conditional(store.versions.etag(key), store.versions.modified,
+                       lambda: json_response(store.json_fragment(key)))
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     """ Defines a custom 404 page.
     """
     return make_response(jsonify({'error': 'Not found'}), 404)
 
-@app.route('/rep/api/v1.0/reps', methods=['POST'])
+@api.route('/rep/api/v1.0/reps', methods=['POST'])
 def create_rep():
     if not request.json:
         abort(400)
     key = store.create(Rep(title=request.json.get('title')))
     return redirect('/rep/api/v1.0/reps/%s' % key, code=201)
 
-@app.route('/rep/api/v1.0/reps/<int:key>', methods=['PUT'])
+@api.route('/rep/api/v1.0/reps/bulk', methods=['POST'])
+def create_reps():
+    """ Create Reps from a newline delimited JSON upload.  See bulk_create.
+    """
+    return bulk_create(store, parse_rep)
+
+def parse_rep(data):
+    """ Build a Rep from a bulk line, which must give every field.
+    """
+    require_fields(Rep, data)
+    return Rep(from_dict=data)
+
+def parse_pin(data):
+    """ Build a Pin from a bulk line, which must give every field.
+    """
+    require_fields(Pin, data)
+    return Pin(None, None).from_dict(data)
+
+def require_fields(item_class, data):
+    for field in item_class.fields:
+        if field not in data:
+            raise ValueError("%s is required" % field)
+
+@api.route('/rep/api/v1.0/reps/<int:key>', methods=['PUT'])
 def update_rep(key):
+    require_match(store, key)
     store.update({key: Rep(title=request.json.get('title'))})
-    return jsonify(store[key].as_dict())
+    return jsonify(store.record(key))
 
-@app.route('/rep/api/v1.0/reps/<int:key>', methods=['DELETE'])
+@api.route('/rep/api/v1.0/reps/<int:key>', methods=['DELETE'])
 def delete_rep(key):
+    if str(key) not in store:
+        abort(404)
+    require_match(store, key)
     try:
-        del store[key]
+        store.delete(key)
         return jsonify({'result': True})
     except KeyError as e:
         abort(404)
 
-@app.route('/rep/api/v1.0/pins', methods=['GET'])
+@api.route('/rep/api/v1.0/pins', methods=['GET'])
 def get_pins():
-    """ This outputs all the Pins as a single dict.  This will eventually need
-    to be limited in some way.
+    """ This outputs the Pins as a single dict, a page at a time or as a
+    stream.  See list_items.
     """
-    return jsonify(pin_store.as_dict())
+    return conditional(pin_store.versions.etag(), pin_store.versions.modified,
+                       lambda: list_items(pin_store))
 
-@app.route('/rep/api/v1.0/pins', methods=['POST'])
+@api.route('/rep/api/v1.0/pins', methods=['POST'])
 def create_pin():
     if not request.json:
         abort(400)
-    key = pin_store.create(Pin(request.json.get('parent'),
-                               request.json.get('child')))
+    try:
+        key = pin_store.create(Pin(request.json.get('parent'),
+                                   request.json.get('child')))
+    except CycleError:
+        abort(409)
+    except ValueError:
+        abort(400)
     return redirect('/rep/api/v1.0/pins/%s' % key, code=201)
 
-@app.route('/rep/api/v1.0/pins/<int:key>', methods=['GET'])
+@api.route('/rep/api/v1.0/pins/bulk', methods=['POST'])
+def create_pins():
+    """ Create Pins from a newline delimited JSON upload.  See bulk_create.
+    """
+    return bulk_create(pin_store, parse_pin)
+
+@api.route('/rep/api/v1.0/pins/toposort', methods=['GET'])
+def get_pins_toposort():
+    """ Stream the keys of the Reps with Pins as a JSON list, every parent
+    before its children.  If REP_ACYCLIC is 0 the order is built for each
+    request, and 409 Conflict is returned while the Pins have a cycle.
+    """
+    def build():
+        try:
+            keys = pin_store.toposort()
+        except CycleError:
+            abort(409)
+        def generate():
+            separator = '['
+            for start in range(0, len(keys), FRAGMENT_BLOCK):
+                yield separator + ', '.join(json_key(key) for key in
+                                            keys[start:start + FRAGMENT_BLOCK])
+                separator = ', '
+            yield '[]' if separator == '[' else ']'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+    return conditional(pin_store.versions.etag(), pin_store.versions.modified, build)
+
+@api.route('/rep/api/v1.0/pins/<int:key>', methods=['GET'])
 def get_pin(key):
     """ Return a specific Pin referenced by its local key.
     """
-    try:
-        return jsonify(pin_store[key].as_dict())
-    except KeyError:
+    if str(key) not in pin_store:
         abort(404)
+    return conditional(pin_store.versions.etag(key), pin_store.versions.modified,
+                       lambda: json_response(pin_store.json_fragment(key)))
 
-@app.route('/rep/api/v1.0/pins/<int:key>', methods=['DELETE'])
+@api.route('/rep/api/v1.0/pins/<int:key>', methods=['DELETE'])
 def delete_pin(key):
+    if str(key) not in pin_store:
+        abort(404)
+    require_match(pin_store, key)
     try:
-        del pin_store[key]
+        pin_store.delete(key)
         return jsonify({'result': True})
     except KeyError as e:
         abort(404)
 
-@app.route('/rep/api/v1.0/pins/<int:key>', methods=['PUT'])
+@api.route('/rep/api/v1.0/pins/<int:key>', methods=['PUT'])
 def update_pin(key):
-    for field in ['parent', 'child']:
-        setattr(pin_store[key], field,
-                request.json.get(field, getattr(pin_store[key], field)))
+    require_match(pin_store, key)
+    pin = pin_store[key]
+    try:
+        pin_store[key] = Pin(*[request.json.get(field, getattr(pin, field))
+                               for field in ['parent', 'child']])
+    except CycleError:
+        abort(409)
+    except ValueError:
+        abort(400)
     return jsonify(pin_store[key].as_dict())
 
-@app.route('/rep/api/v1.0/children/<int:key>', methods=['GET'])
+@api.route('/rep/api/v1.0/children/<int:key>', methods=['GET'])
 def get_children(key):
-    return jsonify({key: store[child].as_dict() for child in pin_store.get_children(key)})
+    """ Return the Reps pinned as children of the Rep referenced by key,
+    keyed by their own local keys.
+    """
+    etag, modified = related_etag(pin_store, store)
+    return conditional(etag, modified, lambda: json_response(
+        json_items(store, pin_store.get_children(key))))
+
+@api.route('/rep/api/v1.0/parents/<int:key>', methods=['GET'])
+def get_parents(key):
+    """ Return the Reps the Rep referenced by key is pinned under, keyed by
+    their own local keys.
+    """
+    etag, modified = related_etag(pin_store, store)
+    return conditional(etag, modified, lambda: json_response(
+        json_items(store, pin_store.get_parents(key))))
+
+@api.route('/rep/api/v1.0/reps/<int:key>/descendants', methods=['GET'])
+def get_descendants(key):
+    """ Return the Reps below the Rep referenced by key.  See traverse.
+    """
+    return traverse('descendants', key)
+
+@api.route('/rep/api/v1.0/reps/<int:key>/ancestors', methods=['GET'])
+def get_ancestors(key):
+    """ Return the Reps above the Rep referenced by key.  See traverse.
+    """
+    return traverse('ancestors', key)
+
+def traverse(direction, key):
+    """ Shared implementation of the traversal endpoints.
+
+    depth limits how many pins are followed, and order is bfs (the default)
+    or dfs.  With format=flat (the default) a JSON list is streamed as the
+    walk runs, one {"key", "via", "depth", "rep"} object per Rep reached,
+    where via is the key it was reached from.  With format=tree the result is
+    {key: {child: {grandchild: ...}}}.
+    """
+    depth = request.args.get('depth', type=int)
+    order = request.args.get('order', 'bfs')
+    walk_format = request.args.get('format', 'flat')
+    if walk_format == 'tree':
+        return jsonify({str(key): pin_store.subtree(key, depth, direction)})
+    if walk_format != 'flat':
+        abort(400)
+    try:
+        walked = getattr(pin_store, direction)(key, depth, order)
+    except ValueError:
+        abort(400)
+    def generate():
+        separator = '['
+        for step_depth, via, step_key in walked:
+            try:
+                rep = store.record(step_key)
+            except KeyError:
+                rep = None
+            yield separator + json.dumps({'key': step_key, 'via': via, 'depth': step_depth,
+                                          'rep': rep})
+            separator = ', '
+        yield '[]' if separator == '[' else ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@api.route('/rep/api/v1.0/stats/cache', methods=['GET'])
+def get_cache_stats():
+    """ Return the hit, miss and size counts of each store's JSON cache,
+    or null for a store without one.
+    """
+    return jsonify({name: None if item_store.json_cache is None
+                    else item_store.json_cache.stats()
+                    for name, item_store in (('reps', store), ('pins', pin_store))})
+
+CHANGES_LIMIT = 1000
+CHANGES_HEARTBEAT = 15
+
+@api.route('/rep/api/v1.0/changes', methods=['GET'])
+def get_changes():
+    """ Return the changes to Reps and Pins after the sequence number since,
+    oldest first, as {"changes": [...], "seq": n, "more": bool}.  See
+    ChangeJournal for the change records.  seq is the number to pass as
+    since next time; more is true if changes were left out to keep to
+    limit.  Without since only the current seq is returned.
+
+    A reader that has fallen too far behind, or whose since comes from
+    before a restart, gets 410 Gone with {"error": "resync", "seq": n}: it
+    should copy the Rep and Pin lists afresh and then read changes since n.
+    """
+    changes_journal = require_journal()
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', CHANGES_LIMIT, type=int)
+    if limit <= 0:
+        abort(400)
+    if since is None:
+        return jsonify({'changes': [], 'seq': changes_journal.seq, 'more': False,
+                        'epoch': changes_journal.epoch})
+    try:
+        changes = changes_journal.since(since, limit + 1)
+    except ResyncRequired as error:
+        return make_response(jsonify(resync(error)), 410)
+    more = len(changes) > limit
+    changes = changes[:limit]
+    return jsonify({'changes': changes, 'seq': changes[-1]['seq'] if changes else since,
+                    'more': more, 'epoch': changes_journal.epoch})
+
+@api.route('/rep/api/v1.0/changes/stream', methods=['GET'])
+def stream_changes():
+    """ Stream changes as Server-Sent Events, one "change" event per change
+    record with its sequence number as the event id.  The stream starts
+    after since, or the Last-Event-ID of a reconnecting client, or else at
+    the current change.  A reader that has to resync gets a "resync" event
+    with the body of the 410 from /changes, and the stream ends.  It also
+    ends when the server shuts down; the client reconnects with its
+    Last-Event-ID.
+    """
+    changes_journal = require_journal()
+    stopping = service().stopping
+    since = request.args.get('since', type=int)
+    if since is None:
+        last_event = request.headers.get('Last-Event-ID', '')
+        since = int(last_event) if last_event.isdigit() else changes_journal.seq
+    def generate():
+        position = since
+        while not stopping.is_set():
+            try:
+                changes = changes_journal.since(position, CHANGES_LIMIT)
+            except ResyncRequired as error:
+                yield 'event: resync\ndata: %s\n\n' % json.dumps(resync(error))
+                return
+            for change in changes:
+                yield 'id: %d\nevent: change\ndata: %s\n\n' % (change['seq'],
+                                                               json.dumps(change))
+                position = change['seq']
+            if not changes and not changes_journal.wait(position, CHANGES_HEARTBEAT):
+                yield ': keep-alive\n\n'
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def require_journal():
+    journal = service().journal
+    if journal is None:
+        abort(501)
+    return journal
+
+def resync(error):
+    return {'error': 'resync', 'message': str(error), 'seq': error.seq,
+            'epoch': service().journal.epoch}
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Serve the metrics in the Prometheus text format.
+    """
+    registry = service().registry
+    if registry is None:
+        abort(404)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/ready', methods=['GET'])
+def get_ready():
+    """ Answer 200 once the stores are open and filled, and 503 before, or
+    if opening them failed, with the error.
+    """
+    state = service()
+    if state.ready.is_set():
+        return jsonify({'ready': True})
+    return make_response(jsonify({'ready': False, 'error': state.error}), 503)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the Rep REST interface.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--backend', choices=backends.BACKENDS + ('remote',))
+    parser.add_argument('--data-dir')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes, each with its own stores; more than one '
+                             'needs the remote backend')
+    parser.add_argument('--threads', type=int, default=http_server.DEFAULT_THREADS,
+                        help='connections each process serves at once')
+    parser.add_argument('--keep-alive', type=float, default=http_server.DEFAULT_KEEP_ALIVE,
+                        help='seconds an idle connection is kept open')
+    parser.add_argument('--drain-timeout', type=float,
+                        default=http_server.DEFAULT_DRAIN_TIMEOUT,
+                        help='seconds requests in progress get to finish on shutdown')
+    parser.add_argument('--access-log', action='store_true')
+    parser.add_argument('--dev', action='store_true',
+                        help='run the Werkzeug development server with the debugger '
+                             'and reloader instead')
+    args = parser.parse_args()
+
+    config = {}
+    if args.backend is not None:
+        config['REP_BACKEND'] = args.backend
+    if args.data_dir is not None:
+        config['REP_DATA_DIR'] = args.data_dir
+    if args.dev:
+        create_app(config).run(debug=True, host=args.host, port=args.port)
+        return
+    backend = config.get('REP_BACKEND', DEFAULT_CONFIG['REP_BACKEND'])
+    if args.workers > 1 and backend != 'remote':
+        parser.error("%d workers would each keep their own stores; run "
+                     "python -m rep.store_server and use the remote backend" % args.workers)
+    http_server.serve(lambda: create_app(config, background=True), args.host, args.port,
+                      workers=args.workers, threads=args.threads,
+                      keep_alive=args.keep_alive, drain_timeout=args.drain_timeout,
+                      access_log=args.access_log,
+                      stop=lambda app: app.extensions['rep'].stop(),
+                      close=lambda app: app.extensions['rep'].close())
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    main()
 
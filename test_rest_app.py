@@ -0,0 +1,106 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from unittest import TestCase
+
+import rest_app
+
+class AppFactoryTest(TestCase):
+    REP_URL = '/rep/api/v1.0/reps'
+    MEMORY = {'REP_BACKEND': 'memory', 'REP_SNAPSHOT_DIR': None}
+
+    def post_rep(self, client, title):
+        return client.post(self.REP_URL, data=json.dumps({'title': title}),
+                           content_type='application/json')
+
+    def wait_loaded(self, app):
+        state = app.extensions['rep']
+        for _ in range(1000):
+            if state.ready.is_set() or state.error:
+                return state
+            time.sleep(0.01)
+        self.fail('the stores did not load')
+
+    def test_separate_stores(self):
+        """ Each app made by create_app has stores of its own.
+        """
+        first = rest_app.create_app(dict(self.MEMORY, REP_JOURNAL_SIZE=0)).test_client()
+        second = rest_app.create_app(self.MEMORY).test_client()
+        self.post_rep(first, 'only in the first')
+        self.assertEquals(len(json.loads(first.get(self.REP_URL).data)), 1)
+        self.assertEquals(json.loads(second.get(self.REP_URL).data), {})
+        self.assertEquals(first.get('/rep/api/v1.0/changes').status_code, 501)
+        self.assertEquals(second.get('/rep/api/v1.0/changes').status_code, 200)
+
+    def test_ready(self):
+        """ /ready answers 200 once the stores are loaded in the background.
+        """
+        app = rest_app.create_app(self.MEMORY, background=True)
+        client = app.test_client()
+        self.wait_loaded(app)
+        self.assertEquals(json.loads(client.get('/ready').data), {'ready': True})
+        self.assertEquals(client.get(self.REP_URL).status_code, 200)
+
+    def test_not_ready(self):
+        """ Until the stores load every route but /ready answers 503, as
+        they do for good if loading fails.
+        """
+        app = rest_app.create_app({'REP_BACKEND': 'tape'}, background=True)
+        client = app.test_client()
+        self.wait_loaded(app)
+        response = client.get('/ready')
+        self.assertEquals(response.status_code, 503)
+        self.assertIn('tape is not a valid backend', json.loads(response.data)['error'])
+        response = self.post_rep(client, 'too soon')
+        self.assertEquals(response.status_code, 503)
+        self.assertEquals(response.headers['Retry-After'], '1')
+
+    def test_serve(self):
+        """ Run as a script, the app is served until SIGTERM, which lets it
+        finish and exit cleanly.
+        """
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        server = subprocess.Popen([sys.executable, rest_app.__file__.replace('.pyc', '.py'),
+                                   '--host', '127.0.0.1', '--port', str(port)],
+                                  stderr=open(os.devnull, 'w'))
+        try:
+            ready = None
+            for _ in range(500):
+                try:
+                    connection = socket.create_connection(('127.0.0.1', port))
+                except socket.error:
+                    time.sleep(0.02)
+                    continue
+                connection.sendall(b'GET /ready HTTP/1.1\r\nHost: test\r\n\r\n')
+                ready = connection.recv(65536)
+                connection.close()
+                if b' 200 ' in ready.split(b'\r\n')[0]:
+                    break
+            self.assertIn(b'"ready":true', ready)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            self.assertEquals(server.wait(), 0)
+
+    def test_stream_ends_on_stop(self):
+        """ A change stream ends when the server stops, rather than holding
+        up its drain.
+        """
+        app = rest_app.create_app(self.MEMORY)
+        responses = []
+        reader = threading.Thread(target=lambda: responses.append(
+            app.test_client().get('/rep/api/v1.0/changes/stream')))
+        reader.daemon = True
+        reader.start()
+        time.sleep(0.1)
+        app.extensions['rep'].stop()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertEquals(responses[0].status_code, 200)
@@ -0,0 +1,76 @@
+import json
+from unittest import TestCase
+
+import rest_app
+
+class ChangesRestAppTest(TestCase):
+    CHANGES_URL = '/rep/api/v1.0/changes'
+
+    def setUp(self):
+        rest_app.app.config['TESTING'] = True
+        self.app = rest_app.app.test_client()
+        self.seq = json.loads(self.app.get(self.CHANGES_URL).data)['seq']
+
+    def changes(self, since):
+        return self.app.get('%s?since=%s' % (self.CHANGES_URL, since))
+
+    def test_changes(self):
+        """ Creating and deleting a Rep shows up as changes after the last
+        sequence number seen.
+        """
+        response = self.app.post('/rep/api/v1.0/reps', data=json.dumps({'title': 'fed'}),
+                                 content_type='application/json')
+        key = response.location.rsplit('/', 1)[-1]
+        self.app.delete('/rep/api/v1.0/reps/%s' % key)
+        feed = json.loads(self.changes(self.seq).data)
+        self.assertEquals([(change['op'], change['key']) for change in feed['changes']],
+                          [('put', key), ('delete', key)])
+        self.assertEquals(feed['changes'][0]['value'], {'title': 'fed'})
+        self.assertEquals(feed['seq'], self.seq + 2)
+        self.assertFalse(feed['more'])
+        self.assertEquals(json.loads(self.changes(feed['seq']).data)['changes'], [])
+
+    def test_limit(self):
+        """ limit caps the number of changes, with more set if some were
+        left out.
+        """
+        rest_app.pin_store.update({'1': rest_app.Pin(1, 2), '2': rest_app.Pin(1, 3)})
+        feed = json.loads(self.app.get('%s?since=%d&limit=1' % (self.CHANGES_URL,
+                                                                self.seq)).data)
+        del rest_app.pin_store['1'], rest_app.pin_store['2']
+        self.assertEquals(len(feed['changes']), 1)
+        self.assertTrue(feed['more'])
+        self.assertEquals(feed['seq'], self.seq + 1)
+
+    def test_resync(self):
+        """ A reader asking for changes the journal does not have is told to
+        resync, with the sequence number to follow on from.
+        """
+        response = self.changes(self.seq + 100)
+        self.assertEquals(response.status_code, 410)
+        self.assertEquals(json.loads(response.data)['error'], 'resync')
+        self.assertEquals(json.loads(response.data)['seq'], self.seq)
+
+    def test_stream(self):
+        """ Changes are streamed as Server-Sent Events.
+        """
+        rest_app.store['1'] = rest_app.Rep(title='streamed')
+        response = self.app.get('%s/stream?since=%d' % (self.CHANGES_URL, self.seq),
+                                buffered=False)
+        event = next(iter(response.response))
+        response.close()
+        del rest_app.store['1']
+        self.assertEquals(response.mimetype, 'text/event-stream')
+        lines = event.splitlines()
+        self.assertEquals(lines[:2], ['id: %d' % (self.seq + 1), 'event: change'])
+        self.assertEquals(json.loads(lines[2][len('data: '):])['value'],
+                          {'title': 'streamed'})
+
+    def test_stream_resync(self):
+        """ A stream that cannot follow on gets a resync event and ends.
+        """
+        response = self.app.get('%s/stream?since=%d' % (self.CHANGES_URL, self.seq + 100),
+                                buffered=False)
+        events = list(response.response)
+        self.assertEquals(len(events), 1)
+        self.assertTrue(events[0].startswith('event: resync\n'))
@@ -0,0 +1,23 @@
+import rest_app
+import test_rest_pins
+import test_rest_reps
+
+class FanoutTest(object):
+    """ Runs a REST test suite with multi-key reads fanned out over an
+    AsyncStore, which must answer exactly as the one-at-a-time reads do.
+    """
+    @classmethod
+    def setUpClass(cls):
+        rest_app.enable_fanout(4)
+
+    @classmethod
+    def tearDownClass(cls):
+        rest_app.enable_fanout(0)
+
+
+class FanoutRepRestAppTest(FanoutTest, test_rest_reps.RepRestAppTest):
+    pass
+
+
+class FanoutPinRestAppTest(FanoutTest, test_rest_pins.PinRestAppTest):
+    pass
@@ -1,4 +1,6 @@
 import json
+import shutil
+import tempfile
 from unittest import TestCase
 
 import rest_app
@@ -79,3 +81,154 @@ class PinRestAppTest(TestCase):
         updated = json.loads(self.get_pin(self.test_key).data)
         self.assertEquals(updated['parent'], 1)
         self.assertEquals(updated['child'], 4)
+
+    def test_children_and_parents(self):
+        """ The children and parents of a Rep are found through its Pins.
+        """
+        rest_app.store.update({1: rest_app.Rep(title='parent'),
+                               2: rest_app.Rep(title='child')})
+        children = json.loads(self.app.get('/rep/api/v1.0/children/1').data)
+        parents = json.loads(self.app.get('/rep/api/v1.0/parents/2').data)
+        del rest_app.store[1], rest_app.store[2]
+        self.assertEquals(children, {'2': {'title': 'child'}})
+        self.assertEquals(parents, {'1': {'title': 'parent'}})
+
+    def test_bulk(self):
+        """ Pins can be created in bulk from newline delimited JSON.
+        """
+        upload = '\n'.join([json.dumps({'parent': 5, 'child': child})
+                            for child in range(6, 9)] +
+                           [json.dumps({'parent': 5}), json.dumps({})])
+        response = self.app.post('%s/bulk' % self.PIN_URL, data=upload,
+                                 content_type='application/x-ndjson')
+        results = [json.loads(line) for line in response.data.splitlines()]
+        children = sorted(rest_app.pin_store.get_children(5))
+        for result in results:
+            if 'key' in result:
+                self.delete_pin(result['key'])
+        self.assertEquals(children, [6, 7, 8])
+        self.assertEquals([result.get('error') for result in results[3:]],
+                          ['child is required', 'parent is required'])
+        self.assertEquals(rest_app.pin_store.get_children(None), [])
+
+    def test_bulk_cycle(self):
+        """ A bulk batch that closes a cycle stores every other Pin once,
+        on every backend.
+        """
+        path = tempfile.mkdtemp()
+        try:
+            for backend in ('memory', 'sqlite'):
+                app = rest_app.create_app({'REP_BACKEND': backend, 'REP_DATA_DIR': path,
+                                           'REP_SNAPSHOT_DIR': None})
+                client = app.test_client()
+                upload = '\n'.join(json.dumps({'parent': parent, 'child': child})
+                                    for parent, child in [(1, 2), (2, 3), (3, 1)])
+                response = client.post('%s/bulk' % self.PIN_URL, data=upload,
+                                       content_type='application/x-ndjson')
+                results = [json.loads(line) for line in response.data.splitlines()]
+                self.assertEquals([result.get('error') is None for result in results],
+                                  [True, True, False], backend)
+                client.delete('%s/%s' % (self.PIN_URL, results[0]['key']))
+                client.delete('%s/%s' % (self.PIN_URL, results[1]['key']))
+                order = json.loads(client.get(self.PIN_URL + '/toposort').data)
+                response = client.post(self.PIN_URL,
+                                       data=json.dumps({'parent': 2, 'child': 3}),
+                                       content_type='application/json')
+                self.assertEquals(order, [], backend)
+                self.assertEquals(response.status_code, 201, backend)
+        finally:
+            shutil.rmtree(path)
+
+    def test_descendants_and_ancestors(self):
+        """ The Reps below or above a Rep can be walked in one request.
+        """
+        pin_key = self.post_pin({'parent': 2, 'child': 3}).location.rsplit('/', 1)[-1]
+        flat = json.loads(self.app.get('/rep/api/v1.0/reps/1/descendants').data)
+        nested = json.loads(self.app.get(
+            '/rep/api/v1.0/reps/3/ancestors?format=tree').data)
+        shallow = json.loads(self.app.get(
+            '/rep/api/v1.0/reps/1/descendants?depth=1&order=dfs').data)
+        self.delete_pin(pin_key)
+        self.assertEquals([(step['key'], step['via'], step['depth']) for step in flat],
+                          [('2', '1', 1), ('3', '2', 2)])
+        self.assertEquals(nested, {'3': {'2': {'1': {}}}})
+        self.assertEquals(len(shallow), 1)
+
+    def test_bad_walk(self):
+        """ A walk in an unknown order is answered with 400 Bad Request,
+        with or without metrics.
+        """
+        for metrics in (True, False):
+            app = rest_app.create_app({'REP_METRICS': metrics, 'REP_SNAPSHOT_DIR': None})
+            response = app.test_client().get('/rep/api/v1.0/reps/1/descendants?order=xyz')
+            self.assertEquals(response.status_code, 400)
+
+    def test_conditional_children(self):
+        """ The children of a Rep are sent with an ETag that changes when a
+        pin or Rep changes.
+        """
+        rest_app.store.update({1: rest_app.Rep(title='parent'),
+                               2: rest_app.Rep(title='child')})
+        url = '/rep/api/v1.0/children/1'
+        etag = self.app.get(url).headers['ETag']
+        unchanged = self.app.get(url, headers={'If-None-Match': etag})
+        rest_app.store[2] = rest_app.Rep(title='renamed')
+        changed = self.app.get(url, headers={'If-None-Match': etag})
+        del rest_app.store[1], rest_app.store[2]
+        self.assertEquals(unchanged.status_code, 304)
+        self.assertEquals(changed.status_code, 200)
+        self.assertEquals(json.loads(changed.data), {'2': {'title': 'renamed'}})
+
+    def test_cycles(self):
+        """ Pins that would make a Rep its own ancestor are refused with 409
+        Conflict, whether posted, changed or uploaded in bulk.
+        """
+        pin_key = self.post_pin({'parent': 2, 'child': 3}).location.rsplit('/', 1)[-1]
+        closing = self.post_pin({'parent': 3, 'child': 1})
+        changed = self.put_pin(pin_key, {'child': 1})
+        upload = '\n'.join(json.dumps(pin) for pin in [{'parent': 3, 'child': 4},
+                                                       {'parent': 3, 'child': 2}])
+        results = [json.loads(line) for line in self.app.post(
+            '%s/bulk' % self.PIN_URL, data=upload,
+            content_type='application/x-ndjson').data.splitlines()]
+        pin = json.loads(self.get_pin(pin_key).data)
+        self.delete_pin(pin_key)
+        self.delete_pin(results[0]['key'])
+        self.assertEquals(closing.status_code, 409)
+        self.assertEquals(changed.status_code, 409)
+        self.assertEquals(pin, {'parent': 2, 'child': 3})
+        self.assertEquals([sorted(result) for result in results],
+                          [['key', 'line'], ['error', 'line']])
+
+    def test_toposort(self):
+        """ The Reps with Pins are listed with every parent before its
+        children.
+        """
+        pin_keys = [self.post_pin(pin).location.rsplit('/', 1)[-1]
+                    for pin in [{'parent': 2, 'child': 7}, {'parent': 6, 'child': 2}]]
+        order = json.loads(self.app.get(self.PIN_URL + '/toposort').data)
+        for key in pin_keys:
+            self.delete_pin(key)
+        self.assertEquals(sorted(order), ['1', '2', '6', '7'])
+        self.assertTrue(order.index('1') < order.index('2') < order.index('7'))
+        self.assertTrue(order.index('6') < order.index('2'))
+
+    def test_bad_pin(self):
+        """ Pins the store cannot hold are answered with 400 Bad Request,
+        not the 409 Conflict of a cycle.
+        """
+        app = rest_app.create_app({'REP_BACKEND': 'compact', 'REP_SNAPSHOT_DIR': None})
+        client = app.test_client()
+        response = client.post(self.PIN_URL, data=json.dumps({'parent': 1, 'child': 2}),
+                               content_type='application/json')
+        key = response.location.rsplit('/', 1)[-1]
+        def post(pin):
+            return client.post(self.PIN_URL, data=json.dumps(pin),
+                               content_type='application/json').status_code
+        def put(pin):
+            return client.put('%s/%s' % (self.PIN_URL, key), data=json.dumps(pin),
+                              content_type='application/json').status_code
+        self.assertEquals(post({'parent': 'one', 'child': 2}), 400)
+        self.assertEquals(put({'child': 'two'}), 400)
+        self.assertEquals(post({'parent': 2, 'child': 1}), 409)
+        self.assertEquals(put({'child': 1}), 409)
@@ -1,10 +1,15 @@
 import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 import rest_app
+from rep import snapshot
 
 class RepRestAppTest(TestCase):
     REP_URL = '/rep/api/v1.0/reps'
+    PIN_URL = '/rep/api/v1.0/pins'
 
     def test_root(self):
         """ The current root url response is a placeholder.
@@ -75,3 +80,211 @@ class RepRestAppTest(TestCase):
         self.put_rep(self.test_key, {'title': 'Brian Redmond'})
         updated_title = json.loads(self.get_rep(self.test_key).data)['title']
         self.assertEquals(updated_title, 'Brian Redmond')
+
+    def test_get_ids(self):
+        """ Reps can be fetched in one batch by listing their keys in ids.
+        Unknown keys are left out.
+        """
+        other = self.post_rep({'title': 'Other Redmond'}).location.rsplit('/', 1)[-1]
+        response = self.app.get('%s?ids=%s,%s,999999' % (self.REP_URL, self.test_key, other))
+        self.delete_rep(other)
+        self.assertEquals(json.loads(response.data),
+                          {self.test_key: self.test_rep, other: {'title': 'Other Redmond'}})
+        self.assertEquals(self.app.get(self.REP_URL + '?ids=1,x').status_code, 400)
+
+    def test_query(self):
+        """ Reps can be found by title, in ranges of titles and sorted by
+        title, through the title index.
+        """
+        others = [self.post_rep({'title': title}).location.rsplit('/', 1)[-1]
+                  for title in ['Titus Query', 'Tabitha Query']]
+        equal = json.loads(self.app.get(self.REP_URL + '?title=Titus%20Query').data)
+        ranged = json.loads(self.app.get(self.REP_URL + '?title_from=T&title_to=Tu'
+                                         '&sort=-title&limit=2').data)
+        for key in others:
+            self.delete_rep(key)
+        self.assertEquals(equal, {'items': [{'key': others[0], 'value': {'title': 'Titus Query'}}],
+                                  'plan': 'sorted title equal'})
+        self.assertEquals([item['key'] for item in ranged['items']],
+                          [self.test_key, others[0]])
+        self.assertEquals(ranged['plan'], 'sorted title range')
+        self.assertEquals(self.app.get(self.REP_URL + '?title_at=T').status_code, 400)
+        self.assertEquals(self.app.get(self.REP_URL + '?sort=size').status_code, 400)
+
+    def test_snapshot_preload(self):
+        """ Stores can start from a snapshot written by rep.snapshot.
+        """
+        path = tempfile.mkdtemp()
+        saved = rest_app.store.as_dict()
+        snapshot.dump(rest_app.store, os.path.join(path, 'reps.snap'))
+        rest_app.app.config['REP_SNAPSHOT_DIR'] = path
+        try:
+            preloaded = rest_app.open_store(rest_app.RepStore, 'reps')
+        finally:
+            rest_app.app.config['REP_SNAPSHOT_DIR'] = None
+            shutil.rmtree(path)
+        self.assertEquals(preloaded.as_dict(), saved)
+
+    def test_get_page(self):
+        """ Reps can be listed a page at a time using limit and after.
+        """
+        keys = [self.test_key] + [self.post_rep({'title': 'page %s' % number})
+                                  .location.rsplit('/', 1)[-1] for number in range(2)]
+        first = json.loads(self.app.get('%s?limit=2&after=%d' %
+                                         (self.REP_URL, int(keys[0]) - 1)).data)
+        second = json.loads(self.app.get('%s?limit=2&after=%s' %
+                                          (self.REP_URL, first['next'])).data)
+        for key in keys[1:]:
+            self.delete_rep(key)
+        self.assertEquals(sorted(first['items']), sorted(keys[:2]))
+        self.assertEquals(first['next'], keys[1])
+        self.assertEquals(second['items'], {keys[2]: {'title': 'page 1'}})
+        self.assertEquals(second['next'], None)
+
+    def test_get_page_bad_limit(self):
+        """ A limit below one is refused.
+        """
+        for limit in (0, -1):
+            response = self.app.get('%s?limit=%d' % (self.REP_URL, limit))
+            self.assertEquals(response.status_code, 400)
+
+    def test_get_page_any_cursor(self):
+        """ Every backend takes any key as the after cursor; keys that are
+        not numbers come after the numbers.
+        """
+        path = tempfile.mkdtemp()
+        try:
+            for backend in ('memory', 'compact', 'sqlite'):
+                app = rest_app.create_app({'REP_BACKEND': backend, 'REP_DATA_DIR': path,
+                                           'REP_SNAPSHOT_DIR': None})
+                client = app.test_client()
+                client.post(self.REP_URL, data=json.dumps({'title': 'numbered'}),
+                            content_type='application/json')
+                client.post(self.PIN_URL, data=json.dumps({'parent': 1, 'child': 2}),
+                            content_type='application/json')
+                for url in (self.REP_URL, self.PIN_URL):
+                    page = json.loads(client.get('%s?limit=2&after=abc' % url).data)
+                    self.assertEquals(page, {'items': {}, 'next': None}, backend)
+        finally:
+            shutil.rmtree(path)
+
+    def test_get_stream(self):
+        """ Reps can be streamed as JSON or as newline delimited JSON.
+        """
+        after = int(self.test_key) - 1
+        streamed = json.loads(self.app.get('%s?stream=json&after=%d' %
+                                           (self.REP_URL, after)).data)
+        lines = self.app.get('%s?stream=ndjson&after=%d' %
+                             (self.REP_URL, after)).data.splitlines()
+        self.assertEquals(streamed, {self.test_key: self.test_rep})
+        self.assertEquals([json.loads(line) for line in lines],
+                          [{'key': self.test_key, 'value': self.test_rep}])
+
+    def test_bulk(self):
+        """ Reps can be created in bulk from newline delimited JSON, with a
+        result for every line.
+        """
+        upload = '\n'.join([json.dumps({'title': 'bulk one'}), '',
+                            json.dumps({'title': ' '}),
+                            json.dumps({'name': 'bulk'}),
+                            json.dumps({}),
+                            'not json',
+                            json.dumps({'title': 'bulk two'})])
+        response = self.app.post('%s/bulk' % self.REP_URL, data=upload,
+                                 content_type='application/x-ndjson')
+        results = [json.loads(line) for line in response.data.splitlines()]
+        created = [json.loads(self.get_rep(result['key']).data)
+                   for result in results if 'key' in result]
+        for result in results:
+            if 'key' in result:
+                self.delete_rep(result['key'])
+        self.assertEquals([result['line'] for result in results], [1, 3, 4, 5, 6, 7])
+        self.assertEquals([('key' in result) for result in results],
+                          [True, False, False, False, False, True])
+        self.assertEquals(created, [{'title': 'bulk one'}, {'title': 'bulk two'}])
+
+    def test_search(self):
+        """ Reps can be searched by title.
+        """
+        response = json.loads(self.app.get('%s/search?q=titus&prefix=red' %
+                                           self.REP_URL).data)
+        self.assertEquals(response['total'], 1)
+        self.assertEquals(response['next'], None)
+        self.assertEquals(response['results'][0]['key'], self.test_key)
+        self.assertEquals(response['results'][0]['rep'], self.test_rep)
+
+    def test_conditional_get(self):
+        """ A Rep is sent with an ETag.  Asking again with that ETag in
+        If-None-Match gets an empty 304 until the Rep changes.
+        """
+        etag = self.get_rep(self.test_key).headers['ETag']
+        unchanged = self.app.get('%s/%s' % (self.REP_URL, self.test_key),
+                                 headers={'If-None-Match': etag})
+        self.put_rep(self.test_key, {'title': 'Changed'})
+        changed = self.app.get('%s/%s' % (self.REP_URL, self.test_key),
+                               headers={'If-None-Match': etag})
+        self.assertEquals(unchanged.status_code, 304)
+        self.assertEquals(unchanged.data, '')
+        self.assertEquals(changed.status_code, 200)
+        self.assertEquals(json.loads(changed.data)['title'], 'Changed')
+
+    def test_conditional_list(self):
+        """ The list of Reps has an ETag that changes when any Rep does.
+        """
+        etag = self.app.get(self.REP_URL).headers['ETag']
+        unchanged = self.app.get(self.REP_URL, headers={'If-None-Match': etag})
+        self.put_rep(self.test_key, {'title': 'Changed'})
+        changed = self.app.get(self.REP_URL, headers={'If-None-Match': etag})
+        self.assertEquals(unchanged.status_code, 304)
+        self.assertEquals(changed.status_code, 200)
+        self.assertTrue(changed.headers['Last-Modified'])
+
+    def test_if_match(self):
+        """ A PUT or DELETE with a stale If-Match ETag fails with 412 and
+        leaves the Rep alone.
+        """
+        etag = self.get_rep(self.test_key).headers['ETag']
+        self.put_rep(self.test_key, {'title': 'First'})
+        stale = self.app.put('%s/%s' % (self.REP_URL, self.test_key),
+                             data=json.dumps({'title': 'Second'}),
+                             content_type='application/json',
+                             headers={'If-Match': etag})
+        refused = self.app.delete('%s/%s' % (self.REP_URL, self.test_key),
+                                  headers={'If-Match': etag})
+        current = self.get_rep(self.test_key)
+        fresh = self.app.put('%s/%s' % (self.REP_URL, self.test_key),
+                             data=json.dumps({'title': 'Third'}),
+                             content_type='application/json',
+                             headers={'If-Match': current.headers['ETag']})
+        self.assertEquals(stale.status_code, 412)
+        self.assertEquals(refused.status_code, 412)
+        self.assertEquals(json.loads(current.data)['title'], 'First')
+        self.assertEquals(fresh.status_code, 200)
+
+    def test_metrics(self):
+        """ Request latencies by route and store operation timings are
+        served in the Prometheus text format.
+        """
+        self.get_rep(self.test_key)
+        response = self.app.get('/metrics')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.mimetype, 'text/plain')
+        self.assertIn('rep_http_request_duration_seconds_count{method="GET",'
+                      'route="/rep/api/v1.0/reps/<int:key>"}', response.data)
+        self.assertIn('rep_http_requests_total{method="GET",'
+                      'route="/rep/api/v1.0/reps/<int:key>",status="200"}', response.data)
+        self.assertIn('rep_store_operation_seconds_count{operation="create",store="reps"}',
+                      response.data)
+        self.assertIn('rep_store_objects{store="reps"}', response.data)
+
+    def test_cache_stats(self):
+        """ Reps are sent from a cache of their JSON, whose hit and miss
+        counts can be read.
+        """
+        before = json.loads(self.app.get('/rep/api/v1.0/stats/cache').data)['reps']
+        self.get_rep(self.test_key)
+        self.get_rep(self.test_key)
+        after = json.loads(self.app.get('/rep/api/v1.0/stats/cache').data)['reps']
+        self.assertEquals(after['hits'] + after['misses'],
+                          before['hits'] + before['misses'] + 2)
+        self.assertGreater(after['hits'], before['hits'])